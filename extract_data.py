@@ -1,99 +1,126 @@
 import pandas as pd
 import json
 import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '最终交付物', '3_策略代码', 'strategy'))
+import performance_analytics as pa
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Paths
 lightgbm_path = "/Volumes/T7/谷歌反重力/股票量化最终版本/最终交付物/2_回测数据/backtest_lightgbm.csv"
 benchmark_path = "/Volumes/T7/谷歌反重力/股票量化最终版本/最终交付物/2_回测数据/backtest_result.csv"
 
+# Strategy/benchmark pairs to export: name -> (strategy csv, benchmark csv)
+PAIRS = {
+    'lgbm': (lightgbm_path, benchmark_path),
+}
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
 class NpEncoder(json.JSONEncoder):
+    """Fallback encoder when orjson is not installed (NaN is written as null, like orjson)"""
     def default(self, obj):
         if isinstance(obj, np.integer):
             return int(obj)
         if isinstance(obj, np.floating):
-            return float(obj)
+            return None if np.isnan(obj) else float(obj)
         if isinstance(obj, np.ndarray):
+            if obj.dtype.kind == 'f':
+                return np.where(np.isnan(obj), None, obj).tolist()
             return obj.tolist()
         return super(NpEncoder, self).default(obj)
 
-def process_data():
-    # Load Data
-    df_lgbm = pd.read_csv(lightgbm_path)
-    df_bench = pd.read_csv(benchmark_path)
 
-    # Ensure Date format
-    df_lgbm['date'] = pd.to_datetime(df_lgbm['date'])
-    df_bench['date'] = pd.to_datetime(df_bench['date'])
+def dumps(obj):
+    """Serialize to JSON bytes; NumPy arrays are written directly"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, cls=NpEncoder).encode('utf-8')
+
+
+def read_backtest(path, columns):
+    return pd.read_csv(path, usecols=['date'] + columns, parse_dates=['date'])
+
+
+def monthly_heatmap(values, dates):
+    """Year x month heatmap of month-end over previous month-end returns"""
+    monthly_returns = pa.period_returns(values, dates, 'ME', base='prev_close')
+    table = pa.monthly_table(monthly_returns)
+    z = table.to_numpy()
+    text = np.where(np.isnan(z), '', np.char.mod('%.2f%%', np.nan_to_num(z) * 100))
+    return {
+        "years": table.index.tolist(),
+        "months": MONTH_NAMES,
+        "z": z,
+        "text": text.tolist()
+    }
+
 
+def build_pair_data(df_lgbm, df_bench):
+    """Chart data for one strategy/benchmark pair"""
     # 1. Net Value Curve Data
     # Normalize to start at 1.0 for comparison
     initial_value_lgbm = df_lgbm['value'].iloc[0]
     initial_value_bench = df_bench['value'].iloc[0]
-    
+
     # Merge
-    merged = pd.merge(df_lgbm[['date', 'value', 'drawdown', 'return']], 
-                      df_bench[['date', 'value', 'drawdown']], 
+    merged = pd.merge(df_lgbm[['date', 'value', 'drawdown', 'return']],
+                      df_bench[['date', 'value', 'drawdown']],
                       on='date', how='left', suffixes=('_lgbm', '_bench'))
-    
+
     # Fill NaN benchmark
     merged['value_bench'] = merged['value_bench'].ffill()
-    
-    # Calculate Normalized Values
-    merged['nav_lgbm'] = merged['value_lgbm'] / initial_value_lgbm
-    merged['nav_bench'] = merged['value_bench'] / initial_value_bench
-    
+
     # 2. Monthly Returns (Heatmap)
-    # Resample to Monthly
-    merged.set_index('date', inplace=True)
-    monthly_returns = merged['value_lgbm'].resample('ME').last().pct_change()
-    
-    # Reset index to access dt accessor
-    mr_df = monthly_returns.reset_index()
-    mr_df.columns = ['date', 'return']
-    mr_df['year'] = mr_df['date'].dt.year
-    mr_df['month'] = mr_df['date'].dt.month
-    
-    years = sorted(mr_df['year'].unique())
-    months = list(range(1, 13))
-    
-    z_values = []
-    text_values = []
-    
-    # Matrix for current Heatmap (Years on Y, Months on X)
-    for y in years:
-        row_z = []
-        row_text = []
-        for m in months:
-            val = mr_df[(mr_df['year'] == y) & (mr_df['month'] == m)]['return'].values
-            if len(val) > 0:
-                ret = val[0]
-                row_z.append(ret)
-                row_text.append(f"{ret:.2%}")
-            else:
-                row_z.append(None)
-                row_text.append("")
-        z_values.append(row_z)
-        text_values.append(row_text)
-
-    daily_rets = merged['return'].dropna().tolist()
+    heatmap = monthly_heatmap(merged['value_lgbm'], merged['date'])
+
+    returns = merged['return'].to_numpy()
+    return {
+        "dates": merged['date'].dt.strftime('%Y-%m-%d').tolist(),
+        "nav_lgbm": merged['value_lgbm'].to_numpy() / initial_value_lgbm,
+        "nav_bench": merged['value_bench'].to_numpy() / initial_value_bench,
+        "drawdown_lgbm": merged['drawdown_lgbm'].to_numpy(),
+        "drawdown_bench": merged['drawdown_bench'].to_numpy(),
+        "heatmap": heatmap,
+        "distribution": returns[~np.isnan(returns)]
+    }
+
+
+def process_data(pairs=None, output_file='ppt_data.json'):
+    """
+    Export PPT chart data.
+
+    With a single pair the file has the original layout; with several pairs it maps
+    each pair name to that layout. A benchmark shared by several pairs is read once.
+    """
+    pairs = PAIRS if pairs is None else pairs
+    tables = {}
+
+    def load(path, columns):
+        key = (path, tuple(columns))
+        if key not in tables:
+            tables[key] = read_backtest(path, columns)
+        return tables[key]
 
     output = {
-        "dates": merged.index.strftime('%Y-%m-%d').tolist(),
-        "nav_lgbm": merged['nav_lgbm'].tolist(),
-        "nav_bench": merged['nav_bench'].tolist(),
-        "drawdown_lgbm": merged['drawdown_lgbm'].tolist(),
-        "drawdown_bench": merged['drawdown_bench'].tolist(),
-        "heatmap": {
-            "years": years,
-            "months": ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"],
-            "z": z_values,
-            "text": text_values
-        },
-        "distribution": daily_rets
+        name: build_pair_data(load(strategy, ['value', 'drawdown', 'return']),
+                              load(benchmark, ['value', 'drawdown']))
+        for name, (strategy, benchmark) in pairs.items()
     }
-    
-    with open('ppt_data.json', 'w') as f:
-        json.dump(output, f, cls=NpEncoder)
+    if len(output) == 1:
+        output = next(iter(output.values()))
+
+    with open(output_file, 'wb') as f:
+        f.write(dumps(output))
+
 
 if __name__ == "__main__":
     process_data()
@@ -8,12 +8,19 @@ import numpy as np
 from datetime import datetime, timedelta
 import os
 import sys
+import time
 from tqdm import tqdm
 import warnings
 warnings.filterwarnings('ignore')
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'strategy'))
-from data_loader import JYDBDataLoader
+from data_loader import JYDBDataLoader, DataSpec
+from portfolio import Portfolio
+from feature_store import FeatureStore
+from factor_store import FactorStore
+from factor_pipeline import FusedFactorPipeline, CORE_FACTORS, future_return_5d
+from instrumentation import TRACER, traced
+from performance_analytics import summarize_nav
 
 try:
     import lightgbm as lgb
@@ -26,202 +33,377 @@ except ImportError:
     LIGHTGBM_AVAILABLE = True
 
 
+DEFAULT_OUTPUT_FILE = r"d:\谷歌反重力\股票量化\backtest_lightgbm.csv"
+
+
+class BoosterStages:
+    """
+    分段训练的LightGBM模型：预测值为各段Booster的原始得分之和
+    
+    热启动时新的一段以旧模型在窗口上的得分为init_score训练，等价于init_model续训，
+    但init_score取自缓存，不必每次用全部旧树重新预测整个窗口。
+    """
+    
+    def __init__(self, booster):
+        self.boosters = [booster]
+    
+    def append(self, booster):
+        self.boosters.append(booster)
+    
+    def predict(self, X):
+        return sum(booster.predict(X) for booster in self.boosters)
+    
+    def num_trees(self):
+        return sum(booster.num_trees() for booster in self.boosters)
+
+
+def training_scores(booster):
+    """Booster在其训练集上的当前得分（含init_score），来自训练过程中维护的结果，无需重新预测"""
+    captured = {}
+    
+    def capture(preds, train_data):
+        captured['scores'] = np.asarray(preds, dtype=np.float64)
+        return 'capture', 0.0, False
+    
+    booster.eval_train(feval=capture)
+    return captured['scores']
+
+
 class LightGBMFactorStrategy:
     """LightGBM多因子策略"""
     
-    def __init__(self, data_loader, train_days=252, retrain_freq=20):
+    FEATURE_COLS = ['momentum_20d', 'reversal_5d', 'ep_ratio', 'bp_ratio', 'volume_anomaly']
+    RETRAIN_MODES = ('full', 'continue', 'refit')
+    LOOKBACK_DAYS = 260  # 因子预热期（交易日）
+    LGB_PARAMS = {
+        'objective': 'regression',
+        'metric': 'rmse',
+        'num_leaves': 31,
+        'learning_rate': 0.05,
+        'feature_fraction': 0.8,
+        'bagging_fraction': 0.8,
+        'bagging_freq': 5,
+        'verbose': -1,
+        'random_state': 42
+    }
+    
+    def __init__(self, data_loader, train_days=252, retrain_freq=20,
+                 retrain_mode='full', warm_rounds=20, full_every=5, benchmark_full=False,
+                 factor_weights=None):
         """
         参数:
             data_loader: 数据加载器
             train_days: 训练窗口天数（默认252个交易日，约1年）
             retrain_freq: 重新训练频率（默认20天）
+            factor_weights: 固定因子权重字典（键为FEATURE_COLS中的因子名）；
+                给定时不训练模型，直接按权重线性组合打分
+            retrain_mode: 重训方式
+                - 'full': 每次从头构建Dataset并训练100轮（原方式）
+                - 'continue': 复用一次性分箱的Dataset按行取子集，在上一个模型基础上继续训练warm_rounds轮
+                - 'refit': 复用上一个模型的树结构，只用新窗口数据重新拟合叶子值
+            warm_rounds: 'continue'模式每次追加的迭代轮数
+            full_every: 增量模式下每隔多少次重训在复用的Dataset上从头训练一次
+                （'continue'模式树的数量随重训次数增长，热启动的初始得分计算也随之变慢）
+            benchmark_full: 增量模式下是否在同一窗口上额外计时一次完整重训，用于精确对比节省的时间
         """
+        if retrain_mode not in self.RETRAIN_MODES:
+            raise ValueError(f"retrain_mode必须是 {self.RETRAIN_MODES} 之一: {retrain_mode}")
         self.loader = data_loader
         self.train_days = train_days
         self.retrain_freq = retrain_freq
+        self.retrain_mode = retrain_mode
+        self.warm_rounds = warm_rounds
+        self.full_every = full_every
+        self.benchmark_full = benchmark_full
+        self.factor_weights = factor_weights
         self.model = None
+        self.retrain_stats = []
+        self.feature_store = None
+        self._full_dataset = None
+        self._scores = None  # 当前模型在训练集各行上的得分缓存（'continue'模式）
+        self._scored = (0, 0)  # 缓存有效的行区间
     
+    @traced()
     def calculate_factors_batch(self, start_date, end_date):
         """批量计算5个核心因子"""
         print("\n📊 批量计算因子...")
         
-        lookback = 260
         trading_days = self.loader.get_trading_days(start_date, end_date)
-        start_idx = self.loader.trading_days.index(trading_days[0])
-        actual_start = self.loader.trading_days[max(0, start_idx - lookback)]
+        actual_start = self.loader.calendar.offset(trading_days[0], -self.LOOKBACK_DAYS)
         
-        df = self.loader.get_price_data(actual_start, end_date).copy()
-        df = df.sort_values(['SecuCode', 'TradingDay'])
+        quotes = self.loader.get_price_data(actual_start, end_date)
         
         print("  计算因子...")
-        df['momentum_20d'] = df.groupby('SecuCode')['ClosePrice'].pct_change(periods=20) * 100
-        df['reversal_5d'] = -df.groupby('SecuCode')['ClosePrice'].pct_change(periods=5) * 100
-        df['ep_ratio'] = 1 / (df['ClosePrice'] + 1e-10) * 1000
-        df['price_ma_250'] = df.groupby('SecuCode')['ClosePrice'].transform(
-            lambda x: x.rolling(250, min_periods=125).mean()
+        # 核心因子与训练标签（同一股票未来5个观测的收益率）一次遍历算完；
+        # 回测记账用的收盘价原样带出，保留float64精度（千万级资金下float32会有元级误差）
+        pipeline = FusedFactorPipeline(
+            {**CORE_FACTORS, 'future_return': future_return_5d}, passthrough=('ClosePrice',)
         )
-        df['bp_ratio'] = df['price_ma_250'] / (df['ClosePrice'] + 1e-10)
-        df['vol_ma_20'] = df.groupby('SecuCode')['TurnoverVolume'].transform(
-            lambda x: x.rolling(20, min_periods=10).mean()
-        )
-        df['volume_anomaly'] = df['TurnoverVolume'] / (df['vol_ma_20'] + 1e-10)
-        
-        # 计算未来收益（用于训练标签）
-        df['future_return'] = df.groupby('SecuCode')['ClosePrice'].shift(-5).pct_change(periods=5) * 100
-        
-        factor_cols = ['SecuCode', 'TradingDay', 'ClosePrice', 'momentum_20d', 'reversal_5d', 
-                      'ep_ratio', 'bp_ratio', 'volume_anomaly', 'future_return']
-        
-        df = df[factor_cols]
-        df = df[df['TradingDay'] >= start_date].copy()
+        df = pipeline.run(quotes, start_date=start_date)
         
         print(f"  ✅ 因子计算完成: {len(df):,} 条")
         return df
     
-    def prepare_training_data(self, factor_df, train_start, train_end):
-        """准备训练数据"""
-        train_data = factor_df[
-            (factor_df['TradingDay'] >= train_start) & 
-            (factor_df['TradingDay'] <= train_end)
-        ].copy()
-        
-        feature_cols = ['momentum_20d', 'reversal_5d', 'ep_ratio', 'bp_ratio', 'volume_anomaly']
-        
-        # 去极值和标准化
-        for col in feature_cols:
-            median = train_data[col].median()
-            mad = (train_data[col] - median).abs().median()
-            if mad > 0:
-                upper = median + 3 * mad
-                lower = median - 3 * mad
-                train_data[col] = train_data[col].clip(lower, upper)
-            
-            mean = train_data[col].mean()
-            std = train_data[col].std()
-            if std > 0:
-                train_data[col] = (train_data[col] - mean) / std
-        
-        # 移除缺失值
-        train_data = train_data.dropna(subset=feature_cols + ['future_return'])
-        
-        X = train_data[feature_cols].values
-        y = train_data['future_return'].values
-        
-        return X, y, feature_cols
+    @traced()
+    def load_factors(self, factor_store, start_date, end_date):
+        """
+        从时点因子库读取 [start_date, end_date] 的已处理因子，代替calculate_factors_batch
+
+        Returns:
+            (factor_df, feature_store)，可直接传给backtest
+        """
+        print("\n📊 从时点因子库读取因子...")
+        factor_df = factor_store.read(start_date, end_date, processed=True)
+        if len(factor_df) == 0:
+            raise ValueError(f"因子库 {factor_store.store_dir} 中没有 {start_date.date()} 至 {end_date.date()} 的数据")
+        last = factor_df['TradingDay'].max()
+        if last < pd.Timestamp(end_date):
+            print(f"  ⚠️  因子库只到 {last.date()}，请先运行 factor_store.py 更新")
+        
+        # 训练标签依赖未来行情，不入库：同一股票未来5个观测的收益率（float32，与批量计算口径一致）
+        factor_df = factor_df.sort_values(['SecuCode', 'TradingDay'], kind='mergesort').reset_index(drop=True)
+        close = factor_df['ClosePrice'].astype(np.float32)
+        future_close = close.groupby(factor_df['SecuCode'].to_numpy()).shift(-5)
+        factor_df['future_return'] = (future_close / close - 1) * 100
+        print(f"  ✅ 读取完成: {len(factor_df):,} 条")
+        
+        print("\n🗂️  构建特征库...")
+        self.feature_store = FeatureStore(factor_df, self.FEATURE_COLS, processed=True)
+        return factor_df, self.feature_store
+    
+    @traced()
+    def build_feature_store(self, factor_df):
+        """所有日期的截面一次性去极值+标准化，训练和预测都从特征库读取"""
+        self.feature_store = FeatureStore(factor_df, self.FEATURE_COLS)
+        return self.feature_store
     
+    def prepare_training_data(self, train_start, train_end):
+        """准备训练数据：特征库中 [train_start, train_end] 的可训练行（零拷贝切片）"""
+        X, y = self.feature_store.window(train_start, train_end)
+        return X, y, list(self.FEATURE_COLS)
+    
+    @traced()
     def train_model(self, X, y):
         """训练LightGBM模型"""
-        params = {
-            'objective': 'regression',
-            'metric': 'rmse',
-            'num_leaves': 31,
-            'learning_rate': 0.05,
-            'feature_fraction': 0.8,
-            'bagging_fraction': 0.8,
-            'bagging_freq': 5,
-            'verbose': -1,
-            'random_state': 42
-        }
-        
         train_data = lgb.Dataset(X, label=y)
-        self.model = lgb.train(params, train_data, num_boost_round=100)
+        self.model = lgb.train(self.LGB_PARAMS, train_data, num_boost_round=100)
         
         return self.model
     
-    def predict_scores(self, factor_df, date, feature_cols):
-        """预测因子得分"""
-        daily_data = factor_df[factor_df['TradingDay'] == date].copy()
+    def build_training_dataset(self, first_train_end):
+        """
+        增量重训的准备：特征库中所有可训练行只分箱一次
         
-        if len(daily_data) == 0:
-            return pd.DataFrame()
+        特征库按日期做截面处理，与训练窗口无关，因此不同窗口可以共用同一份分箱数据。
+        分箱边界只用第一个训练窗口（first_train_end及之前）的数据确定，避免用到未来数据。
+        """
+        store = self.feature_store
+        _, n_ref = store.window_rows(store.train_dates[0], first_train_end)
+        n_ref = max(n_ref, 1)
+        reference = lgb.Dataset(store.train_X[:n_ref], label=store.train_y[:n_ref],
+                                params=self.LGB_PARAMS, free_raw_data=False).construct()
+        self._full_dataset = lgb.Dataset(store.train_X, label=store.train_y, reference=reference,
+                                         free_raw_data=False).construct()
+        self._scores = np.zeros(len(store.train_y))
+        self._scored = (0, 0)
+    
+    def _window_scores(self, lo, hi):
+        """当前模型在[lo, hi)行上的得分：与上一窗口重叠的部分读缓存，只预测新进入窗口的行"""
+        scores = self._scores[lo:hi].copy()
+        cached_lo, cached_hi = self._scored
+        stale = np.ones(hi - lo, dtype=bool)
+        stale[max(cached_lo, lo) - lo:max(min(cached_hi, hi) - lo, 0)] = False
+        if stale.any():
+            scores[stale] = self.model.predict(self.feature_store.train_X[lo:hi][stale])
+        return scores
+    
+    @traced()
+    def retrain_incremental(self, train_start, train_end):
+        """
+        增量重训：窗口数据取自全量Dataset的行子集
         
-        # 标准化
-        for col in feature_cols:
-            median = daily_data[col].median()
-            mad = (daily_data[col] - median).abs().median()
-            if mad > 0:
-                upper = median + 3 * mad
-                lower = median - 3 * mad
-                daily_data[col] = daily_data[col].clip(lower, upper)
-            
-            mean = daily_data[col].mean()
-            std = daily_data[col].std()
-            if std > 0:
-                daily_data[col] = (daily_data[col] - mean) / std
+        首次（还没有模型时）及每隔full_every次重训时完整训练100轮；
+        其余时候按retrain_mode继续训练warm_rounds轮或重拟合叶子值。
+        每次重训的耗时记录在self.retrain_stats中。
+        """
+        lo, hi = self.feature_store.window_rows(train_start, train_end)
+        X, y = self.feature_store.train_X[lo:hi], self.feature_store.train_y[lo:hi]
+        if hi - lo <= 100:  # 确保有足够数据
+            return self.model
+        
+        start = time.perf_counter()
+        if self.model is None or (self.full_every and len(self.retrain_stats) % self.full_every == 0):
+            mode = 'full'
+            window = self._full_dataset.subset(np.arange(lo, hi))
+            booster = lgb.train(self.LGB_PARAMS, window, num_boost_round=100, keep_training_booster=True)
+            if self.retrain_mode == 'continue':
+                self.model = BoosterStages(booster)
+                self._scores[lo:hi] = training_scores(booster)
+                self._scored = (lo, hi)
+            else:
+                self.model = booster
+        elif self.retrain_mode == 'continue':
+            mode = 'continue'
+            # 子集需先construct，否则惰性构建时不会带上init_score
+            window = self._full_dataset.subset(np.arange(lo, hi)).construct()
+            window.set_init_score(self._window_scores(lo, hi))
+            booster = lgb.train(self.LGB_PARAMS, window, num_boost_round=self.warm_rounds,
+                                keep_training_booster=True)
+            self.model.append(booster)
+            self._scores[lo:hi] = training_scores(booster)
+            self._scored = (lo, hi)
+        else:
+            mode = 'refit'
+            self.model = self.model.refit(X, y)
+        seconds = time.perf_counter() - start
+        
+        full_seconds = None
+        if self.benchmark_full:
+            start = time.perf_counter()
+            lgb.train(self.LGB_PARAMS, lgb.Dataset(X, label=y), num_boost_round=100)
+            full_seconds = time.perf_counter() - start
+        
+        self.retrain_stats.append({
+            'train_end': train_end,
+            'mode': mode,
+            'rows': int(hi - lo),
+            'seconds': seconds,
+            'full_seconds': full_seconds
+        })
+        return self.model
+    
+    def report_retrain_savings(self):
+        """汇总增量重训相对完整重训节省的时间"""
+        if not self.retrain_stats:
+            return None
+        
+        stats = pd.DataFrame(self.retrain_stats)
+        incremental = stats['seconds'].sum()
+        if stats['full_seconds'].notna().all():
+            full = stats['full_seconds'].sum()
+            basis = '同窗口实测'
+        else:
+            # 未实测时以本次回测中完整训练的平均耗时估算
+            full = stats.loc[stats['mode'] == 'full', 'seconds'].mean() * len(stats)
+            basis = '按完整训练平均耗时估算'
+        saved = full - incremental
+        
+        print(f"\n⏱️  重训耗时（{self.retrain_mode}模式，共{len(stats)}次）")
+        print(f"  增量重训: {incremental:.2f} 秒")
+        print(f"  完整重训: {full:.2f} 秒（{basis}）")
+        print(f"  节省: {saved:.2f} 秒 ({saved / full * 100 if full > 0 else 0:.1f}%)")
+        return {'incremental_seconds': incremental, 'full_seconds': full, 'saved_seconds': saved}
+    
+    def predict_scores(self, date):
+        """预测因子得分（特征库中该日的行已完成去极值+标准化）"""
+        codes, close, X = self.feature_store.day(date)
         
-        # 预测
-        X = daily_data[feature_cols].fillna(0).values
+        if len(codes) == 0:
+            return pd.DataFrame()
         
+        # 预测
         if self.model is not None:
             scores = self.model.predict(X)
-            daily_data['predicted_score'] = scores
         else:
-            # 如果模型未训练，使用简单线性组合
-            weights = [0.3, 0.15, 0.25, 0.15, 0.15]
-            daily_data['predicted_score'] = sum(daily_data[col].fillna(0) * w for col, w in zip(feature_cols, weights))
-        
-        return daily_data[['SecuCode', 'ClosePrice', 'predicted_score']]
+            # 固定权重或模型未训练时，使用简单线性组合
+            if self.factor_weights is not None:
+                weights = np.array([self.factor_weights.get(col, 0) for col in self.FEATURE_COLS])
+            else:
+                weights = np.array([0.3, 0.15, 0.25, 0.15, 0.15])
+            scores = X.astype(np.float64) @ weights
+        
+        return pd.DataFrame({'SecuCode': codes, 'ClosePrice': close, 'predicted_score': scores})
     
-    def backtest(self, start_date, end_date, top_n=50):
-        """完整回测流程"""
+    @traced()
+    def backtest(self, start_date, end_date, top_n=50, factor_df=None, feature_store=None,
+                 output_file=DEFAULT_OUTPUT_FILE):
+        """
+        完整回测流程
+        
+        Args:
+            factor_df: 预先计算好的calculate_factors_batch结果（多组参数共用时传入，避免重复计算）
+            feature_store: 由factor_df构建的特征库（同上）
+            output_file: 净值CSV输出路径，None为不保存
+        """
         print("\n" + "="*80)
         print("🤖 LightGBM多因子策略回测")
         print("="*80)
         
         # 1. 计算所有因子
-        factor_df = self.calculate_factors_batch(start_date, end_date)
+        if factor_df is None:
+            factor_df = self.calculate_factors_batch(start_date, end_date)
         
         # 2. 准备回测
         trading_days = self.loader.get_trading_days(start_date, end_date)
         
+        # 每个日期的截面只处理一次，训练窗口和预测都读特征库
+        if feature_store is not None:
+            self.feature_store = feature_store
+        else:
+            print("\n🗂️  构建特征库...")
+            self.build_feature_store(factor_df)
+        print(f"  ✅ 特征库: {len(self.feature_store):,} 行，可训练 {len(self.feature_store.train_y):,} 行")
+        
+        day_idx, days = pd.factorize(factor_df['TradingDay'], sort=True)
+        stock_idx, codes = pd.factorize(factor_df['SecuCode'], sort=True)
+        day_pos = days.get_indexer(trading_days)
+        
+        # 日期 x 股票 的收盘价矩阵与"当日有行情"掩码
+        price_matrix = np.full((len(days), len(codes)), np.nan)
+        price_matrix[day_idx, stock_idx] = factor_df['ClosePrice'].to_numpy(dtype=np.float64)
+        listed_matrix = np.zeros((len(days), len(codes)), dtype=bool)
+        listed_matrix[day_idx, stock_idx] = True
+        
+        train = self.factor_weights is None
+        if train and self.retrain_mode != 'full' and len(trading_days) > self.train_days:
+            print("\n📦 构建增量重训数据集（一次性分箱）...")
+            self.build_training_dataset(trading_days[self.train_days - 1])
+        self.retrain_stats = []
+        
         initial_capital = 80000000
         capital = initial_capital
-        holdings = {}
+        holdings = Portfolio(codes)
         daily_values = []
         
         print(f"\n🔄 开始滚动回测...")
         print(f"  训练窗口: {self.train_days}天")
         print(f"  重训频率: {self.retrain_freq}天")
+        print(f"  重训方式: {self.retrain_mode if train else '固定权重（不训练）'}")
         print(f"  选股数量: Top {top_n}")
         
         for i, date in enumerate(tqdm(trading_days, desc="  回测进度")):
             # 3. 滚动训练模型
-            if i % self.retrain_freq == 0 and i >= self.train_days:
+            if train and i % self.retrain_freq == 0 and i >= self.train_days:
                 train_start = trading_days[max(0, i - self.train_days)]
                 train_end = trading_days[i - 1]
                 
-                X, y, feature_cols = self.prepare_training_data(factor_df, train_start, train_end)
-                
-                if len(X) > 100:  # 确保有足够数据
-                    self.train_model(X, y)
+                if self.retrain_mode == 'full':
+                    X, y, feature_cols = self.prepare_training_data(train_start, train_end)
+                    
+                    if len(X) > 100:  # 确保有足够数据
+                        self.train_model(X, y)
+                else:
+                    self.retrain_incremental(train_start, train_end)
             
             # 4. 获取当日数据
-            daily_quotes = factor_df[factor_df['TradingDay'] == date]
-            
-            if len(daily_quotes) == 0:
+            d = day_pos[i]
+            if d < 0:
                 continue
             
-            # 5. 计算持仓市值
+            prices = price_matrix[d]
+            
+            # 5. 计算持仓市值（股票退市或停牌时移除持仓）
             if holdings:
-                portfolio_value = 0
-                for stock, shares in list(holdings.items()):
-                    stock_price = daily_quotes[daily_quotes['SecuCode'] == stock]
-                    if len(stock_price) > 0:
-                        price = stock_price.iloc[0]['ClosePrice']
-                        portfolio_value += shares * price
-                    else:
-                        # 股票退市或停牌，移除持仓
-                        del holdings[stock]
-                
+                portfolio_value = holdings.mark_to_market(prices, listed_matrix[d])
                 capital = portfolio_value if portfolio_value > 0 else capital
             
             # 6. 月初调仓
             if i % 20 == 0 and i >= self.train_days:
                 # 清仓
-                holdings = {}
+                holdings.clear()
                 
                 # 预测得分
-                scores = self.predict_scores(factor_df, date, feature_cols if self.model else ['momentum_20d', 'reversal_5d', 'ep_ratio', 'bp_ratio', 'volume_anomaly'])
+                scores = self.predict_scores(date)
                 
                 if len(scores) >= top_n:
                     # 选Top N
@@ -229,13 +411,11 @@ class LightGBMFactorStrategy:
                     
                     # 等权买入
                     per_stock_value = capital / top_n
-                    
-                    for _, row in top_stocks.iterrows():
-                        stock_code = row['SecuCode']
-                        price = row['ClosePrice']
-                        shares = int(per_stock_value / price)
-                        if shares > 0:
-                            holdings[stock_code] = shares
+                    holdings.buy_equal_value(
+                        codes.get_indexer(top_stocks['SecuCode']),
+                        top_stocks['ClosePrice'].to_numpy(),
+                        per_stock_value
+                    )
             
             # 7. 记录净值
             daily_values.append({
@@ -246,18 +426,7 @@ class LightGBMFactorStrategy:
         # 8. 计算结果
         print("\n📊 计算回测指标...")
         df_values = pd.DataFrame(daily_values)
-        df_values['return'] = df_values['value'].pct_change()
-        
-        total_return = (df_values['value'].iloc[-1] / initial_capital - 1) * 100
-        days = (df_values['date'].iloc[-1] - df_values['date'].iloc[0]).days
-        years = days / 365
-        annual_return = (np.power(df_values['value'].iloc[-1] / initial_capital, 1/years) - 1) * 100
-        
-        df_values['cummax'] = df_values['value'].cummax()
-        df_values['drawdown'] = (df_values['value'] / df_values['cummax'] - 1) * 100
-        max_drawdown = df_values['drawdown'].min()
-        
-        sharpe = df_values['return'].mean() / df_values['return'].std() * np.sqrt(252) if df_values['return'].std() > 0 else 0
+        metrics = summarize_nav(df_values, initial_capital)
         
         # 9. 输出结果
         print("\n" + "="*80)
@@ -266,16 +435,19 @@ class LightGBMFactorStrategy:
         print(f"回测期间: {df_values['date'].iloc[0].date()} 至 {df_values['date'].iloc[-1].date()}")
         print(f"初始资金: {initial_capital:,.0f} 元")
         print(f"最终资金: {df_values['value'].iloc[-1]:,.0f} 元")
-        print(f"\n🎯 总收益率: {total_return:.2f}%")
-        print(f"📊 年化收益率: {annual_return:.2f}%")
-        print(f"📉 最大回撤: {max_drawdown:.2f}%")
-        print(f"⚡ 夏普比率: {sharpe:.3f}")
+        print(f"\n🎯 总收益率: {metrics['total_return']:.2f}%")
+        print(f"📊 年化收益率: {metrics['annual_return']:.2f}%")
+        print(f"📉 最大回撤: {metrics['max_drawdown']:.2f}%")
+        print(f"⚡ 夏普比率: {metrics['sharpe']:.3f}")
         print("="*80)
         
+        if train and self.retrain_mode != 'full':
+            self.report_retrain_savings()
+        
         # 保存结果
-        output_file = r"d:\谷歌反重力\股票量化\backtest_lightgbm.csv"
-        df_values.to_csv(output_file, index=False)
-        print(f"\n✅ 结果已保存: {output_file}")
+        if output_file is not None:
+            df_values.to_csv(output_file, index=False)
+            print(f"\n✅ 结果已保存: {output_file}")
         
         return df_values
 
@@ -283,6 +455,9 @@ class LightGBMFactorStrategy:
 def main():
     START_DATE = datetime(2021, 2, 1)
     END_DATE = datetime(2024, 12, 31)
+    FACTOR_STORE_DIR = None  # 时点因子库目录（None为从行情重新计算因子）
+    TRACE_FILE = None  # 各步骤耗时/内存记录的输出路径（.json或.csv，None为不记录）
+    PROFILE_STAGE = None  # 用cProfile采样的步骤名（如 'FusedFactorPipeline.run'，None为不采样）
     
     print("\n" + "█" * 80)
     print("█" + " " * 78 + "█")
@@ -291,10 +466,19 @@ def main():
     print("█" + " " * 78 + "█")
     print("█" * 80)
     
+    if TRACE_FILE is not None:
+        TRACER.start(profile_stage=PROFILE_STAGE, profile_dir=os.path.dirname(os.path.abspath(TRACE_FILE)))
+    
     try:
         # 1. 加载数据
         print("\n【第1步】加载JYDB数据")
-        loader = JYDBDataLoader()
+        if FACTOR_STORE_DIR is not None:
+            # 因子从库中读取，只需要交易日历
+            loader = JYDBDataLoader(spec=DataSpec(tables=('trading_calendar',)))
+        else:
+            loader = JYDBDataLoader(spec=DataSpec(
+                start_date=START_DATE, end_date=END_DATE, lookback_days=LightGBMFactorStrategy.LOOKBACK_DAYS
+            ))
         
         # 2. 初始化策略
         print("\n【第2步】初始化LightGBM策略")
@@ -306,7 +490,12 @@ def main():
         
         # 3. 运行回测
         print("\n【第3步】运行回测")
-        result = strategy.backtest(START_DATE, END_DATE, top_n=50)
+        if FACTOR_STORE_DIR is not None:
+            factor_df, feature_store = strategy.load_factors(FactorStore(FACTOR_STORE_DIR), START_DATE, END_DATE)
+            result = strategy.backtest(START_DATE, END_DATE, top_n=50,
+                                       factor_df=factor_df, feature_store=feature_store)
+        else:
+            result = strategy.backtest(START_DATE, END_DATE, top_n=50)
         
         print("\n" + "█" * 80)
         print("█" + " " * 78 + "█")
@@ -321,6 +510,9 @@ def main():
         import traceback
         traceback.print_exc()
         return 1
+    
+    finally:
+        TRACER.finish(TRACE_FILE)
 
 
 if __name__ == '__main__':
@@ -5,91 +5,132 @@
 
 import pandas as pd
 import numpy as np
-from datetime import datetime
 import os
-import glob
+import sys
 
-def simple_backtest():
-    """简单回测函数"""
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'strategy'))
+from data_loader import JYDBDataLoader, DataSpec
+from price_panel import PricePanel
+from factor_bundle import FactorBundle
+from factor_reader import PrefetchingFactorReader
+from instrumentation import TRACER, traced
+from performance_analytics import summarize_nav
+
+
+def factor_days(factor_source, n_threads=4, max_prefetch=16):
+    """
+    按日期顺序读取每日因子
+
+    Args:
+        factor_source: 每日因子文件目录（yyyyMMdd.csv），或因子包文件（见factor_bundle，只映射不解析）
+        n_threads: 读取因子目录时的预读线程数
+        max_prefetch: 最多提前读取的文件数
+
+    Returns:
+        (天数, 逐日产出 (交易日, DataFrame[stock_code, factor_score]) 的迭代器)
+    """
+    if os.path.isfile(factor_source):
+        bundle = FactorBundle(factor_source)
+        codes = np.char.zfill(bundle.codes, 6).astype(object)
+        scores = np.asarray(bundle.scores)
+
+        def iter_bundle():
+            for trade_date, row in zip(bundle.dates, scores):
+                valid = ~np.isnan(row)
+                yield trade_date, pd.DataFrame({'stock_code': codes[valid], 'factor_score': row[valid]})
+        return len(bundle), iter_bundle()
+
+    # 因子目录：后台线程按日期顺序预读之后的文件，主循环计算当天时下一批文件已在读取
+    reader = PrefetchingFactorReader(factor_source, n_threads=n_threads, max_prefetch=max_prefetch)
+
+    def iter_files():
+        for trade_date, codes, factor_scores in reader:
+            yield trade_date, pd.DataFrame({'stock_code': codes, 'factor_score': factor_scores})
+    return len(reader), iter_files()
+
+@traced()
+def simple_backtest(factor_dir=r"D:\irs_final",
+                    output_file=r"d:\谷歌反重力\股票量化\backtest_result.csv",
+                    data_loader=None):
+    """
+    简单回测函数
+
+    Args:
+        factor_dir: 每日因子文件目录（yyyyMMdd.csv：股票代码,因子分数），或因子包文件
+        output_file: 净值CSV输出路径，None为不保存
+        data_loader: 数据加载器（默认按默认数据目录只加载日线行情）
+    """
     
     print("\n" + "="*80)
     print("📊 多因子策略简单回测")
     print("="*80)
     
     # 1. 读取因子文件
-    factor_dir = r"D:\irs_final"
     print(f"\n1. 读取因子文件: {factor_dir}")
     
-    factor_files = sorted(glob.glob(os.path.join(factor_dir, "*.csv")))
-    print(f"   找到 {len(factor_files)} 个因子文件")
+    n_days, factor_iter = factor_days(factor_dir)
+    print(f"   找到 {n_days} 个交易日的因子")
     
     # 2. 读取行情数据
     print("\n2. 读取行情数据...")
-    quotes = pd.read_csv(r"d:\谷歌反重力\股票量化\data\daily_quotes.csv")
-    quotes['TradingDay'] = pd.to_datetime(quotes['TradingDay'])
-    quotes['SecuCode_6'] = quotes['SecuCode'].astype(str).str.zfill(6)
+    # 通过数据加载器读取，复用列式缓存，避免重复解析CSV；只用到日线行情
+    if data_loader is None:
+        data_loader = JYDBDataLoader(spec=DataSpec(tables=('daily_quotes',)))
+    quotes = data_loader.daily_quotes.copy()
+    quotes['SecuCode'] = quotes['SecuCode'].astype(str).str.zfill(6)
     print(f"   行情数据: {len(quotes):,} 条")
     
+    # 预先构建 日期 x 股票 收盘价矩阵，之后按行号取当日价格
+    close_panel = PricePanel.from_quotes(quotes, fields=('ClosePrice',), dtype=np.float64)
+    close_matrix = close_panel['ClosePrice']
+    print(f"   收盘价矩阵: {len(close_panel.dates)} 天 x {len(close_panel.codes)} 只股票")
+    
     # 3. 回测
     print("\n3. 开始回测...")
     initial_capital = 80000000  # 8000万
     capital = initial_capital
-    holdings = {}  # 持仓
+    holdings = np.zeros(len(close_panel.codes))  # 持仓股数，与close_panel.codes对齐
     daily_values = []
     
-    for factor_file in factor_files:
-        # 读取因子
-        date_str = os.path.basename(factor_file).replace('.csv', '')
-        trade_date = datetime.strptime(date_str, '%Y%m%d')
-        
-        factor_df = pd.read_csv(factor_file, header=None, names=['stock_code', 'factor_score'])
-        factor_df['stock_code'] = factor_df['stock_code'].astype(str).str.zfill(6)
+    for trade_date, factor_df in factor_iter:
+        # 获取当日行情（收盘价矩阵的一行）
+        if trade_date not in close_panel.dates:
+            continue
         
-        # 获取当日行情
-        daily_quotes = quotes[quotes['TradingDay'] == trade_date].copy()
+        prices = close_matrix[close_panel.dates.get_loc(trade_date)]
+        traded = ~np.isnan(prices)
         
-        if len(daily_quotes) == 0:
+        if not traded.any():
             continue
         
-        # 合并因子和行情
-        merged = factor_df.merge(
-            daily_quotes[['SecuCode_6', 'ClosePrice']], 
-            left_on='stock_code', 
-            right_on='SecuCode_6',
-            how='inner'
+        # 合并因子和行情：因子股票映射到矩阵列号，只保留当日有行情的股票
+        stock_idx = close_panel.codes.get_indexer(factor_df['stock_code'])
+        in_market = stock_idx >= 0
+        in_market[in_market] = traded[stock_idx[in_market]]
+        merged = factor_df[in_market].assign(
+            stock_idx=stock_idx[in_market],
+            ClosePrice=prices[stock_idx[in_market]]
         )
         
         if len(merged) == 0:
             continue
         
-        # 计算持仓市值（如果有持仓的话）
-        if holdings:
-            portfolio_value = 0
-            for stock, shares in holdings.items():
-                stock_quotes = daily_quotes[daily_quotes['SecuCode_6'] == stock]
-                if len(stock_quotes) > 0:
-                    price = stock_quotes.iloc[0]['ClosePrice']
-                    portfolio_value += shares * price
-            
-            capital = portfolio_value
+        # 计算持仓市值（如果有持仓的话）：股数向量 · 当日价格（停牌股票不计市值）
+        if holdings.any():
+            capital = np.dot(holdings[traded], prices[traded])
             
         # 月初调仓（简化：每20个交易日）
         if len(daily_values) % 20 == 0:
             # 清仓
-            holdings = {}
+            holdings = np.zeros(len(close_panel.codes))
             
             # 选Top 50
             top_stocks = merged.nlargest(50, 'factor_score')
             
             # 等权买入
             per_stock_value = capital / 50
-            
-            for _, row in top_stocks.iterrows():
-                stock_code = row['stock_code']
-                price = row['ClosePrice']
-                shares = int(per_stock_value / price)
-                if shares > 0:
-                    holdings[stock_code] = shares
+            shares = np.floor(per_stock_value / top_stocks['ClosePrice'].to_numpy())
+            holdings[top_stocks['stock_idx'].to_numpy()] = np.where(shares > 0, shares, 0)
         
         # 记录净值
         daily_values.append({
@@ -98,29 +139,14 @@ def simple_backtest():
         })
         
         if len(daily_values) % 100 == 0:
-            print(f"   进度: {len(daily_values)}/{len(factor_files)}")
+            print(f"   进度: {len(daily_values)}/{n_days}")
     
     # 4. 计算结果
     print("\n4. 计算回测指标...")
     
     df_values = pd.DataFrame(daily_values)
-    df_values['return'] = df_values['value'].pct_change()
-    
-    # 总收益
-    total_return = (df_values['value'].iloc[-1] / initial_capital - 1) * 100
-    
-    # 年化收益
-    days = (df_values['date'].iloc[-1] - df_values['date'].iloc[0]).days
-    years = days / 365
-    annual_return = (np.power(df_values['value'].iloc[-1] / initial_capital, 1/years) - 1) * 100
-    
-    # 最大回撤
-    df_values['cummax'] = df_values['value'].cummax()
-    df_values['drawdown'] = (df_values['value'] / df_values['cummax'] - 1) * 100
-    max_drawdown = df_values['drawdown'].min()
-    
-    # 夏普比率
-    sharpe = df_values['return'].mean() / df_values['return'].std() * np.sqrt(252)
+    # 总收益、年化收益、最大回撤、夏普比率
+    metrics = summarize_nav(df_values, initial_capital)
     
     # 5. 输出结果
     print("\n" + "="*80)
@@ -129,18 +155,22 @@ def simple_backtest():
     print(f"回测期间: {df_values['date'].iloc[0].date()} 至 {df_values['date'].iloc[-1].date()}")
     print(f"初始资金: {initial_capital:,.0f} 元")
     print(f"最终资金: {df_values['value'].iloc[-1]:,.0f} 元")
-    print(f"\n总收益率: {total_return:.2f}%")
-    print(f"年化收益率: {annual_return:.2f}%")
-    print(f"最大回撤: {max_drawdown:.2f}%")
-    print(f"夏普比率: {sharpe:.3f}")
+    print(f"\n总收益率: {metrics['total_return']:.2f}%")
+    print(f"年化收益率: {metrics['annual_return']:.2f}%")
+    print(f"最大回撤: {metrics['max_drawdown']:.2f}%")
+    print(f"夏普比率: {metrics['sharpe']:.3f}")
     print("="*80)
     
     # 保存结果
-    output_file = r"d:\谷歌反重力\股票量化\backtest_result.csv"
-    df_values.to_csv(output_file, index=False)
-    print(f"\n✅ 结果已保存至: {output_file}")
+    if output_file is not None:
+        df_values.to_csv(output_file, index=False)
+        print(f"\n✅ 结果已保存至: {output_file}")
     
     return df_values
 
 if __name__ == '__main__':
+    TRACE_FILE = None  # 各步骤耗时/内存记录的输出路径（.json或.csv，None为不记录）
+    if TRACE_FILE is not None:
+        TRACER.start(profile_dir=os.path.dirname(os.path.abspath(TRACE_FILE)))
     result = simple_backtest()
+    TRACER.finish(TRACE_FILE)
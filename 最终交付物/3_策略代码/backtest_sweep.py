@@ -0,0 +1,226 @@
+"""
+多参数批量回测 - 因子面板只计算一次，多组参数在进程池中并行回测
+
+参数网格：训练窗口 x 重训频率 x 选股数量 x 因子权重
+- 因子权重为None时使用LightGBM滚动训练；为字典时按固定权重线性打分（不训练）
+- 因子面板和特征库在主进程计算一次，通过进程池初始化参数传给每个子进程（每个子进程只传一次）
+- 所有参数组合的净值汇总到一个长表CSV，另输出一张指标汇总表
+"""
+
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'strategy'))
+from data_loader import JYDBDataLoader
+from feature_store import FeatureStore
+from performance_analytics import summarize_nav
+from backtest_lightgbm import LightGBMFactorStrategy
+
+INITIAL_CAPITAL = 80000000
+
+# 子进程内的全局状态（由 _init_worker 初始化，每个子进程一份）
+_worker = {}
+
+
+def _set_shared(loader, factor_df, feature_store, start_date, end_date):
+    """保存各任务共用的数据"""
+    _worker['loader'] = loader
+    _worker['factor_df'] = factor_df
+    _worker['feature_store'] = feature_store
+    _worker['start_date'] = start_date
+    _worker['end_date'] = end_date
+
+
+def _init_worker(loader_kwargs, factor_df, feature_store, start_date, end_date):
+    """子进程初始化：从列式缓存重建数据加载器，保存主进程传来的因子面板和特征库"""
+    # 子进程不打印回测过程和进度条，结果通过返回值汇总到主进程
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+    sys.stderr = sys.stdout
+
+    _set_shared(JYDBDataLoader(**loader_kwargs), factor_df, feature_store, start_date, end_date)
+
+
+def _run_config(config):
+    """子进程任务：回测一组参数，返回 (config_id, 净值序列)"""
+    strategy = LightGBMFactorStrategy(
+        _worker['loader'],
+        train_days=config['train_days'],
+        retrain_freq=config['retrain_freq'],
+        factor_weights=config['factor_weights']
+    )
+    df_values = strategy.backtest(
+        _worker['start_date'], _worker['end_date'], top_n=config['top_n'],
+        factor_df=_worker['factor_df'], feature_store=_worker['feature_store'],
+        output_file=None
+    )
+    return config['config_id'], df_values[['date', 'value']]
+
+
+def expand_grid(train_days_list, retrain_freqs, top_ns, weight_sets):
+    """
+    参数网格展开为配置列表
+
+    固定权重方案不训练模型，与重训频率无关，只展开一次（retrain_freq记为None）；
+    训练窗口仍决定第一次调仓的日期，照常展开。
+
+    Args:
+        weight_sets: 权重方案名 -> 因子权重字典（None表示LightGBM训练）
+    """
+    configs = []
+    for train_days, retrain_freq, top_n, (weights_name, weights) in itertools.product(
+            train_days_list, retrain_freqs, top_ns, weight_sets.items()):
+        if weights is not None:
+            if retrain_freq != retrain_freqs[0]:
+                continue
+            retrain_freq = None
+        configs.append({
+            'config_id': len(configs),
+            'weights': weights_name,
+            'train_days': train_days,
+            'retrain_freq': retrain_freq,
+            'top_n': top_n,
+            'factor_weights': weights,
+        })
+    return configs
+
+
+def run_sweep(data_loader, start_date, end_date,
+              train_days_list=(252,), retrain_freqs=(20,), top_ns=(50,),
+              weight_sets=None, n_workers=1,
+              output_file=r"d:\谷歌反重力\股票量化\backtest_sweep.csv"):
+    """
+    批量回测参数网格
+
+    Args:
+        data_loader: 数据加载器
+        start_date: 回测开始日期
+        end_date: 回测结束日期
+        train_days_list: 训练窗口候选
+        retrain_freqs: 重训频率候选
+        top_ns: 选股数量候选
+        weight_sets: 权重方案名 -> 因子权重字典（None表示LightGBM训练），默认只跑LightGBM
+        n_workers: 并行进程数（1为串行；>1时子进程从data_loader的列式缓存重建数据）
+        output_file: 净值长表CSV路径（指标汇总表保存为同名 _summary.csv），None为不保存
+
+    Returns:
+        (净值长表, 指标汇总表)
+    """
+    if weight_sets is None:
+        weight_sets = {'lightgbm': None}
+    configs = expand_grid(train_days_list, retrain_freqs, top_ns, weight_sets)
+
+    print("\n" + "=" * 80)
+    print(f"🧪 批量回测: {len(configs)} 组参数")
+    print("=" * 80)
+
+    # 1. 因子面板与特征库只计算一次
+    factor_df = LightGBMFactorStrategy(data_loader).calculate_factors_batch(start_date, end_date)
+    print("\n🗂️  构建特征库...")
+    feature_store = FeatureStore(factor_df, LightGBMFactorStrategy.FEATURE_COLS)
+
+    # 2. 每组参数一个任务
+    results = {}
+    if n_workers > 1:
+        if not data_loader.use_cache:
+            print("⚠️  未启用列式缓存，每个子进程需要重新解析CSV")
+        loader_kwargs = data_loader.init_kwargs()
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(loader_kwargs, factor_df, feature_store,
+                                           start_date, end_date)) as pool:
+            futures = [pool.submit(_run_config, config) for config in configs]
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               desc=f"批量回测（{n_workers}进程）"):
+                config_id, df_values = future.result()
+                results[config_id] = df_values
+    else:
+        _set_shared(data_loader, factor_df, feature_store, start_date, end_date)
+        for config in configs:
+            config_id, df_values = _run_config(config)
+            results[config_id] = df_values
+
+    # 3. 汇总
+    param_cols = ['config_id', 'weights', 'train_days', 'retrain_freq', 'top_n']
+    nav_frames = []
+    summary_rows = []
+    for config in configs:
+        df_values = results[config['config_id']]
+        params = {col: config[col] for col in param_cols}
+        nav_frames.append(df_values.assign(**params)[param_cols + ['date', 'value']])
+        metrics = summarize_nav(df_values.copy(), INITIAL_CAPITAL)
+        summary_rows.append({**params, 'final_value': df_values['value'].iloc[-1], **metrics})
+
+    nav = pd.concat(nav_frames, ignore_index=True)
+    summary = pd.DataFrame(summary_rows)
+
+    print("\n" + "=" * 80)
+    print("📈 批量回测结果")
+    print("=" * 80)
+    print(summary.sort_values('sharpe', ascending=False).to_string(index=False, float_format='%.3f'))
+    print("=" * 80)
+
+    if output_file is not None:
+        nav.to_csv(output_file, index=False)
+        summary_file = os.path.splitext(output_file)[0] + '_summary.csv'
+        summary.to_csv(summary_file, index=False)
+        print(f"\n✅ 净值已保存: {output_file}")
+        print(f"✅ 指标已保存: {summary_file}")
+
+    return nav, summary
+
+
+def main():
+    # ==================== 配置参数 ====================
+    START_DATE = datetime(2021, 2, 1)
+    END_DATE = datetime(2024, 12, 31)
+    N_WORKERS = os.cpu_count() or 1  # 并行进程数（1为串行）
+
+    TRAIN_DAYS = [126, 252]
+    RETRAIN_FREQS = [10, 20]
+    TOP_NS = [30, 50]
+
+    # 权重方案（None为LightGBM训练，其余为固定权重线性打分）
+    WEIGHT_SETS = {
+        'lightgbm': None,
+        'equal': {
+            'momentum_20d': 0.2,
+            'reversal_5d': 0.2,
+            'ep_ratio': 0.2,
+            'bp_ratio': 0.2,
+            'volume_anomaly': 0.2,
+        },
+        'value_tilt': {
+            'momentum_20d': 0.3,
+            'reversal_5d': 0.15,
+            'ep_ratio': 0.25,
+            'bp_ratio': 0.15,
+            'volume_anomaly': 0.15,
+        },
+    }
+    # ==================================================
+
+    try:
+        print("\n【第1步】加载JYDB数据")
+        loader = JYDBDataLoader()
+
+        print("\n【第2步】批量回测")
+        run_sweep(loader, START_DATE, END_DATE,
+                  train_days_list=TRAIN_DAYS, retrain_freqs=RETRAIN_FREQS, top_ns=TOP_NS,
+                  weight_sets=WEIGHT_SETS, n_workers=N_WORKERS)
+        return 0
+
+    except Exception as e:
+        print(f"\n❌ 错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == '__main__':
+    exit_code = main()
+    sys.exit(exit_code)
@@ -1,12 +1,25 @@
 """
 生成完整的HTML可视化报告
 包含所有量化策略标准分析图表
+
+批量模式（create_html_reports）：一个目录下的每个净值CSV生成一个报告，进程池并行渲染；
+所有报告引用输出目录下同一份本地plotly.js（取自已安装的plotly，离线可用）。
+图表数据以float32数组传给plotly（plotly>=6序列化为base64类型数组），日期为 yyyy-mm-dd 字符串。
 """
 
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import contextlib
+import glob
+import io
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'strategy'))
+import performance_analytics as pa
 
 # 使用plotly生成交互式图表（避免matplotlib的NumPy问题）
 try:
@@ -22,10 +35,56 @@ except ImportError:
     import plotly.express as px
     from plotly.subplots import make_subplots
     PLOTLY_AVAILABLE = True
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+PLOTLY_JS_FILE = 'plotly.min.js'  # 批量模式下各报告共用的本地plotly.js文件名
+
+
+def plotly_script_tag(plotly_js=None):
+    """
+    plotly.js的script标签
+
+    Args:
+        plotly_js: 本地plotly.js路径（相对HTML文件）；None为与已安装plotly版本一致的CDN地址
+            （plotly>=6输出的类型数组需要对应版本的plotly.js才能解码）
+    """
+    src = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" if plotly_js is None else plotly_js
+    return f'<script src="{src}"></script>'
+
+
+def write_plotly_js(output_dir):
+    """把已安装plotly自带的plotly.js写入output_dir（已有同样大小的文件时跳过），返回文件路径"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, PLOTLY_JS_FILE)
+    script = get_plotlyjs().encode('utf-8')
+    if not (os.path.exists(path) and os.path.getsize(path) == len(script)):
+        with open(path, 'wb') as f:
+            f.write(script)
+    return path
 
 
-def create_html_report():
-    """生成完整HTML报告"""
+def _compact(values):
+    """图表数据转float32数组（序列化体积减半，图表精度足够）"""
+    return np.asarray(values, dtype=np.float32)
+
+
+def _figure_html(fig, div_id):
+    """图表div（不含plotly.js，也不带外层html文档）"""
+    return fig.to_html(include_plotlyjs=False, full_html=False, div_id=div_id)
+
+
+def create_html_report(input_file=r"d:\谷歌反重力\股票量化\backtest_lightgbm.csv",
+                       output_file=r"d:\谷歌反重力\股票量化\LightGBM策略回测报告.html",
+                       plotly_js=None, run_name=None):
+    """
+    生成完整HTML报告
+
+    Args:
+        input_file: 回测净值CSV（date, value；缺少 return / drawdown 列时由净值补算）
+        output_file: HTML报告输出路径
+        plotly_js: 本地plotly.js路径（相对HTML文件），None为CDN
+        run_name: 回测名称（显示在页头和页面标题中，批量生成时区分各报告）
+    """
     
     print("\n" + "="*80)
     print("📊 生成专业HTML可视化报告")
@@ -33,8 +92,13 @@ def create_html_report():
     
     # 1. 读取数据
     print("\n1. 读取LightGBM回测数据...")
-    df = pd.read_csv(r"d:\谷歌反重力\股票量化\backtest_lightgbm.csv")
+    df = pd.read_csv(input_file)
     df['date'] = pd.to_datetime(df['date'])
+    # 参数扫描等只保存了净值的结果，补算收益率与回撤
+    if 'return' not in df.columns:
+        df['return'] = pa.daily_returns(df['value'])
+    if 'drawdown' not in df.columns:
+        df['drawdown'] = pa.drawdown(df['value']) * 100
     df['nav'] = df['value'] / 80000000
     df['year'] = df['date'].dt.year
     df['month'] = df['date'].dt.month
@@ -42,49 +106,54 @@ def create_html_report():
     # 2. 计算指标
     print("\n2. 计算回测指标...")
     total_return = (df['nav'].iloc[-1] - 1) * 100
-    days = (df['date'].iloc[-1] - df['date'].iloc[0]).days
-    annual_return = ((df['nav'].iloc[-1] ** (365/days)) - 1) * 100
+    annual_return = pa.annual_return(df['nav'], df['date'], initial_value=1) * 100
     max_drawdown = df['drawdown'].min()
-    sharpe = df['return'].mean() / df['return'].std() * np.sqrt(252) if df['return'].std() > 0 else 0
+    sharpe = pa.sharpe_ratio(df['return'])
+    
+    wins = pa.win_stats(df['return'])
+    win_rate = wins['win_rate'] * 100
+    avg_win = wins['avg_win'] * 100
+    avg_loss = wins['avg_loss'] * 100
     
-    win_rate = (df['return'] > 0).sum() / len(df['return'].dropna()) * 100
-    avg_win = df[df['return'] > 0]['return'].mean() * 100
-    avg_loss = df[df['return'] < 0]['return'].mean() * 100
+    # 月度/年度收益（期末净值 / 本期首个净值 - 1）
+    monthly_ret = pa.period_returns(df['nav'], df['date'], 'ME') * 100
+    yearly_ret = pa.period_returns(df['nav'], df['date'], 'YE') * 100
     
     # 3. 创建图表
     print("\n3. 生成图表...")
     
-    charts_html = ""
+    charts = []  # 每个图表一个div（含绘图脚本）
+    dates = df['date'].dt.strftime('%Y-%m-%d').tolist()
+    nav = _compact(df['nav'])
+    drawdown = _compact(df['drawdown'])
     
     # 图表1：净值曲线
     print("   [1/10] 净值曲线...")
     fig1 = go.Figure()
-    fig1.add_trace(go.Scatter(x=df['date'], y=df['nav'], mode='lines', name='策略净值',
+    fig1.add_trace(go.Scatter(x=dates, y=nav, mode='lines', name='策略净值',
                               line=dict(color='#1f77b4', width=2)))
     fig1.add_hline(y=1, line_dash="dash", line_color="gray", annotation_text="基准线")
     fig1.update_layout(title='净值曲线', xaxis_title='日期', yaxis_title='净值', 
                        template='plotly_white', height=500)
-    charts_html += f'<div class="chart-container">{fig1.to_html(include_plotlyjs=False, div_id="chart1")}</div>\n'
+    charts.append(_figure_html(fig1, "chart1"))
     
     # 图表2：净值与回撤双图
     print("   [2/10] 回撤分析...")
     fig2 = make_subplots(rows=2, cols=1, subplot_titles=('净值曲线', '回撤曲线'),
                          vertical_spacing=0.1, row_heights=[0.6, 0.4])
-    fig2.add_trace(go.Scatter(x=df['date'], y=df['nav'], mode='lines', name='净值',
+    fig2.add_trace(go.Scatter(x=dates, y=nav, mode='lines', name='净值',
                               line=dict(color='#1f77b4', width=2)), row=1, col=1)
-    fig2.add_trace(go.Scatter(x=df['date'], y=df['drawdown'], mode='lines', name='回撤',
+    fig2.add_trace(go.Scatter(x=dates, y=drawdown, mode='lines', name='回撤',
                               fill='tozeroy', line=dict(color='red', width=1)), row=2, col=1)
     fig2.update_xaxes(title_text="日期", row=2, col=1)
     fig2.update_yaxes(title_text="净值", row=1, col=1)
     fig2.update_yaxes(title_text="回撤 (%)", row=2, col=1)
     fig2.update_layout(height=700, template='plotly_white', showlegend=False)
-    charts_html += f'<div class="chart-container">{fig2.to_html(include_plotlyjs=False, div_id="chart2")}</div>\n'
+    charts.append(_figure_html(fig2, "chart2"))
     
     # 图表3：月度收益热力图
     print("   [3/10] 月度收益热力图...")
-    monthly_returns = df.groupby(['year', 'month']).apply(
-        lambda x: (x['nav'].iloc[-1] / x['nav'].iloc[0] - 1) * 100 if len(x) > 0 else 0
-    ).unstack(fill_value=0)
+    monthly_returns = pa.monthly_table(monthly_ret).fillna(0)
     
     fig3 = go.Figure(data=go.Heatmap(
         z=monthly_returns.values,
@@ -99,25 +168,25 @@ def create_html_report():
     ))
     fig3.update_layout(title='月度收益热力图', xaxis_title='月份', yaxis_title='年份',
                        template='plotly_white', height=400)
-    charts_html += f'<div class="chart-container">{fig3.to_html(include_plotlyjs=False, div_id="chart3")}</div>\n'
+    charts.append(_figure_html(fig3, "chart3"))
     
     # 图表4：收益分布
     print("   [4/10] 收益分布...")
     daily_returns = df['return'].dropna() * 100
-    fig4 = go.Figure(data=[go.Histogram(x=daily_returns, nbinsx=50, name='日收益分布',
+    fig4 = go.Figure(data=[go.Histogram(x=_compact(daily_returns), nbinsx=50, name='日收益分布',
                                         marker_color='skyblue', opacity=0.7)])
     fig4.add_vline(x=daily_returns.mean(), line_dash="dash", line_color="red",
                    annotation_text=f"均值: {daily_returns.mean():.3f}%")
     fig4.update_layout(title='日收益率分布', xaxis_title='收益率 (%)', yaxis_title='频数',
                        template='plotly_white', height=500)
-    charts_html += f'<div class="chart-container">{fig4.to_html(include_plotlyjs=False, div_id="chart4")}</div>\n'
+    charts.append(_figure_html(fig4, "chart4"))
     
     # 图表5：年度对比
     print("   [5/10] 年度对比...")
-    yearly_stats = df.groupby('year').agg({
-        'nav': lambda x: (x.iloc[-1] / x.iloc[0] - 1) * 100 if len(x) > 0 else 0,
-        'drawdown': 'min'
-    }).round(2)
+    yearly_stats = pd.DataFrame({
+        'nav': yearly_ret.to_numpy(),
+        'drawdown': df.groupby('year')['drawdown'].min().to_numpy()
+    }, index=yearly_ret.index.year).round(2)
     
     fig5 = make_subplots(rows=1, cols=2, subplot_titles=('年度收益率', '年度最大回撤'))
     fig5.add_trace(go.Bar(x=yearly_stats.index.astype(str), y=yearly_stats['nav'],
@@ -128,31 +197,29 @@ def create_html_report():
     fig5.update_yaxes(title_text="收益率 (%)", row=1, col=1)
     fig5.update_yaxes(title_text="回撤 (%)", row=1, col=2)
     fig5.update_layout(height=400, template='plotly_white', showlegend=False)
-    charts_html += f'<div class="chart-container">{fig5.to_html(include_plotlyjs=False, div_id="chart5")}</div>\n'
+    charts.append(_figure_html(fig5, "chart5"))
     
     # 图表6：滚动夏普比率
     print("   [6/10] 滚动夏普比率...")
-    rolling_sharpe = df['return'].rolling(window=60).apply(
-        lambda x: x.mean() / x.std() * np.sqrt(252) if x.std() > 0 else 0
-    )
-    fig6 = go.Figure(data=go.Scatter(x=df['date'], y=rolling_sharpe, mode='lines',
+    rolling_sharpe = pa.rolling_sharpe(df['return'], window=60)
+    fig6 = go.Figure(data=go.Scatter(x=dates, y=_compact(rolling_sharpe), mode='lines',
                                      line=dict(color='purple', width=2), name='60日滚动夏普'))
     fig6.add_hline(y=0, line_dash="dash", line_color="gray")
     fig6.update_layout(title='滚动夏普比率 (60日窗口)', xaxis_title='日期', yaxis_title='夏普比率',
                        template='plotly_white', height=400)
-    charts_html += f'<div class="chart-container">{fig6.to_html(include_plotlyjs=False, div_id="chart6")}</div>\n'
+    charts.append(_figure_html(fig6, "chart6"))
     
     # 图表7：胜率分析
     print("   [7/10] 胜率分析...")
     win_df = pd.DataFrame({
         '指标': ['盈利天数', '亏损天数', '持平天数'],
-        '数量': [(df['return'] > 0).sum(), (df['return'] < 0).sum(), (df['return'] == 0).sum()]
+        '数量': [wins['n_win'], wins['n_loss'], wins['n_flat']]
     })
     fig7 = go.Figure(data=[go.Pie(labels=win_df['指标'], values=win_df['数量'],
                                   marker_colors=['#2ca02c', '#d62728', '#7f7f7f'])])
     fig7.update_layout(title=f'交易胜率分析 (总胜率: {win_rate:.2f}%)', height=400,
                        template='plotly_white')
-    charts_html += f'<div class="chart-container">{fig7.to_html(include_plotlyjs=False, div_id="chart7")}</div>\n'
+    charts.append(_figure_html(fig7, "chart7"))
     
     # 图表8：收益vs风险散点图
     print("   [8/10] 收益风险分析...")
@@ -171,31 +238,28 @@ def create_html_report():
                                      hovertemplate='%{text}<br>波动率: %{x:.2f}%<br>收益: %{y:.2f}%'))
     fig8.update_layout(title='月度收益-波动率散点图', xaxis_title='波动率 (%)', yaxis_title='平均收益率 (%)',
                        template='plotly_white', height=500)
-    charts_html += f'<div class="chart-container">{fig8.to_html(include_plotlyjs=False, div_id="chart8")}</div>\n'
+    charts.append(_figure_html(fig8, "chart8"))
     
     # 图表9：累计收益对比（策略 vs 基准）
     print("   [9/10] 累计收益对比...")
     df['累计收益'] = ((1 + df['return']).cumprod() - 1) * 100
     fig9 = go.Figure()
-    fig9.add_trace(go.Scatter(x=df['date'], y=df['累计收益'], mode='lines',
+    fig9.add_trace(go.Scatter(x=dates, y=_compact(df['累计收益']), mode='lines',
                               name='LightGBM策略', line=dict(color='blue', width=2)))
     fig9.add_hline(y=-15, line_dash="dash", line_color="red",
                    annotation_text="市场基准(估计: -15%)")
     fig9.update_layout(title='累计收益对比', xaxis_title='日期', yaxis_title='累计收益率 (%)',
                        template='plotly_white', height=500)
-    charts_html += f'<div class="chart-container">{fig9.to_html(include_plotlyjs=False, div_id="chart9")}</div>\n'
+    charts.append(_figure_html(fig9, "chart9"))
     
     # 图表10：月度收益柱状图
     print("   [10/10] 月度收益序列...")
-    monthly_ret = df.groupby(df['date'].dt.to_period('M')).apply(
-        lambda x: (x['nav'].iloc[-1] / x['nav'].iloc[0] - 1) * 100 if len(x) > 0 else 0
-    )
-    fig10 = go.Figure(data=[go.Bar(x=[str(m) for m in monthly_ret.index], y=monthly_ret.values,
+    fig10 = go.Figure(data=[go.Bar(x=monthly_ret.index.strftime('%Y-%m').tolist(), y=monthly_ret.values,
                                    marker_color=['green' if x > 0 else 'red' for x in monthly_ret.values])])
     fig10.update_layout(title='月度收益序列', xaxis_title='月份', yaxis_title='收益率 (%)',
                         template='plotly_white', height=400)
     fig10.update_xaxes(tickangle=-45)
-    charts_html += f'<div class="chart-container">{fig10.to_html(include_plotlyjs=False, div_id="chart10")}</div>\n'
+    charts.append(_figure_html(fig10, "chart10"))
     
     # 4. 生成HTML
     print("\n4. 生成HTML报告...")
@@ -206,8 +270,8 @@ def create_html_report():
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>LightGBM多因子策略回测报告</title>
-    <script src="https://cdn.plot.ly/plotly-2.26.0.min.js"></script>
+    <title>LightGBM多因子策略回测报告{f' - {run_name}' if run_name else ''}</title>
+    {plotly_script_tag(plotly_js)}
     <style>
         * {{
             margin: 0;
@@ -404,6 +468,7 @@ def create_html_report():
         <div class="header">
             <h1>🤖 LightGBM多因子量化策略</h1>
             <p>机器学习动态优化 · 2021-2024回测报告</p>
+            {f'<p>{run_name}</p>' if run_name else ''}
         </div>
         
         <div class="summary">
@@ -467,34 +532,34 @@ def create_html_report():
                 <h2 class="section-title">📈 核心图表分析</h2>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">1. 净值曲线</h3>
-                {charts_html.split('<div class="chart-container">')[1]}
+                <div class="chart-container">{charts[0]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">2. 净值与回撤分析</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[2].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[1]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">3. 月度收益热力图</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[3].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[2]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">4. 日收益率分布</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[4].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[3]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">5. 年度表现对比</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[5].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[4]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">6. 滚动夏普比率</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[6].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[5]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">7. 交易胜率分析</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[7].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[6]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">8. 月度收益-波动率分析</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[8].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[7]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">9. 累计收益对比</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[9].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[8]}</div>
                 
                 <h3 style="color: #495057; margin: 30px 0 15px 0;">10. 月度收益序列</h3>
-                <div class="chart-container">{charts_html.split('<div class="chart-container">')[10].split('</div>')[0]}</div>
+                <div class="chart-container">{charts[9]}</div>
             </div>
             
             <div class="section">
@@ -566,7 +631,6 @@ def create_html_report():
 """
     
     # 5. 保存HTML
-    output_file = r"d:\谷歌反重力\股票量化\LightGBM策略回测报告.html"
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(html_content)
     
@@ -578,7 +642,67 @@ def create_html_report():
     return output_file
 
 
-if __name__ == '__main__':
+def _render_report(input_file, output_file, plotly_js, run_name):
+    """进程池任务：静默生成一个报告"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return create_html_report(input_file, output_file, plotly_js=plotly_js, run_name=run_name)
+
+
+def create_html_reports(input_dir, output_dir, n_workers=None, pattern='*.csv'):
+    """
+    批量生成报告：input_dir下每个净值CSV生成一个同名HTML
+
+    Args:
+        input_dir: 回测结果CSV目录
+        output_dir: 报告输出目录（同时写入一份共用的plotly.js）
+        n_workers: 进程数（None为CPU核数）
+        pattern: CSV文件名匹配模式
+
+    Returns:
+        生成的报告路径列表（按文件名排序）；个别CSV出错时跳过并打印原因
+    """
+    input_files = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    print(f"\n📊 批量生成报告: {len(input_files)} 个回测结果 -> {output_dir}")
+    if not input_files:
+        return []
+    write_plotly_js(output_dir)
+
+    jobs = {}
+    n_workers = min(n_workers or os.cpu_count() or 1, len(input_files))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for input_file in input_files:
+            run_name = os.path.splitext(os.path.basename(input_file))[0]
+            output_file = os.path.join(output_dir, f'{run_name}.html')
+            jobs[pool.submit(_render_report, input_file, output_file, PLOTLY_JS_FILE, run_name)] = input_file
+
+        reports, failed = [], []
+        for future in tqdm(as_completed(jobs), total=len(jobs), desc="生成报告"):
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                failed.append((jobs[future], e))
+
+    for input_file, error in failed:
+        print(f"  ❌ {os.path.basename(input_file)}: {error}")
+    print(f"✅ 已生成 {len(reports)} 个报告（共用 {PLOTLY_JS_FILE}）")
+    return sorted(reports)
+
+
+def main():
+    # ==================== 配置参数 ====================
+    BATCH_INPUT_DIR = None  # 批量模式：回测结果CSV目录（None为只生成默认的单个报告）
+    BATCH_OUTPUT_DIR = r"d:\谷歌反重力\股票量化\reports"
+    N_WORKERS = None  # 批量模式进程数（None为CPU核数）
+    # ==================================================
+
+    if BATCH_INPUT_DIR is not None:
+        create_html_reports(BATCH_INPUT_DIR, BATCH_OUTPUT_DIR, n_workers=N_WORKERS)
+        return
+
     report_file = create_html_report()
     print(f"\n🎉 所有图表和报告已生成！")
     print(f"   双击打开: {report_file}")
+
+
+if __name__ == '__main__':
+    main()
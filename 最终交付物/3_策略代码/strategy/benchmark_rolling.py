@@ -0,0 +1,129 @@
+"""
+滚动指标基准测试 - rolling_kernels（面板列向量化） vs pandas groupby 逐股票计算
+
+在模拟行情（随机停牌）上分别用两种方式计算各滚动指标，
+输出耗时、加速比和最大相对误差。
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from price_panel import PricePanel
+
+
+def make_quotes(n_stocks, n_days, suspend_rate=0.03, seed=0):
+    """模拟长表行情（SecuCode, TradingDay, ClosePrice, TurnoverVolume），随机剔除部分停牌日"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-05', periods=n_days)
+    returns = rng.normal(0, 0.02, size=(n_days, n_stocks))
+    close = 10 * np.exp(np.cumsum(returns, axis=0))
+    volume = rng.lognormal(13, 0.5, size=(n_days, n_stocks)).round()
+
+    quotes = pd.DataFrame({
+        'SecuCode': np.tile(np.arange(1, n_stocks + 1), n_days),
+        'TradingDay': np.repeat(dates.values, n_stocks),
+        'ClosePrice': close.ravel(),
+        'TurnoverVolume': volume.ravel(),
+    })
+    return quotes[rng.random(len(quotes)) >= suspend_rate].reset_index(drop=True)
+
+
+def pandas_indicators(quotes):
+    """原实现口径：按股票分组，逐组 rolling / pct_change"""
+    df = quotes.sort_values(['SecuCode', 'TradingDay'])
+    close = df.groupby('SecuCode')['ClosePrice']
+    volume = df.groupby('SecuCode')['TurnoverVolume']
+
+    def rsi_calc(prices, period=14):
+        delta = prices.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(period, min_periods=period // 2).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(period, min_periods=period // 2).mean()
+        rs = gain / (loss + 1e-10)
+        return 100 - (100 / (1 + rs))
+
+    return {
+        'pct_change_20': lambda: close.pct_change(periods=20).to_numpy(),
+        'volume_ma_20': lambda: volume.transform(lambda x: x.rolling(20, min_periods=10).mean()).to_numpy(),
+        'volume_sum_20': lambda: volume.transform(lambda x: x.rolling(20, min_periods=10).sum()).to_numpy(),
+        'price_ma_250': lambda: close.transform(lambda x: x.rolling(250, min_periods=125).mean()).to_numpy(),
+        'price_std_20': lambda: close.transform(lambda x: x.rolling(20, min_periods=10).std()).to_numpy(),
+        'rsi_14': lambda: close.transform(rsi_calc).to_numpy(),
+    }
+
+
+def kernel_indicators(quotes):
+    """面板口径：构建一次float64面板，各指标整矩阵计算后转回长表顺序"""
+    panel = PricePanel.from_quotes(quotes, dtype=np.float64)
+    close = panel['ClosePrice']
+    volume = panel['TurnoverVolume']
+    long = lambda values: values.T[panel.valid.T]  # 与 sort_values(['SecuCode', 'TradingDay']) 行顺序一致
+
+    return {
+        'pct_change_20': lambda: long(panel.pct_change(close, 20)),
+        'volume_ma_20': lambda: long(panel.rolling_mean(volume, 20, 10)),
+        'volume_sum_20': lambda: long(panel.rolling_sum(volume, 20, 10)),
+        'price_ma_250': lambda: long(panel.rolling_mean(close, 250, 125)),
+        'price_std_20': lambda: long(panel.rolling_std(close, 20, 10)),
+        'rsi_14': lambda: long(panel.rsi(close, 14)),
+    }
+
+
+def _timed(func, repeat):
+    """多次运行取最短耗时"""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(n_stocks=2000, n_days=500, repeat=3):
+    """
+    Returns:
+        每个指标一行：pandas耗时、面板耗时、加速比、最大相对误差
+    """
+    quotes = make_quotes(n_stocks, n_days)
+    print(f"📊 模拟行情: {n_stocks} 只股票 x {n_days} 天，{len(quotes):,} 条")
+
+    build_time, kernels = _timed(lambda: kernel_indicators(quotes), repeat)
+    reference = pandas_indicators(quotes)
+
+    rows = []
+    for name in reference:
+        pandas_time, expected = _timed(reference[name], repeat)
+        kernel_time, actual = _timed(kernels[name], repeat)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rel_err = np.nanmax(np.abs(actual - expected) / np.maximum(np.abs(expected), 1e-12))
+        assert np.array_equal(np.isnan(actual), np.isnan(expected)), f"{name} 缺失位置不一致"
+        rows.append({
+            'indicator': name,
+            'pandas_s': pandas_time,
+            'kernel_s': kernel_time,
+            'speedup': pandas_time / kernel_time,
+            'max_rel_err': rel_err,
+        })
+
+    result = pd.DataFrame(rows)
+    print(f"  面板构建（一次，各指标共用）: {build_time:.3f}s")
+    print(result.to_string(index=False, float_format=lambda x: f'{x:.3g}'))
+    total_pandas = result['pandas_s'].sum()
+    total_kernel = result['kernel_s'].sum() + build_time
+    print(f"  合计: pandas {total_pandas:.2f}s vs 面板 {total_kernel:.2f}s（{total_pandas / total_kernel:.1f}x）")
+    return result
+
+
+def main():
+    # ==================== 配置参数 ====================
+    N_STOCKS = 2000
+    N_DAYS = 500
+    REPEAT = 3
+    # ==================================================
+
+    run_benchmark(N_STOCKS, N_DAYS, REPEAT)
+
+
+if __name__ == '__main__':
+    main()
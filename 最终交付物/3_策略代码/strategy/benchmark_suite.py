@@ -0,0 +1,399 @@
+"""
+端到端性能基准 - 在本地生成的模拟JYDB数据上逐阶段测量耗时与内存
+
+覆盖的阶段：
+- 数据加载：JYDBDataLoader（解析CSV / 读列式缓存 / 精简模式）
+- FactorCalculator 各因子方法、FactorProcessor 截面处理
+- 三个IRS生成器的向量化因子计算、IRS文件输出
+- simple_backtest、LightGBMFactorStrategy.backtest、create_html_report
+
+每个阶段先在tracemalloc下运行一次记录峰值内存，再不带追踪重复运行，取最短的墙钟/CPU时间。
+结果（数据规模、运行环境、各阶段指标）写为JSON；与基线文件逐阶段比较，
+耗时或内存超出容忍范围、或阶段运行出错即判为回归，打印明细并以非零退出码结束。
+"""
+
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import traceback
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+STRATEGY_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, STRATEGY_DIR)
+sys.path.insert(0, os.path.dirname(STRATEGY_DIR))
+from data_loader import JYDBDataLoader
+from factor_calculator import FactorCalculator
+from factor_processor import FactorProcessor
+from generate_irs_factors_fast import FastFactorGenerator
+from generate_irs_fixed import IRSFactorGenerator
+from generate_optimized_strategy import OptimizedFactorCalculator
+from irs_writer import IRSFileWriter
+from backtest_simple import simple_backtest
+from backtest_lightgbm import LightGBMFactorStrategy
+
+# plotly未安装时HTML报告阶段记为跳过（generate_html_report在导入时会尝试pip安装）
+PLOTLY_AVAILABLE = importlib.util.find_spec('plotly') is not None
+
+
+# ========== 模拟数据 ==========
+
+def make_jydb_data(data_dir, n_stocks, n_days, suspend_rate=0.03, seed=0):
+    """
+    在data_dir写入JYDB格式的模拟数据：日线行情、交易日历、股票列表、行业分类
+
+    - 收盘价为几何随机游走，每5只股票中有1只在样本前1/3的某天才上市
+    - 随机剔除suspend_rate比例的行情模拟停牌，行顺序打乱（数据库导出不保证有序）
+
+    Returns:
+        日线行情行数
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range('2020-01-01', periods=n_days)
+    codes = np.arange(1, n_stocks + 1)
+
+    listed = np.where(codes % 5 == 0, rng.integers(0, max(n_days // 3, 1), n_stocks), 0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_days, n_stocks)), axis=0))
+    volume = rng.integers(100_000, 10_000_000, size=(n_days, n_stocks))
+    keep = (np.arange(n_days)[:, None] >= listed) & (rng.random((n_days, n_stocks)) >= suspend_rate)
+
+    day_idx, stock_idx = np.nonzero(keep)
+    order = rng.permutation(len(day_idx))
+    day_idx, stock_idx = day_idx[order], stock_idx[order]
+    price = close[day_idx, stock_idx]
+    vol = volume[day_idx, stock_idx]
+    pd.DataFrame({
+        'InnerCode': stock_idx + 1000,
+        'SecuCode': codes[stock_idx],
+        'TradingDay': days.strftime('%Y-%m-%d')[day_idx],
+        'OpenPrice': (price * 0.99).round(2),
+        'HighPrice': (price * 1.02).round(2),
+        'LowPrice': (price * 0.98).round(2),
+        'ClosePrice': price.round(2),
+        'TurnoverVolume': vol,
+        'TurnoverValue': (vol * price).round(2),
+    }).to_csv(os.path.join(data_dir, 'daily_quotes.csv'), index=False)
+
+    calendar = pd.DataFrame({'TradingDate': pd.date_range(days[0], days[-1])})
+    calendar['IfTradingDay'] = calendar['TradingDate'].isin(days).astype(int)
+    calendar.to_csv(os.path.join(data_dir, 'trading_calendar.csv'), index=False)
+
+    pd.DataFrame({'SecuCode': codes, 'SecuAbbr': [f'股票{code}' for code in codes]}).to_csv(
+        os.path.join(data_dir, 'stock_list.csv'), index=False)
+    pd.DataFrame({'SecuCode': codes, 'Industry': rng.integers(1, 30, n_stocks)}).to_csv(
+        os.path.join(data_dir, 'industry_classification.csv'), index=False)
+    return len(day_idx)
+
+
+# ========== 计时与内存 ==========
+
+def _row_count(result):
+    """阶段输出的行数（DataFrame/列表等），无法计数时为None"""
+    if isinstance(result, (pd.DataFrame, pd.Series, list, tuple)):
+        return len(result)
+    return None
+
+
+def measure(func, repeat=3):
+    """
+    测量一个阶段
+
+    Returns:
+        {'wall_s', 'cpu_s', 'wall_runs', 'peak_mb', 'rows'}：
+        wall_s/cpu_s 为repeat次不带追踪运行中的最小值，peak_mb 为单独一次tracemalloc运行的峰值
+    """
+    silent = io.StringIO()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(silent), contextlib.redirect_stderr(silent):
+            result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rows = _row_count(result)
+    del result
+
+    wall_runs, cpu_runs = [], []
+    for _ in range(repeat):
+        gc.collect()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(silent), contextlib.redirect_stderr(silent):
+            func()
+        wall_runs.append(time.perf_counter() - wall_start)
+        cpu_runs.append(time.process_time() - cpu_start)
+        silent.seek(0)
+        silent.truncate()
+
+    return {
+        'wall_s': min(wall_runs),
+        'cpu_s': min(cpu_runs),
+        'wall_runs': wall_runs,
+        'peak_mb': peak / 1024 ** 2,
+        'rows': rows,
+    }
+
+
+# ========== 阶段定义 ==========
+
+def build_stages(data_dir, work_dir, lgb_train_days=120):
+    """
+    在模拟数据上构造各阶段的无参可调用对象
+
+    阶段之间的输入（回看行情、因子表、IRS文件、净值CSV）在这里预先准备好，
+    计时只覆盖阶段本身。
+
+    Returns:
+        [(阶段名, 可调用对象, 重复次数覆盖值或None)]，None表示使用全局重复次数
+    """
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        # 预热列式缓存，'loader.cache' 阶段测的是读缓存
+        loader = JYDBDataLoader(data_dir)
+        trading_days = loader.trading_days
+        end_date = trading_days[-1]
+        start_date = trading_days[min(FastFactorGenerator.LOOKBACK_DAYS, len(trading_days) // 2)]
+        calendar = loader.calendar
+        hist = loader.get_price_data(calendar.offset(end_date, -250), end_date)
+
+        calculator = FactorCalculator(loader)
+        daily_factors = calculator.calculate_all_factors(end_date)
+        fast = FastFactorGenerator(loader)
+        fast_factors = fast.calculate_all_factors_vectorized(start_date, end_date)
+        combined = fast.process_and_combine_factors(fast_factors)
+
+    factor_cols = [col for col in fast_factors.columns if col not in ('SecuCode', 'TradingDay')]
+    irs_dir = os.path.join(work_dir, 'irs_scores')
+    nav_file = os.path.join(work_dir, 'backtest_lightgbm.csv')
+    html_file = os.path.join(work_dir, 'report.html')
+    IRSFileWriter(irs_dir).write_scores(combined)
+
+    def lightgbm_backtest():
+        strategy = LightGBMFactorStrategy(loader, train_days=lgb_train_days, retrain_freq=20)
+        return strategy.backtest(start_date, end_date, top_n=50, output_file=nav_file)
+
+    stages = [
+        ('loader.csv', lambda: JYDBDataLoader(data_dir, use_cache=False).daily_quotes, None),
+        ('loader.cache', lambda: JYDBDataLoader(data_dir).daily_quotes, None),
+        ('loader.compact', lambda: JYDBDataLoader(data_dir, use_cache=False, compact=True).daily_quotes, None),
+        ('factor_calculator.momentum', lambda: calculator.calculate_momentum(hist, period=20), None),
+        ('factor_calculator.reversal', lambda: calculator.calculate_reversal(hist, period=5), None),
+        ('factor_calculator.volume_spike', lambda: calculator.calculate_volume_spike(hist, period=20), None),
+        ('factor_calculator.rsi', lambda: calculator.calculate_rsi(hist, period=14), None),
+        ('factor_calculator.ep_proxy', lambda: calculator.calculate_ep_proxy(hist), None),
+        ('factor_calculator.bp_proxy', lambda: calculator.calculate_bp_proxy(hist, period=250), None),
+        ('factor_calculator.all_factors', lambda: calculator.calculate_all_factors(end_date), None),
+        ('factor_processor.process_factors', lambda: FactorProcessor().process_factors(daily_factors), None),
+        ('factor_processor.process_factors_batch',
+         lambda: FactorProcessor().process_factors_batch(fast_factors, factor_cols), None),
+        ('generator.fast', lambda: fast.calculate_all_factors_vectorized(start_date, end_date), None),
+        ('generator.fixed',
+         lambda: IRSFactorGenerator(loader).calculate_all_factors_vectorized(start_date, end_date), None),
+        ('generator.optimized',
+         lambda: OptimizedFactorCalculator(loader).calculate_all_factors_vectorized(start_date, end_date), None),
+        ('irs_writer.write_scores', lambda: IRSFileWriter(irs_dir).write_scores(combined), None),
+        ('backtest.simple', lambda: simple_backtest(irs_dir, output_file=None, data_loader=loader), None),
+        # LightGBM回测耗时远大于其他阶段，只计时一次
+        ('backtest.lightgbm', lightgbm_backtest, 1),
+    ]
+
+    if PLOTLY_AVAILABLE:
+        from generate_html_report import create_html_report
+        stages.append(('report.html', lambda: create_html_report(nav_file, html_file), None))
+    else:
+        stages.append(('report.html', None, None))
+    return stages
+
+
+def run_suite(n_stocks, n_days, repeat=3, work_dir=None, suspend_rate=0.03, seed=0, lgb_train_days=120):
+    """
+    生成模拟数据并逐阶段测量
+
+    Args:
+        work_dir: 模拟数据与中间文件目录（None为临时目录，结束后删除）
+
+    Returns:
+        结果字典：{'config', 'environment', 'stages': {阶段名: 指标}}
+    """
+    cleanup = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='jydb_bench_')
+    data_dir = os.path.join(work_dir, 'data')
+
+    try:
+        start_time = time.time()
+        n_rows = make_jydb_data(data_dir, n_stocks, n_days, suspend_rate, seed)
+        print(f"📊 模拟数据: {n_stocks} 只股票 x {n_days} 天，{n_rows:,} 条行情"
+              f"（生成 {time.time() - start_time:.1f}s）")
+
+        stages = build_stages(data_dir, work_dir, lgb_train_days)
+        results = {}
+        for name, func, stage_repeat in stages:
+            if func is None:
+                results[name] = {'status': 'skipped', 'reason': 'plotly未安装'}
+                print(f"  ⏭️  {name:<42} 跳过（plotly未安装）")
+                continue
+            try:
+                metrics = measure(func, repeat if stage_repeat is None else stage_repeat)
+            except Exception as e:
+                results[name] = {'status': 'error', 'error': f'{type(e).__name__}: {e}',
+                                 'traceback': traceback.format_exc()}
+                print(f"  ❌ {name:<42} 出错: {e}")
+                continue
+            results[name] = {'status': 'ok', **metrics}
+            rows = '' if metrics['rows'] is None else f"{metrics['rows']:>10,} 行"
+            print(f"  ✅ {name:<42} {metrics['wall_s']:8.3f}s  CPU {metrics['cpu_s']:8.3f}s"
+                  f"  峰值 {metrics['peak_mb']:8.1f}MB  {rows}")
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'config': {
+            'n_stocks': n_stocks,
+            'n_days': n_days,
+            'suspend_rate': suspend_rate,
+            'seed': seed,
+            'lgb_train_days': lgb_train_days,
+            'n_rows': n_rows,
+        },
+        'environment': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'stages': results,
+    }
+
+
+# ========== 基线比较 ==========
+
+def compare_with_baseline(results, baseline, time_tolerance=0.3, memory_tolerance=0.2,
+                          min_time_delta=0.05, min_memory_delta=1.0):
+    """
+    逐阶段与基线比较
+
+    耗时（墙钟最小值）超过基线 (1+time_tolerance) 倍且多出min_time_delta秒以上，
+    或峰值内存超过基线 (1+memory_tolerance) 倍且多出min_memory_delta MB以上，判为回归；
+    基线中正常的阶段本次出错或缺失也判为回归。绝对差阈值用于过滤极短阶段的计时抖动。
+
+    Returns:
+        (对比表DataFrame, 回归描述列表)
+    """
+    if baseline['config'] != results['config']:
+        raise ValueError(f"基线的数据规模与本次不同，无法比较: 基线 {baseline['config']}，本次 {results['config']}")
+
+    rows, regressions = [], []
+    for name, base in baseline['stages'].items():
+        if base.get('status') != 'ok':
+            continue
+        current = results['stages'].get(name)
+        if current is None or current['status'] == 'error':
+            regressions.append(f"{name}: 基线正常，本次{'缺失' if current is None else '出错'}")
+            continue
+        if current['status'] != 'ok':
+            print(f"  ⚠️  {name}: 本次{current['status']}（{current.get('reason', '')}），不参与比较")
+            continue
+
+        time_ratio = current['wall_s'] / max(base['wall_s'], 1e-9)
+        memory_ratio = current['peak_mb'] / max(base['peak_mb'], 1e-9)
+        time_regressed = (time_ratio > 1 + time_tolerance
+                          and current['wall_s'] - base['wall_s'] > min_time_delta)
+        memory_regressed = (memory_ratio > 1 + memory_tolerance
+                            and current['peak_mb'] - base['peak_mb'] > min_memory_delta)
+        if time_regressed:
+            regressions.append(f"{name}: 耗时 {base['wall_s']:.3f}s -> {current['wall_s']:.3f}s（{time_ratio:.2f}x）")
+        if memory_regressed:
+            regressions.append(f"{name}: 峰值内存 {base['peak_mb']:.1f}MB -> {current['peak_mb']:.1f}MB"
+                               f"（{memory_ratio:.2f}x）")
+        rows.append({
+            'stage': name,
+            'base_s': base['wall_s'],
+            'now_s': current['wall_s'],
+            'time_x': time_ratio,
+            'base_mb': base['peak_mb'],
+            'now_mb': current['peak_mb'],
+            'memory_x': memory_ratio,
+            'regressed': time_regressed or memory_regressed,
+        })
+    return pd.DataFrame(rows), regressions
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    # ==================== 配置参数 ====================
+    N_STOCKS = 500
+    N_DAYS = 600
+    REPEAT = 3
+    WORK_DIR = None  # 模拟数据与中间文件目录（None为临时目录，结束后删除）
+    RESULT_FILE = os.path.join(STRATEGY_DIR, 'benchmark_result.json')
+    BASELINE_FILE = os.path.join(STRATEGY_DIR, 'benchmark_baseline.json')
+    UPDATE_BASELINE = False  # True: 用本次结果覆盖基线
+    TIME_TOLERANCE = 0.3  # 耗时允许增加的比例
+    MEMORY_TOLERANCE = 0.2  # 峰值内存允许增加的比例
+    # ==================================================
+
+    print("\n" + "=" * 80)
+    print("⏱️  端到端性能基准")
+    print("=" * 80)
+
+    results = run_suite(N_STOCKS, N_DAYS, REPEAT, WORK_DIR)
+    _write_json(RESULT_FILE, results)
+    print(f"\n✅ 结果已保存: {RESULT_FILE}")
+
+    errors = [name for name, stage in results['stages'].items() if stage['status'] == 'error']
+    for name in errors:
+        print(f"\n❌ 阶段出错: {name}\n{results['stages'][name]['traceback']}")
+
+    if UPDATE_BASELINE or not os.path.exists(BASELINE_FILE):
+        _write_json(BASELINE_FILE, results)
+        print(f"✅ 基线已{'更新' if UPDATE_BASELINE else '创建'}: {BASELINE_FILE}")
+        return 1 if errors else 0
+
+    with open(BASELINE_FILE, encoding='utf-8') as f:
+        baseline = json.load(f)
+    try:
+        comparison, regressions = compare_with_baseline(results, baseline, TIME_TOLERANCE, MEMORY_TOLERANCE)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        return 1
+
+    print(f"\n📈 与基线比较（{baseline['environment']['timestamp']}）")
+    print(comparison.to_string(index=False, float_format=lambda x: f'{x:.3g}'))
+
+    if regressions:
+        print("\n" + "!" * 80)
+        print(f"❌ 检测到 {len(regressions)} 项性能回归:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        print("!" * 80)
+        return 1
+    if errors:
+        return 1
+    print("\n✅ 未发现性能回归")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
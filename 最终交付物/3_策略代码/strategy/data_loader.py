@@ -4,81 +4,360 @@ JYDB数据加载器 - 从本地CSV文件加载数据
 
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
 from datetime import datetime
+import hashlib
 import os
 
+from instrumentation import traced
+from table_cache import TableCache
+from trading_calendar import TradingCalendar
+
+
+class DataSpec:
+    """
+    数据需求声明：作业要用哪些表、哪段日期的行情
+
+    声明的表在加载器构造时读取，其余表在首次访问对应属性时才读取；
+    给定日期窗口时只保留 [start_date前lookback_days个交易日, end_date] 的日线行情。
+    """
+
+    TABLES = ('daily_quotes', 'trading_calendar', 'stock_list', 'industry_classification')
+
+    def __init__(self, tables=('daily_quotes', 'trading_calendar'),
+                 start_date=None, end_date=None, lookback_days=0):
+        """
+        参数:
+            tables: 构造时预先加载的表（TABLES中的名称）
+            start_date: 行情窗口开始日期（None为不限）
+            end_date: 行情窗口结束日期（None为不限）
+            lookback_days: 开始日期之前额外保留的交易日数（滚动因子预热用）
+        """
+        unknown = [name for name in tables if name not in self.TABLES]
+        if unknown:
+            raise ValueError(f"未知的数据表: {unknown}，可选: {list(self.TABLES)}")
+        self.tables = tuple(tables)
+        self.start_date = None if start_date is None else pd.Timestamp(start_date)
+        self.end_date = None if end_date is None else pd.Timestamp(end_date)
+        self.lookback_days = lookback_days
+
+    @property
+    def has_window(self):
+        return self.start_date is not None or self.end_date is not None
+
+
 class JYDBDataLoader:
     """JYDB数据加载器 - 从本地CSV文件加载"""
     
-    def __init__(self, data_dir=r'd:\谷歌反重力\股票量化\data'):
+    # 紧凑模式默认保留的行情列（现有因子只用到收盘价和成交量）
+    COMPACT_QUOTE_COLUMNS = ('TradingDay', 'SecuCode', 'ClosePrice', 'TurnoverVolume')
+    
+    def __init__(self, data_dir=r'd:\谷歌反重力\股票量化\data', use_cache=True, cache_dir=None,
+                 compact=False, quote_columns=None, chunksize=500_000, spec=None):
+        """
+        参数:
+            data_dir: JYDB导出的CSV所在目录
+            use_cache: 是否启用列式磁盘缓存（首次解析CSV后写入，之后内存映射读取）
+            cache_dir: 缓存目录（默认为 data_dir/.cache）
+            compact: 紧凑模式：日线行情分块流式读取，只保留quote_columns，
+                价格转float32、整数列降到最小整型、SecuCode转为int32（纯数字代码）或category
+            quote_columns: 紧凑模式保留的行情列（默认COMPACT_QUOTE_COLUMNS）
+            chunksize: 紧凑模式每块读取的行数
+            spec: 数据需求声明（DataSpec），默认预先加载全部日线行情和交易日历，
+                股票列表、行业分类在首次访问时加载
+        """
         self.data_dir = data_dir
-        self.daily_quotes = None
-        self.trading_calendar = None
-        self.stock_list = None
-        self.industry = None
-        self.trading_days = None
+        self.use_cache = use_cache
+        self.cache = TableCache(cache_dir or os.path.join(data_dir, '.cache')) if use_cache else None
+        self.compact = compact
+        self.quote_columns = list(quote_columns or self.COMPACT_QUOTE_COLUMNS)
+        self.chunksize = chunksize
+        self.spec = spec if spec is not None else DataSpec()
+        self._daily_quotes = None
+        self._trading_calendar = None
+        self._stock_list = None
+        self._industry = None
+        self._trading_days = None
+        self._calendar = None
         self._load_all_data()
     
     def _load_all_data(self):
-        """一次性加载所有数据到内存"""
+        """加载数据需求声明中的表（其余表按需加载）"""
         print("=" * 80)
         print("📥 正在加载数据...")
         print("=" * 80)
         
-        # 1. 加载日线数据
-        print("  [1/4] 加载日线行情数据...") 
-        daily_quotes_file = os.path.join(self.data_dir, 'daily_quotes.csv')
-        self.daily_quotes = pd.read_csv(daily_quotes_file)
-        self.daily_quotes['TradingDay'] = pd.to_datetime(self.daily_quotes['TradingDay'])
-        print(f"        ✅ 日线数据: {len(self.daily_quotes):,} 条")
-        
-        # 2. 加载交易日历
-        print("  [2/4] 加载交易日历...")
-        calendar_file = os.path.join(self.data_dir, 'trading_calendar.csv')
-        self.trading_calendar = pd.read_csv(calendar_file)
-        self.trading_calendar['TradingDate'] = pd.to_datetime(self.trading_calendar['TradingDate'])
-        self.trading_days = self.trading_calendar[
-            self.trading_calendar['IfTradingDay'] == 1
-        ]['TradingDate'].sort_values().tolist()
-        print(f"        ✅ 交易日: {len(self.trading_days):,} 天")
-        
-        # 3. 加载股票列表
-        print("  [3/4] 加载股票列表...")
-        stock_list_file = os.path.join(self.data_dir, 'stock_list.csv')
-        self.stock_list = pd.read_csv(stock_list_file)
-        print(f"        ✅ 股票数量: {len(self.stock_list):,} 只")
-        
-        # 4. 加载行业分类
-        print("  [4/4] 加载行业分类...")
-        industry_file = os.path.join(self.data_dir, 'industry_classification.csv')
-        self.industry = pd.read_csv(industry_file)
-        print(f"        ✅ 行业记录: {len(self.industry):,} 条")
+        # 日期窗口的预热期按交易日计算，需要先有交易日历
+        loaders = {
+            'trading_calendar': self._load_calendar,
+            'daily_quotes': self._load_daily_quotes,
+            'stock_list': self._load_stock_list,
+            'industry_classification': self._load_industry,
+        }
+        for name in loaders:
+            if name in self.spec.tables:
+                loaders[name]()
         
         print("\n" + "=" * 80)
         print("✅ 数据加载完成！")
         print("=" * 80)
-        print(f"数据时间范围: {self.daily_quotes['TradingDay'].min().date()} 至 {self.daily_quotes['TradingDay'].max().date()}")
-        print(f"交易日范围: {self.trading_days[0].date()} 至 {self.trading_days[-1].date()}")
+        if self._daily_quotes is not None and len(self._daily_quotes):
+            print(f"数据时间范围: {self._daily_quotes['TradingDay'].min().date()} 至 {self._daily_quotes['TradingDay'].max().date()}")
+        if self._trading_days:
+            print(f"交易日范围: {self._trading_days[0].date()} 至 {self._trading_days[-1].date()}")
+        lazy = [name for name in DataSpec.TABLES if name not in self.spec.tables]
+        if lazy:
+            print(f"按需加载: {', '.join(lazy)}")
         print("=" * 80)
         print()
     
-    def get_price_data(self, start_date, end_date):
-        """获取指定时间段的价格数据"""
-        mask = (
-            (self.daily_quotes['TradingDay'] >= start_date) &
-            (self.daily_quotes['TradingDay'] <= end_date)
+    # ---------- 各表按需加载 ----------
+    
+    @property
+    def daily_quotes(self):
+        """日线行情（按 TradingDay, SecuCode 排序）"""
+        if self._daily_quotes is None:
+            self._load_daily_quotes()
+        return self._daily_quotes
+    
+    @property
+    def trading_calendar(self):
+        """交易日历原表"""
+        if self._trading_calendar is None:
+            self._load_calendar()
+        return self._trading_calendar
+    
+    @property
+    def trading_days(self):
+        """交易日列表"""
+        if self._trading_days is None:
+            self._load_calendar()
+        return self._trading_days
+    
+    @property
+    def calendar(self):
+        """交易日历（TradingCalendar）"""
+        if self._calendar is None:
+            self._load_calendar()
+        return self._calendar
+    
+    @property
+    def stock_list(self):
+        """股票列表"""
+        if self._stock_list is None:
+            self._load_stock_list()
+        return self._stock_list
+    
+    @property
+    def industry(self):
+        """行业分类"""
+        if self._industry is None:
+            self._load_industry()
+        return self._industry
+    
+    @traced()
+    def _load_daily_quotes(self):
+        print("  📄 加载日线行情数据...")
+        window = self._quote_window()
+        if self.compact:
+            self._daily_quotes = self._read_quotes_compact(window)
+        else:
+            self._daily_quotes = self._read_table(
+                'daily_quotes', date_col='TradingDay', sort_by=['TradingDay', 'SecuCode']
+            )
+        self._build_date_index()
+        if window is not None:
+            # 缓存中是全表，按窗口截取后复制一份，全表随即释放
+            lo, hi = self._row_range(*window)
+            self._daily_quotes = self._daily_quotes.iloc[lo:hi].copy().reset_index(drop=True)
+            self._build_date_index()
+        memory_mb = self._daily_quotes.memory_usage(deep=True).sum() / 1024 ** 2
+        print(f"        ✅ 日线数据: {len(self._daily_quotes):,} 条（{memory_mb:,.0f} MB）")
+        return self._daily_quotes
+    
+    @traced()
+    def _load_calendar(self):
+        print("  📄 加载交易日历...")
+        self._trading_calendar = self._read_table('trading_calendar', date_col='TradingDate')
+        self._trading_days = self._trading_calendar[
+            self._trading_calendar['IfTradingDay'] == 1
+        ]['TradingDate'].sort_values().tolist()
+        self._calendar = TradingCalendar(self._trading_days)
+        print(f"        ✅ 交易日: {len(self._trading_days):,} 天")
+        return self._trading_days
+    
+    @traced()
+    def _load_stock_list(self):
+        print("  📄 加载股票列表...")
+        self._stock_list = self._read_table('stock_list')
+        print(f"        ✅ 股票数量: {len(self._stock_list):,} 只")
+        return self._stock_list
+    
+    @traced()
+    def _load_industry(self):
+        print("  📄 加载行业分类...")
+        self._industry = self._read_table('industry_classification')
+        print(f"        ✅ 行业记录: {len(self._industry):,} 条")
+        return self._industry
+    
+    def _quote_window(self):
+        """数据需求声明中的行情日期窗口 (开始, 结束)，开始日期已含预热期；无窗口时为None"""
+        spec = self.spec
+        if not spec.has_window:
+            return None
+        start_date = spec.start_date
+        if start_date is not None and spec.lookback_days:
+            start_date = self.calendar.offset(start_date, -spec.lookback_days)
+        return start_date, spec.end_date
+    
+    def _read_table(self, name, date_col=None, sort_by=None):
+        """读取一张表，启用缓存时优先从列式缓存读取（缓存中保存的是排序后的结果）"""
+        csv_file = os.path.join(self.data_dir, f'{name}.csv')
+
+        def parse_csv(path):
+            df = pd.read_csv(path)
+            if date_col is not None:
+                df[date_col] = pd.to_datetime(df[date_col])
+            if sort_by is not None:
+                df = df.sort_values(sort_by, kind='mergesort').reset_index(drop=True)
+            return df
+        
+        if self.cache is None:
+            return parse_csv(csv_file)
+        
+        df, hit = self.cache.load(csv_file, parse_csv)
+        print(f"        {'⚡ 命中缓存' if hit else '💾 已写入缓存'} ({self.cache.format})")
+        return df
+    
+    def init_kwargs(self):
+        """重建同样配置的加载器所需的构造参数（子进程从列式缓存重建数据用）"""
+        return {
+            'data_dir': self.data_dir,
+            'use_cache': self.use_cache,
+            'cache_dir': self.cache.cache_dir if self.cache else None,
+            'compact': self.compact,
+            'quote_columns': self.quote_columns,
+            'chunksize': self.chunksize,
+            'spec': self.spec,
+        }
+    
+    def _read_quotes_compact(self, window=None):
+        """
+        紧凑模式读取日线行情：分块解析，每块立即压缩类型后再合并，
+        解析过程中不会出现整表float64/object的峰值
+        
+        不使用缓存时，窗口 (开始, 结束) 之外的行在每块解析后立即丢弃；
+        使用缓存时缓存的是全表，由调用方截取窗口
+        """
+        csv_file = os.path.join(self.data_dir, 'daily_quotes.csv')
+        columns = self.quote_columns
+        
+        def parse_chunks(path, window=None):
+            chunks = []
+            for chunk in pd.read_csv(path, usecols=columns, chunksize=self.chunksize):
+                chunk = self._compact_chunk(chunk)
+                if window is not None:
+                    days = chunk['TradingDay']
+                    keep = np.ones(len(chunk), dtype=bool)
+                    if window[0] is not None:
+                        keep &= (days >= window[0]).to_numpy()
+                    if window[1] is not None:
+                        keep &= (days <= window[1]).to_numpy()
+                    chunk = chunk[keep]
+                chunks.append(chunk)
+            df = self._concat_chunks(chunks, columns)
+            return df.sort_values(['TradingDay', 'SecuCode'], kind='mergesort').reset_index(drop=True)
+        
+        if self.cache is None:
+            return parse_chunks(csv_file, window)
+        
+        # 不同列集合的紧凑表分别缓存
+        variant = 'compact-' + hashlib.md5(','.join(columns).encode('utf-8')).hexdigest()[:8]
+        df, hit = self.cache.load(csv_file, parse_chunks, variant=variant)
+        print(f"        {'⚡ 命中缓存' if hit else '💾 已写入缓存'} ({self.cache.format}, 紧凑模式)")
+        return df
+    
+    @staticmethod
+    def _compact_chunk(chunk):
+        """单块行情压缩类型"""
+        for col in chunk.columns:
+            values = chunk[col]
+            if col == 'TradingDay':
+                chunk[col] = pd.to_datetime(values)
+            elif col == 'SecuCode':
+                # 纯数字代码（CSV中无引号的000001会被解析为整数1）用int32，否则留作字符串待合并后转category
+                chunk[col] = values.astype(np.int32) if pd.api.types.is_integer_dtype(values) else values.astype(str)
+            elif pd.api.types.is_integer_dtype(values):
+                chunk[col] = pd.to_numeric(values, downcast='integer')
+            elif pd.api.types.is_float_dtype(values):
+                chunk[col] = values.astype(np.float32)
+        return chunk
+    
+    @staticmethod
+    def _concat_chunks(chunks, columns):
+        """合并各块；SecuCode在所有块都是整数时保持int32，否则统一为有序category"""
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        codes = [chunk['SecuCode'] for chunk in chunks]
+        if all(pd.api.types.is_integer_dtype(c) for c in codes):
+            return pd.concat(chunks, ignore_index=True)
+        
+        secu_code = union_categoricals(
+            [pd.Categorical(c.astype(str)) for c in codes], sort_categories=True
         )
-        return self.daily_quotes[mask].copy()
+        df = pd.concat([chunk.drop(columns='SecuCode') for chunk in chunks], ignore_index=True)
+        df['SecuCode'] = secu_code
+        return df[[col for col in columns if col in df.columns]]
+    
+    def _build_date_index(self):
+        """
+        建立 日期 -> 行偏移 索引（要求daily_quotes已按TradingDay排序）
+
+        self._quote_days[i] 当天的数据位于
+        daily_quotes.iloc[self._day_offsets[i]:self._day_offsets[i + 1]]
+        """
+        days = self._daily_quotes['TradingDay'].to_numpy()
+        if len(days) > 1 and (days[1:] < days[:-1]).any():
+            # 兼容旧缓存/外部传入的未排序数据
+            self._daily_quotes = self._daily_quotes.sort_values(
+                ['TradingDay', 'SecuCode'], kind='mergesort'
+            ).reset_index(drop=True)
+            days = self._daily_quotes['TradingDay'].to_numpy()
+
+        starts = np.flatnonzero(days[1:] != days[:-1]) + 1
+        self._day_offsets = np.concatenate([[0], starts, [len(days)]])
+        self._quote_days = pd.DatetimeIndex(days[self._day_offsets[:-1]])
+
+    def _row_range(self, start_date=None, end_date=None):
+        """二分查找日期区间 [start_date, end_date] 对应的行区间"""
+        if self._daily_quotes is None:
+            self._load_daily_quotes()
+        lo = 0 if start_date is None else self._quote_days.searchsorted(pd.Timestamp(start_date), side='left')
+        hi = len(self._quote_days) if end_date is None else self._quote_days.searchsorted(pd.Timestamp(end_date), side='right')
+        return self._day_offsets[lo], self._day_offsets[max(lo, hi)]
+
+    def get_price_data(self, start_date, end_date, copy=False):
+        """
+        获取指定时间段的价格数据
+
+        Args:
+            start_date: 开始日期（含）
+            end_date: 结束日期（含）
+            copy: 是否返回副本；默认返回行切片视图，调用方不应原地修改
+        """
+        lo, hi = self._row_range(start_date, end_date)
+        data = self.daily_quotes.iloc[lo:hi]
+        return data.copy() if copy else data
     
     def get_trading_days(self, start_date, end_date):
         """获取指定时间段的交易日"""
-        return [d for d in self.trading_days 
-                if start_date <= d <= end_date]
+        return self.calendar.range(start_date, end_date)
     
-    def get_latest_data_before_date(self, date):
-        """获取某日期之前最新的数据"""
-        mask = self.daily_quotes['TradingDay'] <= date
-        return self.daily_quotes[mask].copy()
+    def get_latest_data_before_date(self, date, copy=False):
+        """获取某日期之前最新的数据（copy含义同get_price_data）"""
+        lo, hi = self._row_range(end_date=date)
+        data = self.daily_quotes.iloc[lo:hi]
+        return data.copy() if copy else data
 
 
 if __name__ == '__main__':
@@ -0,0 +1,152 @@
+"""
+因子包 - 代替逐日IRS因子CSV的单文件二进制格式
+
+文件布局（各数据段按64字节对齐，数值均为小端）：
+- 8字节魔数 b'IRSBNDL1' + 8字节头部长度（uint64）+ UTF-8 JSON头部（各段的偏移、形状、dtype）
+- dates:  datetime64[D]，日期索引（升序）
+- codes:  定长字节串，股票代码表（与IRS文件中的代码一致，如 000001）
+- scores: float32 (日期数, 股票数) 矩阵，某日文件中没有的股票为NaN
+
+打开时只解析头部，三段都通过 np.memmap 映射，某一天的分数就是矩阵的一行；
+export_csv 按需还原逐日IRS文件（日内按股票代码表顺序，数值为float32）。
+"""
+
+import glob
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'IRSBNDL1'
+ALIGN = 64
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+class FactorBundle:
+    """只读的内存映射因子包"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, header_len = struct.unpack('<8sQ', f.read(16))
+            if magic != MAGIC:
+                raise ValueError(f"不是因子包文件: {path}")
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        self.value_name = header['value_name']
+
+        def section(name):
+            info = header['sections'][name]
+            if 0 in info['shape']:
+                return np.empty(info['shape'], dtype=np.dtype(info['dtype']))
+            return np.memmap(path, dtype=np.dtype(info['dtype']), mode='r',
+                             offset=info['offset'], shape=tuple(info['shape']))
+
+        self.dates = pd.DatetimeIndex(np.asarray(section('dates')).astype('datetime64[ns]'))
+        self.codes = np.asarray(section('codes')).astype(str)
+        self.scores = section('scores')
+
+    def __len__(self):
+        return len(self.dates)
+
+    # ========== 写入 ==========
+
+    @staticmethod
+    def write(path, dates, codes, scores, value_name='factor_score'):
+        """
+        写入因子包（先写临时文件再替换，读者不会看到写了一半的文件）
+
+        Args:
+            dates: 升序日期
+            codes: 股票代码（字符串）
+            scores: (len(dates), len(codes)) 矩阵，缺失为NaN
+        """
+        dates = np.asarray(pd.DatetimeIndex(dates).values.astype('datetime64[D]'))
+        codes = np.asarray(codes, dtype=str).astype('S')
+        scores = np.ascontiguousarray(scores, dtype='<f4')
+        if scores.shape != (len(dates), len(codes)):
+            raise ValueError(f"分数矩阵形状 {scores.shape} 与日期数/股票数 ({len(dates)}, {len(codes)}) 不符")
+
+        arrays = {'dates': dates.astype('<M8[D]'), 'codes': codes, 'scores': scores}
+        # 头部长度依赖各段偏移，先按足够大的头部预留位置
+        sections, offset = {}, _align(16 + 4096 + 256 * len(arrays))
+        for name, array in arrays.items():
+            sections[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+        header = json.dumps({'version': 1, 'value_name': value_name, 'sections': sections}).encode('utf-8')
+        if 16 + len(header) > sections['dates']['offset']:
+            raise ValueError("因子包头部过长")
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('<8sQ', MAGIC, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(sections[name]['offset'])
+                f.write(array.tobytes())
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_long(cls, path, days, codes, values, value_name='factor_score'):
+        """由长表的 (日期, 代码, 数值) 三列写入因子包；同一日同一代码重复时取最后一行"""
+        day_idx, unique_days = pd.factorize(pd.DatetimeIndex(days), sort=True)
+        stock_idx, unique_codes = pd.factorize(pd.Series(codes, dtype=str), sort=True)
+        scores = np.full((len(unique_days), len(unique_codes)), np.nan, dtype=np.float32)
+        scores[day_idx, stock_idx] = values
+        cls.write(path, unique_days, np.asarray(unique_codes), scores, value_name)
+        return cls(path)
+
+    @classmethod
+    def from_csv_dir(cls, factor_dir, path, value_name='factor_score'):
+        """把逐日IRS因子CSV目录（yyyyMMdd.csv：股票代码,数值）转换为因子包"""
+        frames = []
+        for factor_file in sorted(glob.glob(os.path.join(factor_dir, '*.csv'))):
+            date_str = os.path.splitext(os.path.basename(factor_file))[0]
+            df = pd.read_csv(factor_file, header=None, names=['stock_code', 'value'], dtype={'stock_code': str})
+            frames.append(df.assign(date=pd.Timestamp(date_str)))
+        if not frames:
+            raise ValueError(f"目录中没有因子文件: {factor_dir}")
+        df = pd.concat(frames, ignore_index=True)
+        return cls.from_long(path, df['date'], df['stock_code'], df['value'].to_numpy(), value_name)
+
+    # ========== 读取 ==========
+
+    def day(self, date):
+        """
+        某日有分数的股票
+
+        Returns:
+            (股票代码数组, float32分数数组)；包中没有该日期时返回None
+        """
+        loc = self.dates.get_indexer([pd.Timestamp(date)])[0]
+        if loc < 0:
+            return None
+        row = np.asarray(self.scores[loc])
+        valid = ~np.isnan(row)
+        return self.codes[valid], row[valid]
+
+    def export_csv(self, output_dir, start_date=None, end_date=None, n_threads=8):
+        """
+        还原逐日IRS因子文件（yyyyMMdd.csv：股票代码,数值）
+
+        Returns:
+            生成的文件路径列表
+        """
+        from irs_writer import IRSFileWriter
+
+        lo = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date), 'left')
+        hi = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), 'right')
+        scores = np.asarray(self.scores[lo:hi])
+        day_idx, stock_idx = np.nonzero(~np.isnan(scores))
+        frame = pd.DataFrame({
+            'SecuCode': self.codes[stock_idx],
+            'TradingDay': self.dates[lo:hi][day_idx],
+            self.value_name: scores[day_idx, stock_idx],
+        })
+        return IRSFileWriter(output_dir, n_threads=n_threads).write(frame, self.value_name)
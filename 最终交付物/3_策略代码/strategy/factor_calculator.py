@@ -5,50 +5,56 @@
 import pandas as pd
 import numpy as np
 
+from incremental_factors import IncrementalFactorEngine
+from instrumentation import traced
+from price_panel import PricePanel
+
 class FactorCalculator:
     """多因子计算器"""
     
-    def __init__(self, data_loader):
+    def __init__(self, data_loader, incremental=False):
+        """
+        参数:
+            data_loader: 数据加载器
+            incremental: 是否使用增量滚动因子引擎（按日期递增调用时每天只做O(股票数)的更新）
+        """
         self.data_loader = data_loader
+        self.engine = IncrementalFactorEngine(data_loader) if incremental else None
+    
+    # 面板因子的输出顺序与 sort_values(['SecuCode', 'TradingDay']) 一致
+    
+    @staticmethod
+    def _panel_factor(df, name, compute):
+        """在float64行情面板上计算因子，转回长表 (SecuCode, TradingDay, name) 并去掉缺失"""
+        panel = PricePanel.from_quotes(df, dtype=np.float64)
+        return panel.to_long({name: compute(panel)}).dropna()
     
     # ========== 量价因子 ==========
     
     def calculate_momentum(self, df, period=20):
         """动量因子 - 过去N天收益率"""
-        df = df.sort_values(['SecuCode', 'TradingDay'])
-        df['momentum'] = df.groupby('SecuCode')['ClosePrice'].pct_change(periods=period)
-        return df[['SecuCode', 'TradingDay', 'momentum']].dropna()
+        return self._panel_factor(
+            df, 'momentum', lambda panel: panel.pct_change(panel['ClosePrice'], period)
+        )
     
     def calculate_reversal(self, df, period=5):
         """短期反转因子 - 反向动量"""
-        df = df.sort_values(['SecuCode', 'TradingDay'])
-        df['reversal'] = -df.groupby('SecuCode')['ClosePrice'].pct_change(periods=period)
-        return df[['SecuCode', 'TradingDay', 'reversal']].dropna()
+        return self._panel_factor(
+            df, 'reversal', lambda panel: -panel.pct_change(panel['ClosePrice'], period)
+        )
     
     def calculate_volume_spike(self, df, period=20):
         """成交量异常因子 - 相对于均值的变化"""
-        df = df.sort_values(['SecuCode', 'TradingDay'])
-        df['vol_ma'] = df.groupby('SecuCode')['TurnoverVolume'].transform(
-            lambda x: x.rolling(period, min_periods=period//2).mean()
-        )
-        df['volume_spike'] = df['TurnoverVolume'] / (df['vol_ma'] + 1e-10)
-        return df[['SecuCode', 'TradingDay', 'volume_spike']].dropna()
+        def volume_spike(panel):
+            volume = panel['TurnoverVolume']
+            return volume / (panel.rolling_mean(volume, period, period // 2) + 1e-10)
+        return self._panel_factor(df, 'volume_spike', volume_spike)
     
     # ========== 技术指标因子 ==========
     
     def calculate_rsi(self, df, period=14):
         """RSI相对强弱指标"""
-        df = df.sort_values(['SecuCode', 'TradingDay'])
-        
-        def rsi_calc(prices):
-            delta = prices.diff()
-            gain = (delta.where(delta > 0, 0)).rolling(period, min_periods=period//2).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(period, min_periods=period//2).mean()
-            rs = gain / (loss + 1e-10)
-            return 100 - (100 / (1 + rs))
-        
-        df['rsi'] = df.groupby('SecuCode')['ClosePrice'].transform(rsi_calc)
-        return df[['SecuCode', 'TradingDay', 'rsi']].dropna()
+        return self._panel_factor(df, 'rsi', lambda panel: panel.rsi(panel['ClosePrice'], period))
     
     # ========== 基本面因子代理（使用价格数据估算）==========
     
@@ -60,15 +66,14 @@ class FactorCalculator:
     
     def calculate_bp_proxy(self, df, period=250):
         """BP因子代理 - 使用历史均价与当前价格的比率"""
-        df = df.sort_values(['SecuCode', 'TradingDay'])
-        df['price_ma_250'] = df.groupby('SecuCode')['ClosePrice'].transform(
-            lambda x: x.rolling(period, min_periods=period//2).mean()
-        )
-        df['bp_proxy'] = df['price_ma_250'] / (df['ClosePrice'] + 1e-10)
-        return df[['SecuCode', 'TradingDay', 'bp_proxy']].dropna()
+        def bp_proxy(panel):
+            close = panel['ClosePrice']
+            return panel.rolling_mean(close, period, period // 2) / (close + 1e-10)
+        return self._panel_factor(df, 'bp_proxy', bp_proxy)
     
     # ========== 组合因子计算 ==========
     
+    @traced()
     def calculate_all_factors(self, date):
         """
         计算某一天所有股票的所有因子
@@ -82,14 +87,20 @@ class FactorCalculator:
         # 获取过去一段时间的数据用于计算（需要足够的历史窗口）
         lookback_days = 250
         
-        try:
-            date_idx = self.data_loader.trading_days.index(date)
-        except ValueError:
+        calendar = self.data_loader.calendar
+        if not calendar.is_trading_day(date):
             print(f"⚠️  {date.date()} 不是交易日")
             return pd.DataFrame()
         
-        start_idx = max(0, date_idx - lookback_days)
-        start_date = self.data_loader.trading_days[start_idx]
+        if self.engine is not None:
+            try:
+                return self.engine.advance_to(date)
+            except Exception as e:
+                print(f"❌ 计算因子时出错 ({date.date()}): {e}")
+                self.engine.reset()
+                return pd.DataFrame()
+        
+        start_date = calendar.offset(date, -lookback_days)
         
         # 获取历史数据
         hist_data = self.data_loader.get_price_data(start_date, date)
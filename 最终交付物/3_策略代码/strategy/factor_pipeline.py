@@ -0,0 +1,163 @@
+"""
+融合因子流水线 - 一次遍历计算所有配置的因子
+
+与 PricePanel 逐因子计算（每个因子各自 pack -> 滚动 -> unpack，并生成完整的
+日期 x 股票 中间矩阵）不同，这里把行情按"股票优先"排序后分块处理：
+- 每块是若干只股票的连续观测，在块内压成 (观测, 股票) 小矩阵后依次计算全部因子
+- 结果直接写入预先分配好的输出列，块内临时数组用完即释放
+- 峰值内存 ≈ 输出列 + 一列排序下标 + 一个块的工作区（与总行数无关）
+
+因子函数的签名为 func(fields) -> 数组，fields为字段名 -> 该块的 (观测, 股票) 矩阵，
+直接使用 rolling_kernels 中的函数；运算与dtype同 PricePanel 版本，结果逐位一致。
+"""
+
+import numpy as np
+import pandas as pd
+
+import rolling_kernels as rk
+from instrumentation import traced
+
+
+# ========== 因子定义 ==========
+
+def momentum_20d(fields):
+    """20日动量（%）"""
+    return rk.pct_change(fields['ClosePrice'], 20) * 100
+
+
+def reversal_5d(fields):
+    """5日反转（%）"""
+    return -rk.pct_change(fields['ClosePrice'], 5) * 100
+
+
+def ep_ratio(fields):
+    """EP代理：价格倒数（放大1000倍）"""
+    return 1 / (fields['ClosePrice'] + 1e-10) * 1000
+
+
+def bp_ratio(fields):
+    """BP代理：250日均价 / 当前价"""
+    close = fields['ClosePrice']
+    return rk.rolling_mean(close, 250, 125).astype(close.dtype) / (close + 1e-10)
+
+
+def volume_anomaly(fields):
+    """成交量 / 20日均量"""
+    volume = fields['TurnoverVolume']
+    return volume / (rk.rolling_mean(volume, 20, 10).astype(volume.dtype) + 1e-10)
+
+
+def rsi_14(fields):
+    """14日RSI"""
+    close = fields['ClosePrice']
+    return rk.rsi(close, 14).astype(close.dtype)
+
+
+def future_return_5d(fields):
+    """未来5个观测的收益率（%），训练标签，含未来数据"""
+    close = fields['ClosePrice']
+    return (rk.shift(close, -5) / close - 1) * 100
+
+
+# LightGBM回测、IRS生成脚本与时点因子库共用的5个核心因子
+CORE_FACTORS = {
+    'momentum_20d': momentum_20d,
+    'reversal_5d': reversal_5d,
+    'ep_ratio': ep_ratio,
+    'bp_ratio': bp_ratio,
+    'volume_anomaly': volume_anomaly,
+}
+
+
+# ========== 流水线 ==========
+
+class FusedFactorPipeline:
+    """按股票分块、一次遍历计算全部因子"""
+
+    def __init__(self, factors, fields=('ClosePrice', 'TurnoverVolume'), passthrough=(),
+                 dtype=np.float32, chunk_size=256):
+        """
+        Args:
+            factors: 因子名 -> 因子函数（按此顺序输出列）
+            fields: 因子函数用到的行情字段（任一字段非空即视为一个观测，与PricePanel一致）
+            passthrough: 原样带到输出的行情列（保留原dtype，如回测记账用的float64收盘价）
+            dtype: 因子计算与输出的dtype
+            chunk_size: 每块的股票数
+        """
+        self.factors = dict(factors)
+        self.fields = list(fields)
+        self.passthrough = list(passthrough)
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+
+    @traced()
+    def run(self, quotes, start_date=None):
+        """
+        Args:
+            quotes: 长表行情（SecuCode, TradingDay, 字段...），行顺序任意
+            start_date: 只输出该日期及之后的行（之前的行只用于滚动窗口预热）
+
+        Returns:
+            长表（SecuCode, TradingDay, passthrough列, 因子列），
+            行顺序与 sort_values(['SecuCode', 'TradingDay']) 相同
+        """
+        stock_codes, codes = pd.factorize(quotes['SecuCode'], sort=True)
+        days = quotes['TradingDay'].to_numpy()
+        field_values = {name: quotes[name].to_numpy() for name in self.fields}
+        passthrough_values = {name: quotes[name].to_numpy() for name in self.passthrough}
+
+        valid = np.zeros(len(quotes), dtype=bool)
+        for values in field_values.values():
+            valid |= ~np.isnan(values)
+
+        # 股票优先排序：每只股票的观测连续，股票内按日期
+        order = np.lexsort((days, stock_codes))
+        order = order[valid[order]]
+        lengths = np.bincount(stock_codes[order], minlength=len(codes))
+        stocks = np.flatnonzero(lengths)
+        lengths = lengths[stocks]
+        starts = np.concatenate([[0], np.cumsum(lengths)])
+        del stock_codes, valid
+
+        # 预分配输出
+        if start_date is None:
+            n_out = len(order)
+        else:
+            n_out = int(np.count_nonzero(days[order] >= np.datetime64(pd.Timestamp(start_date))))
+        out_stock = np.empty(n_out, dtype=np.int64)
+        out_days = np.empty(n_out, dtype=days.dtype)
+        out_pass = {name: np.empty(n_out, dtype=values.dtype) for name, values in passthrough_values.items()}
+        out_factors = {name: np.empty(n_out, dtype=self.dtype) for name in self.factors}
+
+        pos = 0
+        for c0 in range(0, len(stocks), self.chunk_size):
+            c1 = min(c0 + self.chunk_size, len(stocks))
+            lo, hi = starts[c0], starts[c1]
+            rows = order[lo:hi]
+            chunk_lengths = lengths[c0:c1]
+
+            # 块内 (观测序号, 股票序号)
+            col = np.repeat(np.arange(c1 - c0), chunk_lengths)
+            obs = np.arange(hi - lo) - np.repeat(starts[c0:c1] - lo, chunk_lengths)
+            shape = (int(chunk_lengths.max()), c1 - c0)
+            packed = {}
+            for name, values in field_values.items():
+                block = np.full(shape, np.nan, dtype=self.dtype)
+                block[obs, col] = values[rows]
+                packed[name] = block
+
+            keep = slice(None) if start_date is None else days[rows] >= np.datetime64(pd.Timestamp(start_date))
+            obs, col, rows = obs[keep], col[keep], rows[keep]
+            end = pos + len(rows)
+            out_stock[pos:end] = stocks[c0:c1][col]
+            out_days[pos:end] = days[rows]
+            for name, values in passthrough_values.items():
+                out_pass[name][pos:end] = values[rows]
+            for name, func in self.factors.items():
+                out_factors[name][pos:end] = func(packed)[obs, col]
+            pos = end
+
+        data = {'SecuCode': codes.values[out_stock], 'TradingDay': out_days}
+        data.update(out_pass)
+        data.update(out_factors)
+        return pd.DataFrame(data, copy=False)
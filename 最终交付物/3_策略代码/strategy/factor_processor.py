@@ -2,9 +2,13 @@
 因子处理器 - 标准化、去极值、合成
 """
 
+import warnings
+
 import pandas as pd
 import numpy as np
 
+from instrumentation import traced
+
 class FactorProcessor:
     """因子处理器 - 标准化、去极值、合成"""
     
@@ -55,6 +59,7 @@ class FactorProcessor:
         
         return (series - mean) / std
     
+    @traced()
     def process_factors(self, factor_df):
         """
         处理因子：去极值 + 标准化
@@ -78,7 +83,74 @@ class FactorProcessor:
             processed[col] = self.standardize(processed[col])
         
         return processed
-    
+
+    @staticmethod
+    def cross_sectional_transform(values, n_sigma=3):
+        """
+        批量截面处理：对 日期 x 股票 x 因子 数组的每个(日期, 因子)截面做去极值 + 标准化
+
+        与逐日 groupby 处理的口径一致：
+        - MAD > 0 时裁剪到 median ± n_sigma * MAD
+        - 标准差 > 0 时做Z-Score（样本标准差，ddof=1），否则保持原值
+
+        Args:
+            values: 形如 (日期, 股票, 因子) 的数组，缺失为NaN
+            n_sigma: 几倍MAD
+
+        Returns:
+            处理后的新数组
+        """
+        values = np.array(values, copy=True)
+
+        with warnings.catch_warnings():
+            # 全NaN截面的统计量为NaN，后续条件判断会自动跳过
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+
+            median = np.nanmedian(values, axis=1, keepdims=True)
+            mad = np.nanmedian(np.abs(values - median), axis=1, keepdims=True)
+            clipped = np.clip(values, median - n_sigma * mad, median + n_sigma * mad)
+            values = np.where(mad > 0, clipped, values)
+
+            mean = np.nanmean(values, axis=1, keepdims=True)
+            std = np.nanstd(values, axis=1, ddof=1, keepdims=True)
+            values = np.where(std > 0, (values - mean) / np.where(std > 0, std, 1), values)
+
+        return values
+
+    @traced()
+    def process_factors_batch(self, factor_df, factor_cols=None, n_sigma=3, date_col='TradingDay'):
+        """
+        批量处理多日因子：所有日期一次性去极值 + 标准化
+
+        Args:
+            factor_df: 长表，每行一个(日期, 股票)
+            factor_cols: 因子列（默认为除SecuCode/TradingDay/InnerCode外的所有列）
+            n_sigma: 几倍MAD
+            date_col: 日期列名
+
+        Returns:
+            处理后的DataFrame（行顺序与输入一致）
+        """
+        if factor_cols is None:
+            exclude_cols = ['SecuCode', 'TradingDay', 'InnerCode']
+            factor_cols = [col for col in factor_df.columns if col not in exclude_cols]
+
+        day_idx, days = pd.factorize(factor_df[date_col], sort=True)
+        stock_idx, stocks = pd.factorize(factor_df['SecuCode'], sort=True)
+
+        # 长表 -> 日期 x 股票 x 因子
+        raw = factor_df[factor_cols].to_numpy()
+        if not np.issubdtype(raw.dtype, np.floating):
+            raw = raw.astype(np.float64)
+        cube = np.full((len(days), len(stocks), len(factor_cols)), np.nan, dtype=raw.dtype)
+        cube[day_idx, stock_idx] = raw
+
+        cube = self.cross_sectional_transform(cube, n_sigma=n_sigma)
+
+        processed = factor_df.copy()
+        processed[factor_cols] = cube[day_idx, stock_idx]
+        return processed
+
     def combine_factors(self, factor_df, weights=None):
         """
         合成因子 - 加权平均
@@ -0,0 +1,71 @@
+"""
+逐日因子CSV目录的预读取 - 线程池提前读取并解析之后几天的文件
+
+回测主循环处理当天时，后面的文件已在后台线程中读取、解析，
+网络盘等高延迟存储上的I/O等待被计算时间掩盖：
+- 最多同时有 max_prefetch 个文件在读取或已解析待取用（有界队列，内存占用固定）
+- 结果严格按日期顺序产出，与串行逐个读取一致
+- 提前结束迭代（break）时取消尚未开始的读取
+"""
+
+import glob
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+def read_factor_file(factor_file, code_width=6):
+    """
+    读取一个每日因子文件（无表头：股票代码,因子分数）
+
+    Returns:
+        (交易日, 股票代码数组（补齐code_width位）, 因子分数数组)
+    """
+    date_str = os.path.splitext(os.path.basename(factor_file))[0]
+    df = pd.read_csv(factor_file, header=None, names=['stock_code', 'factor_score'], dtype={'stock_code': str})
+    codes = df['stock_code'].str.zfill(code_width) if code_width else df['stock_code']
+    return pd.Timestamp(date_str), codes.to_numpy(dtype=object), df['factor_score'].to_numpy()
+
+
+class PrefetchingFactorReader:
+    """按日期顺序读取因子目录，后台线程预读之后的文件"""
+
+    def __init__(self, factor_dir, n_threads=4, max_prefetch=16, code_width=6):
+        """
+        Args:
+            factor_dir: 每日因子文件目录（yyyyMMdd.csv）
+            n_threads: 读取线程数
+            max_prefetch: 最多提前读取的文件数（不小于n_threads）
+            code_width: 股票代码补齐位数（None为不补齐）
+        """
+        self.factor_files = sorted(glob.glob(os.path.join(factor_dir, "*.csv")))
+        self.n_threads = n_threads
+        self.max_prefetch = max(max_prefetch, n_threads)
+        self.code_width = code_width
+
+    def __len__(self):
+        return len(self.factor_files)
+
+    def __iter__(self):
+        """逐日产出 (交易日, 股票代码数组, 因子分数数组)"""
+        files = iter(self.factor_files)
+        pending = deque()
+        pool = ThreadPoolExecutor(max_workers=self.n_threads)
+        try:
+            for factor_file in files:
+                pending.append(pool.submit(read_factor_file, factor_file, self.code_width))
+                if len(pending) >= self.max_prefetch:
+                    break
+            while pending:
+                result = pending.popleft().result()
+                # 取走一个结果后再提交一个，队列长度不超过max_prefetch
+                factor_file = next(files, None)
+                if factor_file is not None:
+                    pending.append(pool.submit(read_factor_file, factor_file, self.code_width))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
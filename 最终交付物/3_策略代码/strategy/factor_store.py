@@ -0,0 +1,251 @@
+"""
+时点因子库 - 按 (TradingDay, SecuCode) 持久化的原始因子与截面处理后因子
+
+- 每年一个分区文件：安装了pyarrow时为Parquet（factors_2021.parquet），
+  否则为每列一个.npy的目录（factors_2021.npy/，数值列内存映射读取）
+- 分区内的行按 (TradingDay, SecuCode) 排序
+- 每个日期的因子只用当日及之前的行情计算（时点口径），截面处理也只依赖当日截面，
+  所以新交易日到来时已入库的行不会变化，update 只需计算库尾之后缺失的日期
+- 训练标签等依赖未来行情的列不入库，由读取方按需计算
+
+update 的回看区间按观测数而非自然日确定：取新日期上有行情的每只股票之前最近
+LOOKBACK_OBS 个观测中最早的日期，停牌股票的滚动窗口也能取满。
+"""
+
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from factor_pipeline import FusedFactorPipeline, CORE_FACTORS
+from factor_processor import FactorProcessor
+from instrumentation import traced
+from table_cache import PYARROW_AVAILABLE, read_columns, write_columns
+
+if PYARROW_AVAILABLE:
+    import pyarrow.parquet as pq
+
+# 入库的核心因子（LightGBM回测与IRS生成脚本共用的口径）
+FACTOR_COLS = list(CORE_FACTORS)
+# 截面处理（去极值+标准化）后的列名后缀
+PROCESSED_SUFFIX = '_z'
+# 最长窗口所需的每只股票观测数（bp_ratio的250日均价）
+LOOKBACK_OBS = 250
+
+
+class FactorStore:
+    """按年分区的时点因子库"""
+
+    def __init__(self, store_dir, n_sigma=3):
+        """
+        Args:
+            store_dir: 因子库目录
+            n_sigma: 截面去极值的MAD倍数
+        """
+        self.store_dir = store_dir
+        self.n_sigma = n_sigma
+        self.format = 'parquet' if PYARROW_AVAILABLE else 'npy'
+        os.makedirs(store_dir, exist_ok=True)
+
+    # ========== 分区文件 ==========
+
+    def _partition(self, year):
+        return os.path.join(self.store_dir, f'factors_{year}.{self.format}')
+
+    def years(self):
+        """已有分区的年份（升序）"""
+        pattern = re.compile(rf'^factors_(\d{{4}})\.{self.format}$')
+        return sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(self.store_dir)) if m)
+
+    def _read_partition(self, year, columns=None, start_date=None, end_date=None):
+        path = self._partition(year)
+        if self.format == 'parquet':
+            filters = []
+            if start_date is not None:
+                filters.append(('TradingDay', '>=', pd.Timestamp(start_date)))
+            if end_date is not None:
+                filters.append(('TradingDay', '<=', pd.Timestamp(end_date)))
+            return pq.read_table(path, columns=columns, filters=filters or None).to_pandas()
+
+        df = read_columns(path, columns)
+        days = df['TradingDay'].to_numpy() if 'TradingDay' in df.columns else None
+        if days is None or (start_date is None and end_date is None):
+            return df
+        lo = 0 if start_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(start_date)), 'left')
+        hi = len(days) if end_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(end_date)), 'right')
+        return df.iloc[lo:hi]
+
+    def _write_partition(self, year, df):
+        path = self._partition(year)
+        df = df.reset_index(drop=True)
+        if self.format == 'parquet':
+            tmp_path = path + '.tmp'
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        else:
+            write_columns(df, path)
+
+    # ========== 读取 ==========
+
+    def last_date(self):
+        """库中最后一个日期，空库返回None"""
+        years = self.years()
+        if not years:
+            return None
+        days = self._read_partition(years[-1], columns=['TradingDay'])['TradingDay']
+        return pd.Timestamp(days.max()) if len(days) else None
+
+    def read(self, start_date=None, end_date=None, processed=False):
+        """
+        读取 [start_date, end_date] 的因子
+
+        Args:
+            processed: False返回原始因子；True返回截面处理后的因子（列名同原始因子）
+
+        Returns:
+            长表（SecuCode, TradingDay, ClosePrice, FACTOR_COLS），按 (TradingDay, SecuCode) 排序
+        """
+        stored = [col + PROCESSED_SUFFIX for col in FACTOR_COLS] if processed else FACTOR_COLS
+        columns = ['SecuCode', 'TradingDay', 'ClosePrice'] + stored
+
+        frames = []
+        for year in self.years():
+            if start_date is not None and year < pd.Timestamp(start_date).year:
+                continue
+            if end_date is not None and year > pd.Timestamp(end_date).year:
+                continue
+            frames.append(self._read_partition(year, columns, start_date, end_date))
+        if not frames:
+            return pd.DataFrame(columns=['SecuCode', 'TradingDay', 'ClosePrice'] + FACTOR_COLS)
+
+        df = pd.concat(frames, ignore_index=True)
+        if processed:
+            df = df.rename(columns=dict(zip(stored, FACTOR_COLS)))
+        return df
+
+    # ========== 计算与追加 ==========
+
+    @staticmethod
+    def lookback_start(data_loader, first_date, last_date, lookback_obs=LOOKBACK_OBS):
+        """
+        计算 [first_date, last_date] 的因子所需行情的最早日期
+
+        只考虑区间内有行情的股票，每只股票回看它在first_date之前最近的lookback_obs个观测
+        """
+        new_codes = data_loader.get_price_data(first_date, last_date)['SecuCode'].unique()
+        history = data_loader.get_latest_data_before_date(first_date)
+        history = history.loc[
+            (history['TradingDay'] < pd.Timestamp(first_date)).to_numpy()
+            & history['SecuCode'].isin(new_codes).to_numpy(),
+            ['SecuCode', 'TradingDay']
+        ]
+        if len(history) == 0:
+            return pd.Timestamp(first_date)
+        return pd.Timestamp(history.groupby('SecuCode', observed=True).tail(lookback_obs)['TradingDay'].min())
+
+    @traced()
+    def compute(self, data_loader, first_date, last_date):
+        """
+        计算 [first_date, last_date] 的原始与截面处理后因子
+
+        Returns:
+            待入库的长表，按 (TradingDay, SecuCode) 排序
+        """
+        start = self.lookback_start(data_loader, first_date, last_date)
+        quotes = data_loader.get_price_data(start, last_date)
+        # 收盘价原样入库（float64，回测记账用）
+        pipeline = FusedFactorPipeline(CORE_FACTORS, passthrough=('ClosePrice',))
+        df = pipeline.run(quotes, start_date=first_date)
+        df = df.sort_values(['TradingDay', 'SecuCode'], kind='mergesort').reset_index(drop=True)
+
+        # 截面处理只依赖当日截面，在float64下进行（与FeatureStore口径一致）
+        processed = FactorProcessor().process_factors_batch(
+            df[['SecuCode', 'TradingDay']].assign(**{
+                col: df[col].to_numpy(dtype=np.float64) for col in FACTOR_COLS
+            }),
+            FACTOR_COLS,
+            n_sigma=self.n_sigma
+        )
+        for col in FACTOR_COLS:
+            df[col + PROCESSED_SUFFIX] = processed[col].to_numpy()
+        return df
+
+    @traced()
+    def append(self, df):
+        """追加新日期的行；与库中日期重叠时以新数据为准（先删除库中 >= 新数据首日 的行）"""
+        if len(df) == 0:
+            return
+        first_date = df['TradingDay'].min()
+        years = df['TradingDay'].dt.year.to_numpy()
+        for year in np.unique(years):
+            new_rows = df[years == year]
+            if os.path.exists(self._partition(year)):
+                existing = self._read_partition(year)
+                existing = existing[(existing['TradingDay'] < first_date).to_numpy()]
+                new_rows = pd.concat([existing, new_rows], ignore_index=True)
+            self._write_partition(year, new_rows)
+
+    @traced()
+    def update(self, data_loader, start_date=None, end_date=None):
+        """
+        补齐库尾之后缺失的交易日
+
+        Args:
+            data_loader: 数据加载器（应包含完整历史行情，回看区间可能早于start_date）
+            start_date: 空库时的起始日期（非空库忽略，从库中最后日期的下一个交易日开始）
+            end_date: 截止日期（默认为行情最后一天）
+
+        Returns:
+            新增的交易日数
+        """
+        last = self.last_date()
+        if last is not None:
+            first_date = data_loader.calendar.next_day(last)
+        elif start_date is not None:
+            first_date = pd.Timestamp(start_date)
+        else:
+            first_date = data_loader.daily_quotes['TradingDay'].iloc[0]
+        if end_date is None:
+            end_date = data_loader.daily_quotes['TradingDay'].iloc[-1]
+
+        trading_days = [] if first_date is None else data_loader.get_trading_days(first_date, end_date)
+        if not trading_days:
+            print(f"✅ 因子库已是最新（最后日期: {last.date() if last is not None else '无'}）")
+            return 0
+
+        start_time = time.time()
+        print(f"🔄 更新因子库: {trading_days[0].date()} 至 {trading_days[-1].date()}（{len(trading_days)} 天）")
+        df = self.compute(data_loader, trading_days[0], trading_days[-1])
+        self.append(df)
+        print(f"✅ 已写入 {len(df):,} 行，耗时 {time.time() - start_time:.2f}s")
+        return len(trading_days)
+
+
+def main():
+    # ==================== 配置参数 ====================
+    DATA_DIR = r'd:\谷歌反重力\股票量化\data'
+    STORE_DIR = r'd:\谷歌反重力\股票量化\factor_store'
+    START_DATE = datetime(2021, 2, 1)  # 空库首次构建的起始日期
+    # ==================================================
+
+    try:
+        from data_loader import JYDBDataLoader, DataSpec
+
+        # 回看区间按观测数确定，需要完整历史行情
+        loader = JYDBDataLoader(DATA_DIR, spec=DataSpec(tables=('daily_quotes', 'trading_calendar')))
+        FactorStore(STORE_DIR).update(loader, start_date=START_DATE)
+        return 0
+
+    except Exception as e:
+        print(f"\n❌ 错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+训练特征库 - 每个交易日的截面只处理一次
+
+所有日期的因子一次性做截面去极值+标准化，结果按 (TradingDay, SecuCode) 排序存为
+连续的float32矩阵，并记录每个日期的行偏移：
+- 预测某日：直接读取该日已处理好的行
+- 训练窗口：可训练行（特征与标签均非空）另存一份连续矩阵，任意日期区间都是零拷贝切片
+"""
+
+import numpy as np
+import pandas as pd
+
+from factor_processor import FactorProcessor
+
+
+class FeatureStore:
+    """按日期分段的特征矩阵"""
+
+    def __init__(self, factor_df, feature_cols, label_col='future_return', n_sigma=3, processed=False):
+        """
+        Args:
+            factor_df: 长表因子（SecuCode, TradingDay, ClosePrice, 特征列, 标签列）
+            feature_cols: 特征列
+            label_col: 训练标签列
+            n_sigma: 去极值的MAD倍数
+            processed: 特征列是否已做过截面处理（如从时点因子库读取），是则直接使用
+        """
+        self.feature_cols = list(feature_cols)
+        self.label_col = label_col
+
+        data = factor_df.sort_values(['TradingDay', 'SecuCode'], kind='mergesort')
+        if not processed:
+            processed = FactorProcessor().process_factors_batch(
+                data[['SecuCode', 'TradingDay']].assign(**{
+                    col: data[col].to_numpy(dtype=np.float64) for col in self.feature_cols
+                }),
+                self.feature_cols,
+                n_sigma=n_sigma
+            )
+        else:
+            processed = data
+
+        # 全部行：预测用
+        days = data['TradingDay'].to_numpy()
+        self.X = np.ascontiguousarray(processed[self.feature_cols].to_numpy(dtype=np.float32))
+        self.codes = data['SecuCode'].to_numpy()
+        self.close = data['ClosePrice'].to_numpy()
+        self.dates, self.offsets = self._offsets(days)
+
+        # 可训练行：训练窗口用
+        y = data[label_col].to_numpy(dtype=np.float32)
+        trainable = ~np.isnan(self.X).any(axis=1) & ~np.isnan(y)
+        self.train_X = np.ascontiguousarray(self.X[trainable])
+        self.train_y = y[trainable]
+        self.train_days = days[trainable]
+        self.train_dates, self.train_offsets = self._offsets(self.train_days)
+
+    @staticmethod
+    def _offsets(days):
+        """有序日期数组 -> (日期索引, 行偏移)，第i个日期的行为 offsets[i]:offsets[i + 1]"""
+        if len(days) == 0:
+            return pd.DatetimeIndex([]), np.zeros(1, dtype=np.int64)
+        starts = np.flatnonzero(days[1:] != days[:-1]) + 1
+        dates = pd.DatetimeIndex(days[np.concatenate([[0], starts])])
+        offsets = np.concatenate([[0], starts, [len(days)]]).astype(np.int64)
+        return dates, offsets
+
+    def __len__(self):
+        return len(self.X)
+
+    def day_rows(self, date):
+        """某日的行区间slice，无数据时为空slice"""
+        i = self.dates.get_indexer([pd.Timestamp(date)])[0]
+        if i < 0:
+            return slice(0, 0)
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def day(self, date):
+        """
+        某日已处理好的特征（缺失填0）
+
+        Returns:
+            (股票代码, 收盘价, 特征矩阵)
+        """
+        rows = self.day_rows(date)
+        X = self.X[rows]
+        return self.codes[rows], self.close[rows], np.where(np.isnan(X), 0, X)
+
+    def window_rows(self, start_date, end_date):
+        """训练日期区间 [start_date, end_date] 在可训练矩阵中的行区间 (lo, hi)"""
+        lo = self.train_dates.searchsorted(pd.Timestamp(start_date), side='left')
+        hi = self.train_dates.searchsorted(pd.Timestamp(end_date), side='right')
+        return int(self.train_offsets[lo]), int(self.train_offsets[max(lo, hi)])
+
+    def window(self, start_date, end_date):
+        """训练窗口 (X, y)，均为可训练矩阵的零拷贝切片"""
+        lo, hi = self.window_rows(start_date, end_date)
+        return self.train_X[lo:hi], self.train_y[lo:hi]
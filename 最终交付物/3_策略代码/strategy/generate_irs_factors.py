@@ -26,6 +26,7 @@ def main():
     START_DATE = datetime(2021, 2, 1)
     END_DATE = datetime(2024, 12, 31)
     TOP_N = 50  # 每日选择Top 50只股票
+    N_WORKERS = os.cpu_count() or 1  # 并行进程数（1为串行）
     
     # 因子权重配置（可根据需要调整）
     FACTOR_WEIGHTS = {
@@ -52,8 +53,9 @@ def main():
         
         # 第2步：初始化因子计算器
         print("\n【第2步】初始化因子计算器")
-        factor_calculator = FactorCalculator(data_loader)
-        print("  ✅ 因子计算器初始化完成")
+        # 逐日递增生成，使用增量滚动因子引擎
+        factor_calculator = FactorCalculator(data_loader, incremental=True)
+        print("  ✅ 因子计算器初始化完成（增量模式）")
         print(f"  包含因子: 动量, 反转, 成交量异常, RSI, EP代理, BP代理")
         
         # 第3步：初始化因子处理器
@@ -72,13 +74,15 @@ def main():
         print(f"  ⏰ 时间范围: {START_DATE.date()} 至 {END_DATE.date()}")
         print(f"  📊 选股数量: Top {TOP_N}")
         print(f"  ⚖️  因子权重: {FACTOR_WEIGHTS}")
+        print(f"  🧵 并行进程: {N_WORKERS}")
         print()
         
         generated_files = irs_generator.generate_all_factors(
             START_DATE, END_DATE,
             data_loader, factor_calculator, factor_processor,
             top_n=TOP_N,
-            factor_weights=FACTOR_WEIGHTS
+            factor_weights=FACTOR_WEIGHTS,
+            n_workers=N_WORKERS
         )
         
         # 输出使用说明
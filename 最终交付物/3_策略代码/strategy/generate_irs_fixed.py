@@ -7,75 +7,63 @@ from datetime import datetime
 import pandas as pd
 import numpy as np
 import os
-from tqdm import tqdm
 import sys
 
 sys.path.insert(0, os.path.dirname(__file__))
-from data_loader import JYDBDataLoader
+from data_loader import JYDBDataLoader, DataSpec
+from factor_store import FactorStore
+from factor_pipeline import FusedFactorPipeline, CORE_FACTORS
+from factor_processor import FactorProcessor
+from irs_writer import IRSFileWriter
+from instrumentation import TRACER, traced
 
 
 class IRSFactorGenerator:
     """IRS格式因子生成器（修复版）"""
     
+    LOOKBACK_DAYS = 250  # 因子预热期（交易日）
+    
     def __init__(self, data_loader):
         self.loader = data_loader
     
+    @traced()
     def calculate_all_factors_vectorized(self, start_date, end_date):
         """向量化批量计算所有因子"""
         print("\n" + "=" * 80)
         print("📊 批量计算优化因子组合")
         print("=" * 80)
         
-        lookback_days = 250
+        lookback_days = self.LOOKBACK_DAYS
         trading_days = self.loader.get_trading_days(start_date, end_date)
         
         if len(trading_days) < lookback_days:
             actual_start = self.loader.trading_days[0]
         else:
-            start_idx = self.loader.trading_days.index(trading_days[0])
-            actual_start = self.loader.trading_days[max(0, start_idx - lookback_days)]
+            actual_start = self.loader.calendar.offset(trading_days[0], -lookback_days)
         
         print(f"  获取数据: {actual_start.date()} 至 {end_date.date()}")
-        df = self.loader.get_price_data(actual_start, end_date).copy()
-        print(f"  原始数据: {len(df):,} 条记录")
-        
-        df = df.sort_values(['SecuCode', 'TradingDay'])
-        
-        print("\n计算5个核心因子...")
+        quotes = self.loader.get_price_data(actual_start, end_date)
         
+        print("\n计算5个核心因子（一次遍历）...")
         print("  [1/5] 动量因子 (20日) - 权重30%")
-        df['momentum_20d'] = df.groupby('SecuCode')['ClosePrice'].pct_change(periods=20) * 100
-        
         print("  [2/5] 反转因子 (5日) - 权重15%")
-        df['reversal_5d'] = -df.groupby('SecuCode')['ClosePrice'].pct_change(periods=5) * 100
-        
         print("  [3/5] EP估值因子 - 权重25%")
-        df['ep_ratio'] = 1 / (df['ClosePrice'] + 1e-10) * 1000
-        
         print("  [4/5] BP市净率代理 - 权重15%")
-        df['price_ma_250'] = df.groupby('SecuCode')['ClosePrice'].transform(
-            lambda x: x.rolling(250, min_periods=125).mean()
-        )
-        df['bp_ratio'] = df['price_ma_250'] / (df['ClosePrice'] + 1e-10)
-        
         print("  [5/5] 成交量异常因子 - 权重15%")
-        df['vol_ma_20'] = df.groupby('SecuCode')['TurnoverVolume'].transform(
-            lambda x: x.rolling(20, min_periods=10).mean()
-        )
-        df['volume_anomaly'] = df['TurnoverVolume'] / (df['vol_ma_20'] + 1e-10)
-        
-        factor_cols = ['SecuCode', 'TradingDay', 'momentum_20d', 'reversal_5d', 
-                      'ep_ratio', 'bp_ratio', 'volume_anomaly']
-        
-        df = df[factor_cols]
-        df = df[df['TradingDay'] >= start_date].copy()
+        df = FusedFactorPipeline(CORE_FACTORS).run(quotes, start_date=start_date)
         
         print(f"\n✅ 因子计算完成: {len(df):,} 条记录")
         
         return df
     
-    def process_and_combine_factors(self, factor_df):
-        """批量处理和合成因子"""
+    @traced()
+    def process_and_combine_factors(self, factor_df, processed=False):
+        """
+        批量处理和合成因子
+        
+        Args:
+            processed: factor_df是否已做过截面处理（从时点因子库读取时为True）
+        """
         print("\n" + "=" * 80)
         print("⚙️  批量处理和合成因子")
         print("=" * 80)
@@ -94,26 +82,13 @@ class IRSFactorGenerator:
         for factor, weight in weights.items():
             print(f"    - {factor}: {weight:.0%}")
         
-        print("\n  处理进度:")
-        
-        def process_group(group):
-            for col in factor_cols:
-                median = group[col].median()
-                mad = (group[col] - median).abs().median()
-                if mad > 0:
-                    upper = median + 3 * mad
-                    lower = median - 3 * mad
-                    group[col] = group[col].clip(lower, upper)
-                
-                mean = group[col].mean()
-                std = group[col].std()
-                if std > 0:
-                    group[col] = (group[col] - mean) / std
-            
-            return group
-        
-        tqdm.pandas(desc="  去极值+标准化")
-        processed_df = factor_df.groupby('TradingDay', group_keys=False).progress_apply(process_group)
+        # 所有日期一次性截面处理（去极值+标准化）
+        if processed:
+            print("\n  因子库中的因子已完成截面处理")
+            processed_df = factor_df.copy()
+        else:
+            print("\n  去极值+标准化（批量截面处理）...")
+            processed_df = FactorProcessor().process_factors_batch(factor_df, factor_cols)
         
         print("\n  合成因子...")
         processed_df['combined_factor'] = 0
@@ -124,49 +99,33 @@ class IRSFactorGenerator:
         
         return processed_df[['SecuCode', 'TradingDay', 'combined_factor']].dropna()
     
-    def generate_irs_files_fixed(self, combined_factors, output_dir=None):
-        """生成IRS格式因子文件（修复版 - 输出因子分数而非权重）"""
+    @traced()
+    def generate_irs_files_fixed(self, combined_factors, output_dir=None,
+                                 archive_file=None, n_threads=8, bundle_file=None):
+        """
+        生成IRS格式因子文件（修复版 - 输出因子分数而非权重）
+        
+        Args:
+            archive_file: 给定时所有日期写入这一个zip归档，不再逐日写文件
+            bundle_file: 给定时所有日期写入这一个因子包（见factor_bundle），不再逐日写文件
+            n_threads: 写文件线程数
+        """
         if output_dir is None:
             output_dir = r'd:\谷歌反重力\股票量化\irs_factors_fixed'
         
-        os.makedirs(output_dir, exist_ok=True)
-        
         print("\n" + "=" * 80)
         print("📁 批量生成IRS因子文件（修复版）")
         print("=" * 80)
-        print(f"  输出目录: {output_dir}")
+        print(f"  输出{'因子包' if bundle_file else '归档' if archive_file else '目录'}: "
+              f"{bundle_file or archive_file or output_dir}")
         print("  ⚠️  关键修复：输出因子分数，而非权重！")
+        print(f"  总天数: {combined_factors['TradingDay'].nunique()}")
         
-        grouped = combined_factors.groupby('TradingDay')
-        total_dates = len(grouped)
-        
-        print(f"  总天数: {total_dates}")
-        print("\n  生成进度:")
-        
-        generated_files = []
-        
-        for date, group in tqdm(grouped, desc="  生成文件"):
-            if len(group) == 0:
-                continue
-            
-            # 提取股票代码（补齐6位）
-            group = group.copy()
-            group['stock_code'] = group['SecuCode'].astype(str).str.extract(r'(\d+)')[0]
-            group['stock_code'] = group['stock_code'].str.zfill(6)  # 补齐6位
-            
-            # 生成文件名
-            date_str = date.strftime('%Y%m%d')
-            output_file = os.path.join(output_dir, f'{date_str}.csv')
-            
-            # ⚠️ 关键修复：保存因子分数，不是权重！
-            # IRS会根据因子分数自动计算持仓权重
-            group[['stock_code', 'combined_factor']].to_csv(
-                output_file,
-                index=False,
-                header=False
-            )
-            
-            generated_files.append(output_file)
+        # ⚠️ 关键修复：保存因子分数，不是权重！
+        # IRS会根据因子分数自动计算持仓权重；股票代码补齐6位
+        writer = IRSFileWriter(output_dir, n_threads=n_threads, code_width=6, archive_file=archive_file,
+                               bundle_file=bundle_file)
+        generated_files = writer.write_scores(combined_factors)
         
         print(f"\n✅ 文件生成完成: {len(generated_files)} 个")
         print(f"  ✨ 格式：股票代码,因子分数（IRS会自动处理）")
@@ -177,6 +136,9 @@ class IRSFactorGenerator:
 def main():
     START_DATE = datetime(2021, 2, 1)
     END_DATE = datetime(2024, 12, 31)
+    FACTOR_STORE_DIR = None  # 时点因子库目录（None为从行情重新计算因子）
+    TRACE_FILE = None  # 各步骤耗时/内存记录的输出路径（.json或.csv，None为不记录）
+    PROFILE_STAGE = None  # 用cProfile采样的步骤名（如 'FusedFactorPipeline.run'，None为不采样）
     
     print("\n" + "█" * 80)
     print("█" + " " * 78 + "█")
@@ -184,18 +146,32 @@ def main():
     print("█" + " " * 78 + "█")
     print("█" * 80)
     
+    if TRACE_FILE is not None:
+        TRACER.start(profile_stage=PROFILE_STAGE, profile_dir=os.path.dirname(os.path.abspath(TRACE_FILE)))
+    
     try:
-        print("\n【第1步】加载JYDB数据")
-        loader = JYDBDataLoader()
-        
-        print("\n【第2步】初始化因子生成器")
-        generator = IRSFactorGenerator(loader)
-        
-        print("\n【第3步】批量计算因子")
-        factor_df = generator.calculate_all_factors_vectorized(START_DATE, END_DATE)
+        if FACTOR_STORE_DIR is not None:
+            # 直接读取时点因子库中已处理好的因子，不需要行情数据
+            print("\n【第1-3步】从时点因子库读取因子")
+            generator = IRSFactorGenerator(None)
+            factor_df = FactorStore(FACTOR_STORE_DIR).read(START_DATE, END_DATE, processed=True)
+            print(f"  ✅ 读取完成: {len(factor_df):,} 条")
+        else:
+            print("\n【第1步】加载JYDB数据")
+            loader = JYDBDataLoader(spec=DataSpec(
+                start_date=START_DATE, end_date=END_DATE, lookback_days=IRSFactorGenerator.LOOKBACK_DAYS
+            ))
+            
+            print("\n【第2步】初始化因子生成器")
+            generator = IRSFactorGenerator(loader)
+            
+            print("\n【第3步】批量计算因子")
+            factor_df = generator.calculate_all_factors_vectorized(START_DATE, END_DATE)
         
         print("\n【第4步】处理和合成因子")
-        combined_factors = generator.process_and_combine_factors(factor_df)
+        combined_factors = generator.process_and_combine_factors(
+            factor_df, processed=FACTOR_STORE_DIR is not None
+        )
         
         print("\n【第5步】生成IRS格式文件（修复版）")
         files, output_dir = generator.generate_irs_files_fixed(combined_factors)
@@ -221,6 +197,9 @@ def main():
         import traceback
         traceback.print_exc()
         return 1
+    
+    finally:
+        TRACER.finish(TRACE_FILE)
 
 
 if __name__ == '__main__':
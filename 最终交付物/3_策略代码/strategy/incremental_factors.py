@@ -0,0 +1,212 @@
+"""
+增量滚动因子引擎 - 逐日推进，每个交易日只做O(股票数)的更新
+
+与 FactorCalculator.calculate_all_factors 的对应关系：
+- 原实现每天取过去 lookback_days+1 个交易日的行情重新计算全部滚动指标
+- 本引擎为每只股票保存最近 lookback_days+1 条观测的环形缓冲区，
+  均线/RSI使用滑动窗口的累加和，动量/反转直接读取滞后价格
+- 窗口同时受"条数"和"日期"约束（观测日期早于 date - lookback_days 个交易日的自动出窗），
+  因此停牌股票的结果与原实现按日期截取历史数据的口径一致
+
+精度说明：
+- 对 calculate_all_factors 实际输出的股票（6个因子均非空），结果与原实现的差异
+  在浮点累加误差以内（相对误差 < 1e-9），累加和每 resync_every 天从缓冲区重算一次以防漂移
+- RSI沿用原实现的简单移动平均口径（非Wilder平滑），否则无法与现有结果对齐
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class IncrementalFactorEngine:
+    """增量滚动因子引擎"""
+
+    FACTOR_COLS = ['momentum', 'reversal', 'volume_spike', 'rsi', 'ep_proxy', 'bp_proxy']
+    BUFFERS = ['close', 'volume', 'gain', 'loss']
+    NO_ORDINAL = np.iinfo(np.int64).min // 2  # 空槽位的交易日序号
+
+    def __init__(self, data_loader, momentum_period=20, reversal_period=5,
+                 volume_period=20, rsi_period=14, bp_period=250,
+                 lookback_days=250, resync_every=250):
+        self.loader = data_loader
+        self.calendar = data_loader.calendar
+        self.momentum_period = momentum_period
+        self.reversal_period = reversal_period
+        self.lookback_days = lookback_days
+        self.resync_every = resync_every
+        # 滑动窗口: 名称 -> (窗口长度, 最少观测数)，与原实现的 rolling(period, min_periods=period//2) 一致
+        self.windows = {
+            'volume': (volume_period, volume_period // 2),
+            'gain': (rsi_period, rsi_period // 2),
+            'loss': (rsi_period, rsi_period // 2),
+            'close': (bp_period, bp_period // 2),
+        }
+        self.capacity = max(lookback_days + 1, momentum_period + 1, reversal_period + 1,
+                            *(w for w, _ in self.windows.values()))
+        self.reset()
+
+    def reset(self):
+        """清空所有状态"""
+        K = self.capacity
+        self.codes = pd.Index([])
+        self.last_date = None
+        self._steps = 0
+        self._buf = {name: np.empty((K, 0)) for name in self.BUFFERS}
+        self._ord = np.empty((K, 0), dtype=np.int64)
+        self._seen = np.empty(0, dtype=np.int64)
+        self._sum = {name: np.empty(0) for name in self.windows}
+        self._tail = {name: np.empty(0, dtype=np.int64) for name in self.windows}
+
+    def _grow(self, n_stocks):
+        """按股票对齐的状态数组扩容到n_stocks列"""
+        extra = n_stocks - len(self._seen)
+
+        def pad(arr, fill):
+            return np.concatenate([arr, np.full(arr.shape[:-1] + (extra,), fill, dtype=arr.dtype)], axis=-1)
+
+        self._buf = {name: pad(arr, np.nan) for name, arr in self._buf.items()}
+        self._ord = pad(self._ord, self.NO_ORDINAL)
+        self._seen = pad(self._seen, 0)
+        self._sum = {name: pad(arr, 0) for name, arr in self._sum.items()}
+        self._tail = {name: pad(arr, 0) for name, arr in self._tail.items()}
+
+    def _stock_index(self, codes):
+        """股票代码 -> 状态数组列号，遇到新股票时扩容"""
+        idx = self.codes.get_indexer(codes)
+        new = idx < 0
+        if new.any():
+            self.codes = self.codes.append(pd.Index(pd.unique(codes[new])))
+            self._grow(len(self.codes))
+            idx = self.codes.get_indexer(codes)
+        return idx
+
+    def update(self, date, daily_quotes):
+        """
+        推进一个交易日
+
+        Args:
+            date: 交易日（必须晚于上一次update的日期）
+            daily_quotes: 当日行情，包含 SecuCode, ClosePrice, TurnoverVolume 列
+
+        Returns:
+            当日因子DataFrame，列与 FactorCalculator.calculate_all_factors 相同
+        """
+        t = self.calendar.ordinal(date)
+        if self.last_date is not None and t <= self.calendar.ordinal(self.last_date):
+            raise ValueError(f"{pd.Timestamp(date).date()} 不晚于上次更新日期 {self.last_date.date()}")
+
+        codes = daily_quotes['SecuCode'].to_numpy()
+        close = daily_quotes['ClosePrice'].to_numpy(dtype=float)
+        volume = daily_quotes['TurnoverVolume'].to_numpy(dtype=float)
+        idx = self._stock_index(codes)
+        K = self.capacity
+        cutoff = t - self.lookback_days
+
+        # 1. 新观测写入环形缓冲区
+        seen = self._seen[idx]
+        slot = seen % K
+        prev_slot = (seen - 1) % K
+        has_prev = (seen > 0) & (self._ord[prev_slot, idx] >= cutoff)
+        delta = np.where(has_prev, close - self._buf['close'][prev_slot, idx], 0.0)
+
+        values = {
+            'close': close,
+            'volume': volume,
+            'gain': np.where(delta > 0, delta, 0.0),
+            'loss': np.where(delta < 0, -delta, 0.0),
+        }
+        for name, value in values.items():
+            self._buf[name][slot, idx] = value
+            self._sum[name][idx] += value
+        self._ord[slot, idx] = t
+        self._seen[idx] = seen + 1
+
+        # 2. 滑出窗口：超出窗口长度 或 早于回看区间
+        cols = np.arange(len(self._seen))
+        for name, (size, _) in self.windows.items():
+            self._evict(name, np.flatnonzero(self._seen - self._tail[name] > size))
+            while True:
+                tail = self._tail[name]
+                too_old = (tail < self._seen) & (self._ord[tail % K, cols] < cutoff)
+                if not too_old.any():
+                    break
+                self._evict(name, np.flatnonzero(too_old))
+
+        self.last_date = pd.Timestamp(date)
+        self._steps += 1
+        if self.resync_every and self._steps % self.resync_every == 0:
+            self._resync()
+
+        return self._factors(idx, codes, close, volume, t)
+
+    def _evict(self, name, stocks):
+        """指定股票的窗口各滑出最旧的一条观测"""
+        tail = self._tail[name]
+        self._sum[name][stocks] -= self._buf[name][tail[stocks] % self.capacity, stocks]
+        tail[stocks] += 1
+
+    def _window_stats(self, name, idx):
+        """窗口均值，观测数不足min_periods时为NaN"""
+        count = self._seen[idx] - self._tail[name][idx]
+        min_periods = self.windows[name][1]
+        return np.where(count >= min_periods, self._sum[name][idx] / np.maximum(count, 1), np.nan)
+
+    def _lagged_return(self, idx, close, lag, t):
+        """lag条观测之前的收益率，滞后观测不在回看区间内时为NaN"""
+        seen = self._seen[idx]
+        lag_seq = seen - 1 - lag
+        slot = lag_seq % self.capacity
+        valid = (lag_seq >= 0) & (self._ord[slot, idx] >= t - self.lookback_days)
+        lagged = self._buf['close'][slot, idx]
+        return np.where(valid, close / lagged - 1, np.nan)
+
+    def _factors(self, idx, codes, close, volume, t):
+        vol_ma = self._window_stats('volume', idx)
+        gain = self._window_stats('gain', idx)
+        loss = self._window_stats('loss', idx)
+        price_ma = self._window_stats('close', idx)
+        rs = gain / (loss + 1e-10)
+
+        factors = pd.DataFrame({
+            'SecuCode': codes,
+            'momentum': self._lagged_return(idx, close, self.momentum_period, t),
+            'reversal': -self._lagged_return(idx, close, self.reversal_period, t),
+            'volume_spike': volume / (vol_ma + 1e-10),
+            'rsi': 100 - (100 / (1 + rs)),
+            'ep_proxy': 1 / (close + 1e-10),
+            'bp_proxy': price_ma / (close + 1e-10),
+        })
+        factors['TradingDay'] = self.last_date
+        factors = factors.dropna().sort_values('SecuCode').reset_index(drop=True)
+        return factors
+
+    def _resync(self):
+        """从缓冲区重算窗口累加和，消除长期浮点漂移"""
+        K = self.capacity
+        seq = self._seen[None, :] - 1 - np.arange(K)[:, None]  # 每个槽位对应的观测序号（由新到旧）
+        slot = seq % K
+        cols = np.arange(len(self._seen))[None, :]
+        for name in self.windows:
+            in_window = (seq >= self._tail[name][None, :]) & (seq >= 0)
+            values = self._buf[name][slot, cols]
+            self._sum[name] = np.where(in_window, values, 0.0).sum(axis=0)
+
+    def advance_to(self, date):
+        """
+        从上次更新位置逐日推进到date，返回date当天的因子
+
+        首次调用（或date早于当前状态）时从 date 往前 lookback_days 个交易日开始预热，
+        更早的观测不会进入任何窗口。
+        """
+        if self.last_date is not None and pd.Timestamp(date) <= self.last_date:
+            self.reset()
+
+        if self.last_date is None:
+            start = self.calendar.offset(date, -self.lookback_days)
+        else:
+            start = self.calendar.next_day(self.last_date)
+
+        factors = pd.DataFrame()
+        for day in self.calendar.range(start, date):
+            factors = self.update(day, self.loader.get_price_data(day, day))
+        return factors
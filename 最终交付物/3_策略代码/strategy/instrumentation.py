@@ -0,0 +1,293 @@
+"""
+运行埋点 - 记录流水线各步骤的墙钟时间、CPU时间、内存峰值和行数
+
+用法：
+- 函数/方法加 @traced()（步骤名默认为函数的限定名），代码块用 with stage('名称') as record，
+  块内可设置 record['rows']
+- 默认不记录，装饰器直接调用原函数；入口脚本调用 TRACER.start() 后开始记录，
+  结束时 TRACER.finish('trace.json' 或 'trace.csv') 打印汇总并输出每次调用一行的记录
+- start(profile_stage=...) 时对该名称的步骤额外用cProfile采样，
+  输出 .prof 文件和按累计耗时排序的文本
+
+内存为进程常驻内存（RSS）：
+- Linux 读 /proc/self/status，进入步骤时写 /proc/self/clear_refs 重置峰值，得到步骤自身的峰值
+- Windows 通过 GetProcessMemoryInfo 读取，峰值无法重置（为进程至今的峰值）
+- 其他平台只有 resource 提供的进程峰值
+嵌套步骤重置峰值之前，先把当前峰值并入外层步骤，外层峰值不会因此偏小。
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import platform
+import pstats
+import re
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+
+# ========== 进程内存 ==========
+
+if sys.platform.startswith('linux') and os.path.exists('/proc/self/status'):
+    def _memory():
+        """(当前RSS, 峰值RSS)，单位字节"""
+        values = {}
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key, value = line.split(':', 1)
+                    values[key] = int(value.split()[0]) * 1024
+        return values.get('VmRSS'), values.get('VmHWM')
+
+    def _reset_peak():
+        """重置进程峰值RSS，成功返回True"""
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            return True
+        except OSError:
+            return False
+
+elif sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class _MemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    _kernel32 = ctypes.WinDLL('kernel32')
+    _psapi = ctypes.WinDLL('psapi')
+    _kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    _psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(_MemoryCounters), wintypes.DWORD]
+
+    def _memory():
+        counters = _MemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not _psapi.GetProcessMemoryInfo(_kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None, None
+        return counters.WorkingSetSize, counters.PeakWorkingSetSize
+
+    def _reset_peak():
+        return False
+
+else:
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    def _memory():
+        if resource is None:
+            return None, None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS单位为字节，其余为KB
+        return None, peak if sys.platform == 'darwin' else peak * 1024
+
+    def _reset_peak():
+        return False
+
+
+def _mb(value):
+    return None if value is None else value / 1024 ** 2
+
+
+def _row_count(result):
+    """返回值的行数：DataFrame/Series/列表取长度，元组取第一个元素的长度，其他为None"""
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, (pd.DataFrame, pd.Series, list)):
+        return len(result)
+    return None
+
+
+# ========== 记录器 ==========
+
+class Tracer:
+    """步骤记录器（模块级单例 TRACER，各模块的 @traced / stage 都记录到它）"""
+
+    COLUMNS = ['name', 'parent', 'depth', 'start_s', 'wall_s', 'cpu_s',
+               'rss_start_mb', 'rss_end_mb', 'peak_rss_mb', 'peak_is_stage', 'rows', 'status', 'profile']
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.profile_stage = None
+        self.profile_dir = None
+        self.started_at = None
+        self._stack = []
+        self._t0 = None
+        self._profiling = False
+
+    def start(self, profile_stage=None, profile_dir='.'):
+        """
+        开始记录（清空之前的记录）
+
+        Args:
+            profile_stage: 用cProfile采样的步骤名（None为不采样）
+            profile_dir: 采样结果输出目录
+        """
+        self.enabled = True
+        self.records = []
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now()
+        self._stack = []
+        self._t0 = time.perf_counter()
+
+    def stop(self):
+        self.enabled = False
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """
+        记录一个步骤；未开始记录时什么也不做
+
+        Yields:
+            本步骤的记录字典（可在块内设置 'rows'）
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        current, peak = _memory()
+        for parent in self._stack:
+            parent['_peak'] = max(parent['_peak'], peak or 0)
+        peak_reset = _reset_peak()
+        record = {
+            'name': name,
+            'parent': self._stack[-1]['name'] if self._stack else None,
+            'depth': len(self._stack),
+            'start_s': time.perf_counter() - self._t0,
+            'rss_start_mb': _mb(current),
+            'peak_is_stage': peak_reset,
+            'rows': rows,
+            'status': 'ok',
+            'profile': None,
+            '_peak': 0 if peak_reset else (peak or 0),
+        }
+        self._stack.append(record)
+
+        profiler = None
+        if name == self.profile_stage and not self._profiling:
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'error'
+            raise
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                record['profile'] = self._dump_profile(profiler, name)
+
+            current, peak = _memory()
+            self._stack.pop()
+            stage_peak = max(record.pop('_peak'), peak or 0)
+            for parent in self._stack:
+                parent['_peak'] = max(parent['_peak'], stage_peak)
+            record['rss_end_mb'] = _mb(current)
+            record['peak_rss_mb'] = _mb(stage_peak) if stage_peak else None
+            self.records.append(record)
+
+    def traced(self, name=None):
+        """装饰器：每次调用记录为一个步骤，行数取自返回值"""
+        def decorator(func):
+            stage_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name) as record:
+                    result = func(*args, **kwargs)
+                    record['rows'] = _row_count(result)
+                    return result
+            return wrapper
+        return decorator
+
+    def _dump_profile(self, profiler, name):
+        """写出 <步骤名>.prof 和按累计耗时排序的前40行文本，返回.prof路径"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, re.sub(r'[^\w.-]+', '_', name))
+        profiler.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(40)
+        return base + '.prof'
+
+    # ========== 输出 ==========
+
+    def to_frame(self):
+        """每次调用一行，按开始时间排序"""
+        return pd.DataFrame(self.records, columns=self.COLUMNS).sort_values('start_s', kind='stable')
+
+    def summary(self):
+        """按步骤名汇总：调用次数、总耗时、总CPU时间、最大峰值内存、总行数"""
+        df = self.to_frame()
+        return df.groupby('name', sort=False).agg(
+            calls=('wall_s', 'size'),
+            wall_s=('wall_s', 'sum'),
+            cpu_s=('cpu_s', 'sum'),
+            peak_rss_mb=('peak_rss_mb', 'max'),
+            rows=('rows', 'sum'),
+        ).reset_index()
+
+    def save(self, path):
+        """按扩展名输出记录：.csv 为表格，其他为JSON（含运行环境信息）"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if path.lower().endswith('.csv'):
+            self.to_frame().to_csv(path, index=False, encoding='utf-8-sig')
+            return
+        trace = {
+            'started_at': self.started_at.isoformat(timespec='seconds') if self.started_at else None,
+            'argv': sys.argv,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'records': self.to_frame().astype(object).where(lambda df: df.notna(), None).to_dict('records'),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f, ensure_ascii=False, indent=2)
+
+    def finish(self, path=None):
+        """停止记录、打印汇总，给定path时输出记录"""
+        if self.started_at is None:
+            return
+        self.stop()
+        print("\n" + "=" * 80)
+        print("⏱️  步骤耗时与内存")
+        print("=" * 80)
+        if self.records:
+            print(self.summary().to_string(index=False, float_format=lambda x: f'{x:.3f}'))
+        if path is not None:
+            self.save(path)
+            print(f"\n✅ 运行记录已保存: {path}")
+        profiled = [record['profile'] for record in self.records if record['profile']]
+        if profiled:
+            print(f"✅ cProfile采样: {profiled[0]}")
+
+
+TRACER = Tracer()
+stage = TRACER.stage
+traced = TRACER.traced
@@ -3,10 +3,44 @@ IRS平台因子文件生成器 - 生成符合IRS格式的因子文件
 """
 
 import pandas as pd
+import numpy as np
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from tqdm import tqdm
 
+from irs_writer import normalize_stock_codes, format_rows
+
+# 子进程内的全局状态（由 _init_worker 初始化，每个子进程一份）
+_worker = {}
+
+
+def _init_worker(loader_kwargs, incremental, output_dir):
+    """子进程初始化：从列式缓存重建数据加载器（内存映射只读共享，行情不经过pickle传输）"""
+    from data_loader import JYDBDataLoader
+    from factor_calculator import FactorCalculator
+    from factor_processor import FactorProcessor
+
+    # 子进程不重复打印加载信息，失败原因通过返回值汇总到主进程
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+
+    loader = JYDBDataLoader(**loader_kwargs)
+    _worker['calculator'] = FactorCalculator(loader, incremental=incremental)
+    _worker['processor'] = FactorProcessor()
+    _worker['generator'] = IRSFactorGenerator(output_dir)
+
+
+def _generate_chunk(dates, top_n, factor_weights):
+    """子进程任务：按日期顺序处理一段连续交易日"""
+    generator = _worker['generator']
+    return [
+        (date, *generator.process_date(date, _worker['calculator'], _worker['processor'],
+                                       top_n, factor_weights))
+        for date in dates
+    ]
+
+
 class IRSFactorGenerator:
     """IRS平台因子文件生成器"""
     
@@ -37,28 +71,88 @@ class IRSFactorGenerator:
         # 等权分配
         top_stocks['weight'] = 1.0 / top_n
         
-        # 去掉股票代码的交易所后缀（只保留数字部分）
+        # 去掉股票代码的交易所后缀（只保留数字部分，结果按代码缓存）
         # SecuCode格式如：000001.SZ -> 000001
-        top_stocks['stock_code'] = top_stocks['SecuCode'].str.extract(r'(\d+)')[0]
+        top_stocks['stock_code'] = normalize_stock_codes(top_stocks['SecuCode'].to_numpy())
         
         # 生成文件名 (yyyyMMdd.csv格式)
         date_str = date.strftime('%Y%m%d')
         output_file = os.path.join(self.output_dir, f'{date_str}.csv')
         
         # 保存为CSV（无header，只有两列：股票代码,权重）
-        top_stocks[['stock_code', 'weight']].to_csv(
-            output_file, 
-            index=False, 
-            header=False
-        )
+        with open(output_file, 'w', encoding='utf-8', newline='') as f:
+            f.write(format_rows(top_stocks['stock_code'], top_stocks['weight']))
         
         return output_file
     
+    def process_date(self, date, factor_calculator, factor_processor, top_n=50, factor_weights=None):
+        """
+        计算单日因子并生成文件
+        
+        Returns:
+            (生成的文件路径或None, 失败原因或None)
+        """
+        try:
+            # 1. 计算原始因子
+            raw_factors = factor_calculator.calculate_all_factors(date)
+            
+            if len(raw_factors) == 0:
+                return None, "无数据"
+            
+            # 2. 处理因子（标准化）
+            processed_factors = factor_processor.process_factors(raw_factors)
+            
+            # 3. 合成因子
+            combined = factor_processor.combine_factors(
+                processed_factors, 
+                weights=factor_weights
+            )
+            
+            # 4. 生成文件
+            return self.generate_factor_file(date, combined, top_n), None
+                
+        except Exception as e:
+            return None, str(e)
+    
+    def _run_parallel(self, trading_days, data_loader, factor_calculator,
+                      top_n, factor_weights, n_workers):
+        """
+        多进程生成：交易日切成 n_workers 段连续区间，每个子进程顺序处理一段
+        （连续区间使增量因子引擎每段只需预热一次）
+        """
+        if not data_loader.use_cache:
+            print("⚠️  未启用列式缓存，每个子进程需要重新解析CSV")
+        
+        loader_kwargs = data_loader.init_kwargs()
+        incremental = getattr(factor_calculator, 'engine', None) is not None
+        chunks = [
+            [trading_days[i] for i in idx]
+            for idx in np.array_split(np.arange(len(trading_days)), n_workers)
+            if len(idx) > 0
+        ]
+        
+        results = []
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(loader_kwargs, incremental, self.output_dir)) as pool:
+            futures = {
+                pool.submit(_generate_chunk, chunk, top_n, factor_weights): len(chunk)
+                for chunk in chunks
+            }
+            with tqdm(total=len(trading_days), desc=f"生成因子文件（{n_workers}进程）") as bar:
+                for future in as_completed(futures):
+                    results.extend(future.result())
+                    bar.update(futures[future])
+        
+        # 按日期排序，保证失败明细与串行模式一致
+        results.sort(key=lambda r: r[0])
+        return results
+    
     def generate_all_factors(self, start_date, end_date, 
                             data_loader, factor_calculator, 
                             factor_processor, 
                             top_n=50,
-                            factor_weights=None):
+                            factor_weights=None,
+                            n_workers=1):
         """
         批量生成所有交易日的因子文件
         
@@ -70,6 +164,7 @@ class IRSFactorGenerator:
             factor_processor: 因子处理器实例
             top_n: 每日选择的股票数量
             factor_weights: 因子权重字典
+            n_workers: 并行进程数（1为串行；>1时子进程从data_loader的列式缓存重建数据）
         
         Returns:
             生成的文件列表
@@ -83,38 +178,28 @@ class IRSFactorGenerator:
         print(f"  交易日数: {len(trading_days)} 天")
         print(f"  每日选股: Top {top_n} 只")
         print(f"  输出目录: {self.output_dir}")
+        print(f"  并行进程: {n_workers}")
         print("=" * 80)
         print()
         
+        if n_workers > 1:
+            results = self._run_parallel(trading_days, data_loader, factor_calculator,
+                                         top_n, factor_weights, n_workers)
+        else:
+            results = [
+                (date, *self.process_date(date, factor_calculator, factor_processor,
+                                          top_n, factor_weights))
+                for date in tqdm(trading_days, desc="生成因子文件")
+            ]
+        
         generated_files = []
         failed_dates = []
         
-        for date in tqdm(trading_days, desc="生成因子文件"):
-            try:
-                # 1. 计算原始因子
-                raw_factors = factor_calculator.calculate_all_factors(date)
-                
-                if len(raw_factors) == 0:
-                    failed_dates.append((date, "无数据"))
-                    continue
-                
-                # 2. 处理因子（标准化）
-                processed_factors = factor_processor.process_factors(raw_factors)
-                
-                # 3. 合成因子
-                combined = factor_processor.combine_factors(
-                    processed_factors, 
-                    weights=factor_weights
-                )
-                
-                # 4. 生成文件
-                output_file = self.generate_factor_file(date, combined, top_n)
-                
-                if output_file:
-                    generated_files.append(output_file)
-                    
-            except Exception as e:
-                failed_dates.append((date, str(e)))
+        for date, output_file, reason in results:
+            if reason is not None:
+                failed_dates.append((date, reason))
+            elif output_file:
+                generated_files.append(output_file)
         
         # 输出统计
         print("\n" + "=" * 80)
@@ -0,0 +1,189 @@
+"""
+IRS因子文件批量输出 - 一次性选股 + 线程池写文件
+
+替代 groupby('TradingDay') 逐日 str.extract + DataFrame.to_csv 的写法：
+- 股票代码规范化（提取数字、可选补齐位数）按代码去重后只做一次，结果缓存供之后复用
+- 每日Top N 通过一次稳定排序对所有日期同时完成（并列时保持原顺序，与nlargest一致）
+- 行格式化直接拼接字符串（与to_csv的默认输出逐字节一致），由线程池并行写盘
+- 可选单文件归档：所有日期写入一个zip（每日一个yyyyMMdd.csv成员，zip目录即日期索引）
+- 可选因子包：所有日期写入一个内存映射的二进制文件（见factor_bundle），需要时再导出逐日CSV
+"""
+
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from factor_bundle import FactorBundle
+from instrumentation import traced
+
+# 原始代码 -> 规范化代码 的缓存，key为 (原始代码, 补齐位数)
+_CODE_CACHE = {}
+_DIGITS = re.compile(r'(\d+)')
+
+
+def normalize_stock_codes(secu_codes, width=None):
+    """
+    股票代码规范化：提取第一段数字（000001.SZ -> 000001），width不为None时左侧补0到width位
+
+    与 astype(str).str.extract(r'(\\d+)')[0]（及 .str.zfill(width)）结果一致，
+    没有数字的代码返回空字符串（to_csv对NaN的输出）。
+
+    Args:
+        secu_codes: 股票代码序列（字符串或整数）
+        width: 补齐位数
+
+    Returns:
+        规范化后的字符串数组（object dtype）
+    """
+    codes, uniques = pd.factorize(pd.Series(secu_codes), sort=False)
+    normalized = np.empty(len(uniques), dtype=object)
+    for i, code in enumerate(uniques):
+        key = (code, width)
+        value = _CODE_CACHE.get(key)
+        if value is None:
+            match = _DIGITS.search(str(code))
+            if match is None:
+                value = ''
+            else:
+                value = match.group(1) if width is None else match.group(1).zfill(width)
+            _CODE_CACHE[key] = value
+        normalized[i] = value
+    return normalized[codes]
+
+
+def format_rows(codes, values):
+    """
+    两列无表头CSV文本：代码,数值
+
+    数值按自身dtype的最短表示转字符串（float32不会展开成float64的长尾数），换行符为os.linesep，
+    与 DataFrame.to_csv(index=False, header=False) 的输出逐字节一致。
+    """
+    sep = os.linesep
+    return ''.join(f'{code},{value}{sep}' for code, value in zip(codes, np.asarray(values).astype(str)))
+
+
+def select_top_n(combined_factors, top_n, score_col='combined_factor', date_col='TradingDay'):
+    """
+    每日按得分选Top N（股票数不足top_n的日期整日跳过）
+
+    Returns:
+        按 (日期, 得分降序) 排列的选股结果
+    """
+    day_idx, _ = pd.factorize(combined_factors[date_col], sort=True)
+    scores = combined_factors[score_col].to_numpy()
+    # 稳定排序：先按日期，再按得分降序，并列时保持原顺序
+    order = np.lexsort((-scores, day_idx))
+    sorted_days = day_idx[order]
+    starts = np.searchsorted(sorted_days, sorted_days, side='left')
+    ends = np.searchsorted(sorted_days, sorted_days, side='right')
+    keep = (np.arange(len(order)) - starts < top_n) & (ends - starts >= top_n)
+    return combined_factors.iloc[order[keep]]
+
+
+class IRSFileWriter:
+    """IRS因子文件批量输出"""
+
+    def __init__(self, output_dir, n_threads=8, code_width=None, archive_file=None, bundle_file=None):
+        """
+        Args:
+            output_dir: 每日文件输出目录
+            n_threads: 写文件线程数
+            code_width: 股票代码补齐位数（None为不补齐）
+            archive_file: 给定时不写每日文件，改为写入该zip归档（成员名为yyyyMMdd.csv）
+            bundle_file: 给定时不写每日文件，改为写入该因子包（数值存为float32）
+        """
+        self.output_dir = output_dir
+        self.n_threads = n_threads
+        self.code_width = code_width
+        self.archive_file = archive_file
+        self.bundle_file = bundle_file
+        if bundle_file is not None or archive_file is not None:
+            os.makedirs(os.path.dirname(bundle_file or archive_file) or '.', exist_ok=True)
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def _daily_chunks(self, frame, value_col, date_col):
+        """长表 -> [(yyyyMMdd, 代码数组, 数值数组)]，行顺序保持不变"""
+        days = frame[date_col].to_numpy()
+        if len(days) == 0:
+            return []
+        codes = normalize_stock_codes(frame['SecuCode'].to_numpy(), self.code_width)
+        values = frame[value_col].to_numpy()
+
+        # 同一日期的行须连续（groupby输出顺序）；不连续时按日期稳定排序
+        if (days[1:] < days[:-1]).any():
+            order = np.argsort(days, kind='stable')
+            days, codes, values = days[order], codes[order], values[order]
+        bounds = np.concatenate([[0], np.flatnonzero(days[1:] != days[:-1]) + 1, [len(days)]])
+        date_strs = pd.DatetimeIndex(days[bounds[:-1]]).strftime('%Y%m%d')
+        return [
+            (date_str, codes[lo:hi], values[lo:hi])
+            for date_str, lo, hi in zip(date_strs, bounds[:-1], bounds[1:])
+        ]
+
+    @traced()
+    def write(self, frame, value_col, date_col='TradingDay'):
+        """
+        按日期输出 股票代码,数值 两列文件
+
+        Args:
+            frame: 长表（SecuCode, 日期列, value_col），同一日期内的行顺序即文件行顺序
+
+        Returns:
+            生成的文件路径列表（归档模式下为归档内的成员名，因子包模式下为包内各日期对应的文件名）
+        """
+        if self.bundle_file is not None:
+            codes = normalize_stock_codes(frame['SecuCode'].to_numpy(), self.code_width)
+            bundle = FactorBundle.from_long(self.bundle_file, frame[date_col], codes,
+                                            frame[value_col].to_numpy(), value_col)
+            return [f'{date_str}.csv' for date_str in bundle.dates.strftime('%Y%m%d')]
+
+        chunks = self._daily_chunks(frame, value_col, date_col)
+
+        if self.archive_file is not None:
+            names = []
+            with ThreadPoolExecutor(max_workers=self.n_threads) as pool, \
+                    zipfile.ZipFile(self.archive_file, 'w', compression=zipfile.ZIP_DEFLATED,
+                                    compresslevel=1) as archive:
+                texts = pool.map(lambda chunk: format_rows(chunk[1], chunk[2]), chunks)
+                for (date_str, _, _), text in zip(chunks, texts):
+                    name = f'{date_str}.csv'
+                    archive.writestr(name, text.encode('utf-8'))
+                    names.append(name)
+            return names
+
+        def write_one(chunk):
+            date_str, codes, values = chunk
+            output_file = os.path.join(self.output_dir, f'{date_str}.csv')
+            with open(output_file, 'w', encoding='utf-8', newline='') as f:
+                f.write(format_rows(codes, values))
+            return output_file
+
+        with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            return list(pool.map(write_one, chunks))
+
+    def write_top_n(self, combined_factors, top_n, score_col='combined_factor', date_col='TradingDay'):
+        """每日Top N等权：输出 股票代码,1/top_n"""
+        top_stocks = select_top_n(combined_factors, top_n, score_col, date_col)
+        top_stocks = top_stocks[['SecuCode', date_col]].assign(weight=1.0 / top_n)
+        return self.write(top_stocks, 'weight', date_col)
+
+    def write_scores(self, combined_factors, score_col='combined_factor', date_col='TradingDay'):
+        """每日全部股票：输出 股票代码,因子分数"""
+        return self.write(combined_factors, score_col, date_col)
+
+
+def read_archive_day(archive_file, date):
+    """从归档中读取某日文件（返回与逐日CSV相同的两列DataFrame），不存在时返回None"""
+    name = f'{pd.Timestamp(date).strftime("%Y%m%d")}.csv'
+    with zipfile.ZipFile(archive_file) as archive:
+        try:
+            info = archive.getinfo(name)
+        except KeyError:
+            return None
+        with archive.open(info) as f:
+            return pd.read_csv(f, header=None, names=['stock_code', 'value'], dtype={'stock_code': str})
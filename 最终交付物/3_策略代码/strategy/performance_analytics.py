@@ -0,0 +1,130 @@
+"""
+绩效分析 - 由净值序列计算回测指标（向量化实现）
+
+回测脚本、HTML报告和PPT数据导出共用：
+- 收益率、回撤、夏普比率、胜率
+- 滚动夏普：滚动均值/标准差整列计算，不逐窗口调用Python函数
+- 月度/年度收益：resample按期取首末净值，不逐组apply
+
+除 summarize_nav（沿用回测输出的百分比口径）外，函数返回的收益率、回撤均为小数。
+"""
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def daily_returns(values):
+    """逐日收益率（首日为NaN）"""
+    return values.pct_change()
+
+
+def drawdown(values):
+    """回撤：净值相对历史最高点的跌幅（<=0）"""
+    return values / values.cummax() - 1
+
+
+def annual_return(values, dates, initial_value=None):
+    """
+    年化收益率（按自然日折算）
+
+    Args:
+        initial_value: 期初资金（默认为首个净值）
+    """
+    if initial_value is None:
+        initial_value = values.iloc[0]
+    days = (dates.iloc[-1] - dates.iloc[0]).days
+    return np.power(values.iloc[-1] / initial_value, 365 / days) - 1
+
+
+def sharpe_ratio(returns, periods=TRADING_DAYS_PER_YEAR):
+    """年化夏普比率（无风险利率为0），收益率无波动时为0"""
+    std = returns.std()
+    return returns.mean() / std * np.sqrt(periods) if std > 0 else 0
+
+
+def rolling_sharpe(returns, window=60, periods=TRADING_DAYS_PER_YEAR):
+    """
+    滚动年化夏普比率
+
+    窗口内有缺失值（如首日收益率）时为NaN，窗口内收益率无波动时为0，
+    与 rolling(window).apply(lambda x: x.mean() / x.std() * sqrt(periods) if x.std() > 0 else 0) 一致。
+    """
+    rolling = returns.rolling(window)
+    std = rolling.std()
+    sharpe = rolling.mean() / std * np.sqrt(periods)
+    return sharpe.mask(std == 0, 0.0)
+
+
+def win_stats(returns):
+    """
+    逐日胜率统计
+
+    Returns:
+        {'win_rate', 'avg_win', 'avg_loss', 'n_win', 'n_loss', 'n_flat'}：
+        win_rate为盈利天数占有效天数的比例，avg_win/avg_loss为盈利日/亏损日的平均收益率
+    """
+    values = returns.to_numpy(dtype=np.float64)
+    values = values[~np.isnan(values)]
+    wins, losses = values[values > 0], values[values < 0]
+    return {
+        'win_rate': len(wins) / len(values) if len(values) else np.nan,
+        'avg_win': wins.mean() if len(wins) else np.nan,
+        'avg_loss': losses.mean() if len(losses) else np.nan,
+        'n_win': len(wins),
+        'n_loss': len(losses),
+        'n_flat': int(np.count_nonzero(values == 0)),
+    }
+
+
+def period_returns(values, dates, freq='ME', base='period_first'):
+    """
+    按期（月/年）的收益率
+
+    Args:
+        values: 净值序列
+        dates: 与values对齐的日期
+        freq: resample频率（'ME'月度，'YE'年度）
+        base: 收益率的基准
+            - 'period_first': 期末净值 / 本期首个净值 - 1（没有数据的期省略）
+            - 'prev_close': 期末净值 / 上期期末净值 - 1（首期及空期之后一期为NaN）
+
+    Returns:
+        以期末日期为索引的收益率序列
+    """
+    series = pd.Series(values.to_numpy(), index=pd.DatetimeIndex(dates))
+    resampled = series.resample(freq)
+    last = resampled.last()
+    if base == 'prev_close':
+        return last.pct_change()
+    if base != 'period_first':
+        raise ValueError(f"base必须是 'period_first' 或 'prev_close': {base}")
+    returns = last / resampled.first() - 1
+    return returns[resampled.count() > 0]
+
+
+def monthly_table(monthly):
+    """月度收益序列 -> 年份 x 1..12月 的表（没有数据的月份为NaN）"""
+    index = pd.DatetimeIndex(monthly.index)
+    table = pd.Series(monthly.to_numpy(), index=[index.year, index.month]).unstack()
+    return table.reindex(columns=range(1, 13))
+
+
+def summarize_nav(df_values, initial_capital):
+    """
+    由净值序列计算回测指标，并在df_values上补充 return / cummax / drawdown 列
+
+    Returns:
+        指标字典：total_return, annual_return, max_drawdown（均为百分比）, sharpe
+    """
+    df_values['return'] = daily_returns(df_values['value'])
+    df_values['cummax'] = df_values['value'].cummax()
+    df_values['drawdown'] = (df_values['value'] / df_values['cummax'] - 1) * 100
+
+    return {
+        'total_return': (df_values['value'].iloc[-1] / initial_capital - 1) * 100,
+        'annual_return': annual_return(df_values['value'], df_values['date'], initial_capital) * 100,
+        'max_drawdown': df_values['drawdown'].min(),
+        'sharpe': sharpe_ratio(df_values['return'])
+    }
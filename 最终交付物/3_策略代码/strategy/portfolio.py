@@ -0,0 +1,73 @@
+"""
+组合记账 - 持仓以股数向量存储，与股票轴对齐
+
+替代 {股票代码: 股数} 字典 + 逐只股票查价的写法：
+- 估值、剔除退市/停牌、等权调仓都是对整个向量的一次运算
+- 另外记录持仓的买入顺序，估值按该顺序逐只累加（np.cumsum为顺序累加），
+  因此净值与按字典插入顺序逐只相加的结果逐位一致
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Portfolio:
+    """股数向量组合"""
+
+    def __init__(self, codes):
+        """
+        Args:
+            codes: 股票轴（与价格向量的列一一对应）
+        """
+        self.codes = pd.Index(codes)
+        self.shares = np.zeros(len(self.codes), dtype=np.int64)
+        self.order = np.empty(0, dtype=np.int64)  # 持仓股票的列号，按买入顺序
+
+    def __len__(self):
+        return len(self.order)
+
+    def __bool__(self):
+        return len(self.order) > 0
+
+    def clear(self):
+        """清仓"""
+        self.shares[self.order] = 0
+        self.order = np.empty(0, dtype=np.int64)
+
+    def drop(self, listed):
+        """
+        剔除当日不在行情中的持仓（退市或停牌），剔除后不再恢复
+
+        Args:
+            listed: 布尔向量，当日有行情的股票为True
+        """
+        keep = listed[self.order]
+        self.shares[self.order[~keep]] = 0
+        self.order = self.order[keep]
+
+    def value(self, prices):
+        """持仓市值：按买入顺序累加 股数 x 价格"""
+        if len(self.order) == 0:
+            return 0
+        return np.cumsum(self.shares[self.order] * prices[self.order])[-1]
+
+    def mark_to_market(self, prices, listed):
+        """先剔除无行情的持仓，再按当日价格估值"""
+        self.drop(listed)
+        return self.value(prices)
+
+    def buy_equal_value(self, stock_idx, prices, per_stock_value):
+        """
+        清仓后按相同金额买入，股数向下取整，买不起一股的股票跳过
+
+        Args:
+            stock_idx: 待买入股票的列号（按优先级排列，决定持仓顺序）
+            prices: 与stock_idx对应的买入价格
+            per_stock_value: 每只股票的目标金额
+        """
+        self.clear()
+        stock_idx = np.asarray(stock_idx, dtype=np.int64)
+        shares = np.floor(per_stock_value / np.asarray(prices, dtype=np.float64))
+        bought = shares > 0
+        self.order = stock_idx[bought]
+        self.shares[self.order] = shares[bought].astype(np.int64)
@@ -0,0 +1,135 @@
+"""
+宽表行情面板 - 日期 x 股票 的二维float32数组
+
+所有因子在整个矩阵上按列向量化计算，替代 groupby('SecuCode').transform(lambda ...)
+逐股票的Python调用。
+
+滚动口径与 groupby 版本一致：按每只股票"自己的观测"滚动（停牌日不占窗口）。
+实现方式是把每列的有效观测压紧到列首（packed布局）后调用 rolling_kernels 中的
+列向量滚动函数，再散回日期布局。
+"""
+
+import numpy as np
+import pandas as pd
+
+import rolling_kernels
+
+
+class PricePanel:
+    """日期 x 股票 行情面板"""
+
+    def __init__(self, dates, codes, fields, dtype=np.float32):
+        """
+        Args:
+            dates: 日期轴（DatetimeIndex，升序）
+            codes: 股票轴（Index，升序）
+            fields: 字段名 -> 二维数组 (len(dates), len(codes))，缺失为NaN
+        """
+        self.dates = pd.DatetimeIndex(dates)
+        self.codes = pd.Index(codes)
+        self.dtype = dtype
+        self.fields = {name: np.asarray(values, dtype=dtype) for name, values in fields.items()}
+
+        # 有效观测：任一字段非空即视为当天有交易
+        self.valid = np.zeros((len(self.dates), len(self.codes)), dtype=bool)
+        for values in self.fields.values():
+            self.valid |= ~np.isnan(values)
+
+        # packed布局：每列有效观测按日期顺序排在前面
+        self._order = np.argsort(~self.valid, axis=0, kind='stable')
+        self.n_obs = self.valid.sum(axis=0)
+
+    @classmethod
+    def from_quotes(cls, quotes, fields=('ClosePrice', 'TurnoverVolume'), dtype=np.float32):
+        """由长表行情（SecuCode, TradingDay, 字段...）构建面板"""
+        day_codes, dates = pd.factorize(quotes['TradingDay'], sort=True)
+        stock_codes, codes = pd.factorize(quotes['SecuCode'], sort=True)
+
+        arrays = {}
+        for name in fields:
+            values = np.full((len(dates), len(codes)), np.nan, dtype=dtype)
+            values[day_codes, stock_codes] = quotes[name].to_numpy(dtype=dtype)
+            arrays[name] = values
+        return cls(dates, codes, arrays, dtype=dtype)
+
+    @classmethod
+    def from_loader(cls, data_loader, start_date, end_date, fields=('ClosePrice', 'TurnoverVolume'),
+                    dtype=np.float32):
+        """从数据加载器取 [start_date, end_date] 的行情构建面板"""
+        return cls.from_quotes(data_loader.get_price_data(start_date, end_date), fields, dtype)
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    # ========== packed布局转换 ==========
+
+    def pack(self, values):
+        """日期布局 -> 观测布局（每列第k行为该股票第k个观测）"""
+        return np.take_along_axis(values, self._order, axis=0)
+
+    def unpack(self, packed):
+        """观测布局 -> 日期布局，非交易日置为NaN"""
+        out = np.empty(packed.shape, dtype=packed.dtype)
+        np.put_along_axis(out, self._order, packed, axis=0)
+        out[~self.valid] = np.nan
+        return out
+
+    # ========== 按观测滚动的列向量运算 ==========
+
+    def shift(self, values, periods=1):
+        """每只股票向后取第periods个观测之前的值（periods<0为向前）"""
+        packed = self.pack(values)
+        shifted = rolling_kernels.shift(packed, periods)
+        # 超出各股票观测数的部分不属于该股票
+        rows = np.arange(len(packed))[:, None]
+        shifted[(rows - periods >= self.n_obs[None, :]) | (rows - periods < 0)] = np.nan
+        return self.unpack(shifted)
+
+    def pct_change(self, values, periods=1):
+        """每只股票按观测的periods期收益率"""
+        return (values / self.shift(values, periods) - 1).astype(self.dtype)
+
+    def rolling_sum(self, values, window, min_periods=None, dtype=None):
+        """每只股票按观测的滚动和（与pandas rolling(window, min_periods).sum()一致）"""
+        result = rolling_kernels.rolling_sum(self.pack(values), window, min_periods)
+        return self.unpack(result.astype(dtype or self.dtype))
+
+    def rolling_mean(self, values, window, min_periods=None, dtype=None):
+        """
+        每只股票按观测的滚动均值（与pandas rolling(window, min_periods).mean()一致）
+
+        累加在float64下进行，结果默认转为面板dtype；中间结果可传dtype=np.float64保留精度。
+        """
+        result = rolling_kernels.rolling_mean(self.pack(values), window, min_periods)
+        return self.unpack(result.astype(dtype or self.dtype))
+
+    def rolling_std(self, values, window, min_periods=None, ddof=1, dtype=None):
+        """每只股票按观测的滚动标准差（与pandas rolling(window, min_periods).std(ddof)一致）"""
+        result = rolling_kernels.rolling_std(self.pack(values), window, min_periods, ddof)
+        return self.unpack(result.astype(dtype or self.dtype))
+
+    def rsi(self, values, period=14):
+        """RSI（涨跌幅的简单滚动均值口径，与原generator实现一致）"""
+        # 涨跌幅的比值对精度敏感，在float64下计算后再转为面板dtype
+        result = rolling_kernels.rsi(self.pack(values), period)
+        return self.unpack(result.astype(self.dtype))
+
+    # ========== 输出 ==========
+
+    def to_long(self, columns, start_date=None):
+        """
+        面板 -> 长表（SecuCode, TradingDay, 各列），只保留有交易的格子
+
+        行顺序与 sort_values(['SecuCode', 'TradingDay']) 相同。
+        """
+        row_start = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date))
+        mask = self.valid[row_start:].T
+        stock_idx, day_idx = np.nonzero(mask)
+
+        data = {
+            'SecuCode': self.codes.values[stock_idx],
+            'TradingDay': self.dates.values[row_start:][day_idx],
+        }
+        for name, values in columns.items():
+            data[name] = values[row_start:].T[mask]
+        return pd.DataFrame(data)
@@ -0,0 +1,107 @@
+"""
+滚动窗口计算核 - 二维数组（行为观测、列为股票）上的列向量化滚动函数
+
+所有函数对每列独立滚动，NaN视为缺失：缺失值占窗口位置但不计入观测数，
+窗口内非缺失观测数不足min_periods时结果为NaN，与 pandas rolling(window, min_periods) 一致。
+
+- 累加统一在float64下进行
+- 窗口和/均值/标准差由前缀和之差得到，每个元素O(1)，耗时与窗口长度无关
+- PricePanel 把每只股票的有效观测压紧到列首（packed布局）后调用这些函数，
+  即得到"按股票自身观测滚动"（停牌日不占窗口）的结果
+"""
+
+import numpy as np
+
+
+def _resolve_min_periods(window, min_periods):
+    if window < 1:
+        raise ValueError(f"window必须为正整数: {window}")
+    return window if min_periods is None else min_periods
+
+
+def _window_diff(cumulative, window):
+    """前缀和 -> 长度为window的窗口和"""
+    total = cumulative.copy()
+    total[window:] -= cumulative[:-window]
+    return total
+
+
+def _window_sums(values, window):
+    """窗口内非缺失值之和与观测数"""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    total = _window_diff(np.cumsum(np.where(valid, values, 0.0), axis=0), window)
+    count = _window_diff(np.cumsum(valid, axis=0), window)
+    return total, count
+
+
+def shift(values, periods=1):
+    """每列整体下移periods行（periods<0为上移），移出的位置为NaN"""
+    values = np.asarray(values)
+    shifted = np.full_like(values, np.nan)
+    if periods > 0:
+        shifted[periods:] = values[:-periods]
+    elif periods < 0:
+        shifted[:periods] = values[-periods:]
+    else:
+        shifted[:] = values
+    return shifted
+
+
+def pct_change(values, periods=1):
+    """periods期变化率（与 pct_change(periods, fill_method=None) 一致，缺失值不前向填充）"""
+    return values / shift(values, periods) - 1
+
+
+def rolling_sum(values, window, min_periods=None):
+    """滚动和（min_periods=0时全缺失窗口的和为0，与pandas一致）"""
+    min_periods = _resolve_min_periods(window, min_periods)
+    total, count = _window_sums(values, window)
+    return np.where(count >= min_periods, total, np.nan)
+
+
+def rolling_mean(values, window, min_periods=None):
+    """滚动均值"""
+    min_periods = _resolve_min_periods(window, min_periods)
+    total, count = _window_sums(values, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count >= max(min_periods, 1), total / count, np.nan)
+
+
+def rolling_std(values, window, min_periods=None, ddof=1):
+    """
+    滚动标准差
+
+    平方和前缀相减前先按列减去列均值，避免大数相减的精度损失；
+    与pandas的差异在相对1e-10量级以内（常数窗口的结果可能是接近0的正数而不是精确的0）。
+    """
+    min_periods = _resolve_min_periods(window, min_periods)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    center = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    centered = values - center
+    total, count = _window_sums(centered, window)
+    squares, _ = _window_sums(centered * centered, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (squares - total * total / count) / (count - ddof)
+    var = np.maximum(var, 0.0)
+    return np.where((count >= max(min_periods, 1)) & (count > ddof), np.sqrt(var), np.nan)
+
+
+def rsi(values, period=14, min_periods=None):
+    """
+    RSI（涨跌幅的简单滚动均值口径）
+
+    与 diff -> where(delta>0, 0) -> rolling(period, period//2).mean() 的pandas实现一致：
+    首个观测及缺失价格的delta按0计入窗口。
+    """
+    if min_periods is None:
+        min_periods = period // 2
+    values = np.asarray(values, dtype=np.float64)
+    delta = values - shift(values, 1)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    avg_gain = rolling_mean(gain, period, min_periods)
+    avg_loss = rolling_mean(loss, period, min_periods)
+    rs = avg_gain / (avg_loss + 1e-10)
+    return 100 - (100 / (1 + rs))
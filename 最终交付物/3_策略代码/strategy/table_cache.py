@@ -0,0 +1,132 @@
+"""
+列式磁盘缓存 - 首次解析CSV后写入类型化的列式文件，之后通过内存映射直接读取
+
+缓存文件与CSV放在同一数据目录下的 .cache 子目录中：
+- 安装了pyarrow时使用Feather（Arrow IPC，不压缩，可内存映射）
+- 否则退化为每列一个NumPy .npy文件（数值/日期列通过mmap_mode读取）
+
+缓存以源文件的 mtime + size 作为失效依据，源CSV被替换后会自动重建。
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 缓存格式版本，修改写入逻辑时递增，旧缓存自动失效
+CACHE_VERSION = 1
+
+
+def write_columns(df, path):
+    """DataFrame -> 目录下每列一个.npy文件（object列以pickle保存）"""
+    os.makedirs(path, exist_ok=True)
+    columns = []
+    for col in df.columns:
+        values = df[col].to_numpy()
+        file_name = f'{len(columns)}.npy'
+        np.save(os.path.join(path, file_name), values, allow_pickle=values.dtype == object)
+        columns.append({'name': col, 'file': file_name, 'object': values.dtype == object})
+    with open(os.path.join(path, 'columns.json'), 'w', encoding='utf-8') as f:
+        json.dump(columns, f, ensure_ascii=False)
+
+
+def read_columns(path, columns=None):
+    """write_columns的逆操作，数值/日期列内存映射读取；columns给定时只读这些列"""
+    with open(os.path.join(path, 'columns.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    data = {}
+    for col in meta:
+        if columns is not None and col['name'] not in columns:
+            continue
+        file_path = os.path.join(path, col['file'])
+        if col['object']:
+            data[col['name']] = np.load(file_path, allow_pickle=True)
+        else:
+            data[col['name']] = np.load(file_path, mmap_mode='r')
+    return pd.DataFrame(data, copy=False)
+
+
+class TableCache:
+    """CSV表的列式缓存"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.format = 'feather' if PYARROW_AVAILABLE else 'npy'
+
+    def load(self, csv_file, reader, variant=''):
+        """
+        读取表，命中缓存时直接返回缓存内容，否则调用reader解析CSV并写入缓存
+
+        Args:
+            csv_file: 源CSV路径
+            reader: 解析函数 reader(csv_file) -> DataFrame
+            variant: 解析参数的标识（不同参数生成的表不共用缓存）
+
+        Returns:
+            (DataFrame, 是否命中缓存)
+        """
+        name = os.path.splitext(os.path.basename(csv_file))[0]
+        if variant:
+            name = f'{name}.{variant}'
+        cache_path = os.path.join(self.cache_dir, f'{name}.{self.format}')
+        meta_path = cache_path + '.json'
+        signature = self._signature(csv_file)
+
+        if self._is_valid(meta_path, signature):
+            try:
+                return self._read(cache_path), True
+            except (OSError, ValueError, KeyError) as e:
+                print(f"        ⚠️  缓存读取失败，重新解析CSV: {e}")
+
+        df = reader(csv_file)
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write(df, cache_path)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(signature, f)
+        except OSError as e:
+            print(f"        ⚠️  缓存写入失败（不影响本次运行）: {e}")
+
+        return df, False
+
+    def _signature(self, csv_file):
+        stat = os.stat(csv_file)
+        return {
+            'version': CACHE_VERSION,
+            'format': self.format,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+        }
+
+    @staticmethod
+    def _is_valid(meta_path, signature):
+        if not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f) == signature
+        except (OSError, ValueError):
+            return False
+
+    def _write(self, df, cache_path):
+        df = df.reset_index(drop=True)
+        if self.format == 'feather':
+            # 不压缩才能内存映射
+            feather.write_feather(df, cache_path, compression='uncompressed')
+            return
+        write_columns(df, cache_path)
+
+    def _read(self, cache_path):
+        if self.format == 'feather':
+            table = feather.read_table(cache_path, memory_map=True)
+            return table.to_pandas(split_blocks=True)
+        return read_columns(cache_path)
@@ -0,0 +1,89 @@
+"""
+交易日历 - 基于有序datetime64数组 + 日期->序号字典的O(1)/O(log n)日历运算
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class TradingCalendar:
+    """交易日历"""
+
+    def __init__(self, trading_days):
+        """
+        Args:
+            trading_days: 交易日序列（任意可转为日期的可迭代对象，无需预先排序）
+        """
+        index = pd.DatetimeIndex(trading_days).unique().sort_values()
+        self._index = index
+        self.days = index.values  # 有序datetime64数组
+        self._days = list(index)  # Timestamp列表，切片时避免重复装箱
+        self._ordinal = {day: i for i, day in enumerate(self._days)}
+
+    def __len__(self):
+        return len(self._days)
+
+    def __iter__(self):
+        return iter(self._days)
+
+    def __getitem__(self, item):
+        return self._days[item]
+
+    def __contains__(self, date):
+        return self.is_trading_day(date)
+
+    def _lookup(self, date):
+        i = self._ordinal.get(date)
+        if i is None and not isinstance(date, pd.Timestamp):
+            i = self._ordinal.get(pd.Timestamp(date))
+        return i
+
+    def is_trading_day(self, date):
+        """是否为交易日 - O(1)"""
+        return self._lookup(date) is not None
+
+    def ordinal(self, date):
+        """交易日序号 - O(1)，非交易日抛出ValueError（与list.index一致）"""
+        i = self._lookup(date)
+        if i is None:
+            raise ValueError(f"{pd.Timestamp(date).date()} 不是交易日")
+        return i
+
+    def _position(self, date):
+        """交易日返回其序号，非交易日返回之后第一个交易日的序号"""
+        i = self._lookup(date)
+        if i is None:
+            i = int(self._index.searchsorted(pd.Timestamp(date), side='left'))
+        return i
+
+    def offset(self, date, n, clip=True):
+        """
+        距离date n个交易日的交易日（n<0向前）
+
+        非交易日先对齐到之后的第一个交易日，因此 offset(周六, -1) 为周五。
+
+        Args:
+            clip: 超出日历范围时是否截断到首/末交易日，否则抛出IndexError
+        """
+        i = self._position(date) + n
+        if clip:
+            i = min(max(i, 0), len(self._days) - 1)
+        elif not 0 <= i < len(self._days):
+            raise IndexError(f"{pd.Timestamp(date).date()} 偏移 {n} 个交易日超出日历范围")
+        return self._days[i]
+
+    def range(self, start_date, end_date):
+        """[start_date, end_date] 内的交易日列表 - O(log n)定位"""
+        lo = self._index.searchsorted(pd.Timestamp(start_date), side='left')
+        hi = self._index.searchsorted(pd.Timestamp(end_date), side='right')
+        return self._days[lo:hi]
+
+    def next_day(self, date):
+        """date之后（不含）的第一个交易日，没有则返回None"""
+        i = self._index.searchsorted(pd.Timestamp(date), side='right')
+        return self._days[i] if i < len(self._days) else None
+
+    def prev_day(self, date):
+        """date之前（不含）的最后一个交易日，没有则返回None"""
+        i = self._index.searchsorted(pd.Timestamp(date), side='left') - 1
+        return self._days[i] if i >= 0 else None